@@ -0,0 +1,81 @@
+"""Measure how long ``import Acquisition`` takes.
+
+Each run imports ExtensionClass, which Acquisition can't do without,
+and then Acquisition in a new interpreter with ``-X importtime``. The
+median time of the second import is printed for each implementation
+along with the slowest modules it imported, and the exit status is 1 if
+it is above the optional limit.
+
+Usage: python benchmarks/import_time.py [runs] [limit_ms]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import Acquisition
+
+
+def import_times(env):
+    """Return the self and cumulative times in microseconds of the
+    modules imported by ``import Acquisition`` once ExtensionClass is."""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import ExtensionClass; import Acquisition'],
+        env=env, stderr=subprocess.PIPE, check=True, text=True).stderr
+    times = {}
+    for line in output.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        times[name] = (int(fields[0].split(':')[1]), int(fields[1]))
+        if name == 'ExtensionClass' and not fields[2].startswith('  '):
+            # Everything imported so far was for ExtensionClass.
+            times.clear()
+    return times
+
+
+def measure(runs, env):
+    own = []
+    modules = {}
+    import_times(env)  # Write the byte code.
+    for i in range(runs):
+        times = import_times(env)
+        own.append(times['Acquisition'][1])
+        for name, (self_time, cumulative) in times.items():
+            modules.setdefault(name, []).append(self_time)
+    return statistics.median(own) / 1000, {
+        name: statistics.median(values) / 1000
+        for name, values in modules.items()}
+
+
+def main(args):
+    runs = int(args[0]) if args else 20
+    limit = float(args[1]) if len(args) > 1 else None
+    path = os.path.dirname(os.path.dirname(Acquisition.__file__))
+    implementations = [('Python', '1')]
+    if Acquisition.CAPI:
+        implementations.insert(0, ('C', '0'))
+    print(f'{runs} runs, median time once ExtensionClass is imported')
+
+    failed = False
+    with tempfile.TemporaryDirectory() as cache:
+        for implementation, pure in implementations:
+            env = dict(os.environ, PURE_PYTHON=pure, PYTHONPYCACHEPREFIX=cache,
+                       PYTHONPATH=os.pathsep.join([path] + sys.path[1:]))
+            env.pop('PYTHONDONTWRITEBYTECODE', None)
+            own, modules = measure(runs, env)
+            print(f'  {implementation:<6} {own:8.2f} ms')
+            slowest = sorted(modules.items(), key=lambda item: -item[1])
+            for name, self_time in slowest[:5]:
+                print(f'           {self_time:8.2f} ms  {name}')
+            if limit is not None and own > limit:
+                print(f'  {implementation} is above the limit of {limit} ms')
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
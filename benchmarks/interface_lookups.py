@@ -0,0 +1,68 @@
+"""Measure zope.interface lookups through acquisition wrappers.
+
+``providedBy`` and adapter lookups fetch ``__providedBy__``,
+``__provides__``, ``__implemented__`` and ``__class__`` of the object
+they are given. This script times them on a plain object and through
+wrappers of increasing depth.
+
+Usage: python benchmarks/interface_lookups.py [number]
+"""
+import sys
+import timeit
+
+from zope.interface import Interface
+from zope.interface import implementer
+from zope.interface import providedBy
+from zope.interface.adapter import AdapterRegistry
+
+import Acquisition
+
+
+class IContent(Interface):
+    pass
+
+
+class IView(Interface):
+    pass
+
+
+@implementer(IContent)
+class Node(Acquisition.Implicit):
+    pass
+
+
+class View:
+
+    def __init__(self, context):
+        self.context = context
+
+
+def make_tree(depth):
+    root = node = Node()
+    for i in range(depth):
+        node.child = Node()
+        node = node.child
+    return root, node
+
+
+def main(args):
+    number = int(args[0]) if args else 200000
+    registry = AdapterRegistry()
+    registry.register([IContent], IView, '', View)
+    implementation = 'C' if Acquisition.CAPI else 'Python'
+    print(f'{number} calls, {implementation} implementation')
+
+    root, leaf = make_tree(5)
+    for label, obj in (('plain object', Acquisition.aq_base(leaf)),
+                       ('wrapper', root.child),
+                       ('wrapper depth 5', leaf)):
+        for call, stmt in (
+                ('providedBy', lambda: providedBy(obj)),
+                ('queryAdapter', lambda: registry.queryAdapter(obj, IView))):
+            elapsed = min(timeit.repeat(stmt, number=number, repeat=5))
+            print(f'  {call:<12} {label:<16} '
+                  f'{elapsed / number * 1e9:8.0f} ns')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,64 @@
+"""Measure the memory and construction rate of the wrappers of the Python
+implementation.
+
+The script always uses the Python implementation. It creates wrappers
+of objects whose methods don't bypass the wrapper and of objects whose
+methods use ``object.__getattribute__``, whose wrappers share their
+``__dict__``.
+
+Usage: python benchmarks/pure_wrappers.py [wrappers]
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+
+os.environ['PURE_PYTHON'] = '1'
+
+import Acquisition  # noqa: E402 isort:skip
+
+
+class Node(Acquisition.Implicit):
+
+    def title(self):
+        return self.name
+
+
+class Bypassing(Acquisition.Implicit):
+
+    def title(self):
+        return object.__getattribute__(self, 'name')
+
+
+def wrapper_size(objs, parent):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    wrappers = [obj.__of__(parent) for obj in objs]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size / len(wrappers)
+
+
+def main(args):
+    count = int(args[0]) if args else 100000
+    assert not Acquisition.CAPI
+    print(f'{count} wrappers, Python implementation')
+
+    parent = Node()
+    for cls in (Node, Bypassing):
+        objs = [cls() for i in range(count)]
+        for obj in objs:
+            # Create the instance dict, Python 3.11+ does that lazily.
+            vars(obj)['name'] = 'node'
+        obj = objs[0]
+        obj.__of__(parent)  # Derive the wrapper class.
+        size = wrapper_size(objs, parent)
+        elapsed = min(timeit.repeat(lambda: obj.__of__(parent),
+                                    number=count, repeat=5))
+        print(f'  {cls.__name__:<10} {size:6.0f} bytes '
+              f'{count / elapsed:12,.0f} wrappers/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,61 @@
+"""Measure the memory retained by long-lived wrappers after lookups.
+
+Lookups crossing a ``__parent__`` pointer store the wrapper they create
+for it in the wrapper they were started from, unless mutating lookups
+are switched off. This script keeps a number of wrappers alive, looks up
+an attribute of the root through each of them and reports the memory
+still allocated afterwards in both modes.
+
+Usage: python benchmarks/retained_memory.py [wrappers] [depth]
+"""
+import sys
+import tracemalloc
+
+import Acquisition
+
+
+class Node(Acquisition.Implicit):
+    pass
+
+
+def make_tree(depth):
+    root = Node()
+    root.color = 'red'
+    node = root
+    for i in range(depth):
+        child = Node()
+        child.__parent__ = node
+        node = child
+    return node
+
+
+def measure(count, depth, mutate):
+    Acquisition.set_mutating_lookups(mutate)
+    leaf = make_tree(depth)
+    wrappers = [Node().__of__(leaf) for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for wrapper in wrappers:
+        wrapper.color
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained
+
+
+def main(args):
+    count = int(args[0]) if args else 10000
+    depth = int(args[1]) if len(args) > 1 else 5
+    implementation = 'C' if Acquisition.CAPI else 'Python'
+    print(f'{count} wrappers, __parent__ depth {depth}, '
+          f'{implementation} implementation')
+    try:
+        for mutate in (True, False):
+            retained = measure(count, depth, mutate)
+            print(f'  mutate={mutate!s:5}: {retained:>12,} bytes retained '
+                  f'({retained / count:,.0f} per wrapper)')
+    finally:
+        Acquisition.set_mutating_lookups(True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+"""Measure how acquisition lookups scale with threads.
+
+Each thread acquires attributes through the same shared wrappers of a
+tree, a thread count at a time. Without the GIL (free-threaded builds of
+Python 3.13 and newer) the lookups per second should grow with the
+threads up to the number of cores, with the GIL they stay flat.
+
+Usage: python benchmarks/threaded_lookups.py [lookups] [max_threads]
+"""
+import os
+import sys
+import threading
+import time
+
+import Acquisition
+
+
+class Node(Acquisition.Implicit):
+    pass
+
+
+def make_tree(depth):
+    root = node = Node()
+    root.color = 'red'
+    for i in range(depth):
+        node.child = Node()
+        node = node.child
+    # A __parent__ pointer below the wrapped part of the chain.
+    leaf = Node()
+    leaf.__parent__ = node
+    return root, leaf
+
+
+def worker(leaf, count, barrier):
+    wrapper = Node().__of__(leaf)
+    barrier.wait()
+    for i in range(count):
+        wrapper.color
+        Acquisition.aq_acquire(leaf, 'color')
+
+
+def measure(threads, count, leaf):
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=worker, args=(leaf, count, barrier))
+               for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return 2 * threads * count / (time.perf_counter() - start)
+
+
+def main(args):
+    count = int(args[0]) if args else 100000
+    max_threads = int(args[1]) if len(args) > 1 else os.cpu_count() or 1
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    implementation = 'C' if Acquisition.CAPI else 'Python'
+    print(f'{count} lookups per thread, {implementation} implementation, '
+          f'GIL {"enabled" if gil else "disabled"}')
+
+    root, leaf = make_tree(5)
+    threads = 1
+    base = None
+    while threads <= max_threads:
+        rate = measure(threads, count, leaf)
+        base = base or rate
+        print(f'  {threads:3} threads: {rate:14,.0f} lookups/s '
+              f'({rate / base:.2f}x)')
+        threads *= 2
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -12,6 +12,8 @@
 
  ****************************************************************************/
 
+#include <stddef.h>
+
 #include "ExtensionClass/ExtensionClass.h"
 #include "ExtensionClass/_compat.h"
 
@@ -21,12 +23,103 @@
 static ACQUISITIONCAPI AcquisitionCAPI;
 
 #define ASSIGN(dst, src) Py_XSETREF(dst, src)
+#define SWAP(type, a, b) do { type _tmp = (a); (a) = (b); (b) = _tmp; } while (0)
 #define OBJECT(O) ((PyObject*)(O))
 
 /* sizeof("x") == 2 because of the '\0' byte. */
 #define STR_STARTSWITH(ob, pattern) ((strncmp(ob, pattern, sizeof(pattern) - 1) == 0))
 #define STR_EQ(ob, pattern) ((strcmp(ob, pattern) == 0))
 
+/* Free-threaded builds (Python 3.13+ without the GIL) run lookups in
+ * parallel. These helpers make the shared state safe there and cost
+ * nothing in builds with the GIL:
+ *
+ * ATOMIC_ADD updates the counters shared by all threads, ATOMIC_MAX
+ * raises one to at least the given value.
+ *
+ * LOAD_* and STORE_* read and write the counters and the settings
+ * lookups check without the lock. Relaxed atomics are enough, a lookup
+ * running while a setting changes may still use the former value.
+ *
+ * LOCK_MODULE and UNLOCK_MODULE guard the state of the profiler, the
+ * trace, the census and the slow lookup hook. No Python code may run
+ * while the lock is held, so objects which may be released with it are
+ * only released after UNLOCK_MODULE.
+ *
+ * The fields of the wrappers are only changed by wrapper_set_field.
+ */
+#ifdef Py_GIL_DISABLED
+#define ATOMIC_ADD(var, n) _Py_atomic_add_ssize(&(var), (n))
+#define ATOMIC_MAX(var, n) do { \
+    Py_ssize_t _old = _Py_atomic_load_ssize_relaxed(&(var)); \
+    Py_ssize_t _new = (n); \
+    while (_old < _new && \
+           !_Py_atomic_compare_exchange_ssize(&(var), &_old, _new)) { \
+    } \
+} while (0)
+#define LOAD_INT(var) _Py_atomic_load_int_relaxed(&(var))
+#define STORE_INT(var, v) _Py_atomic_store_int_relaxed(&(var), (v))
+#define LOAD_UINT(var) _Py_atomic_load_uint_relaxed(&(var))
+#define STORE_UINT(var, v) _Py_atomic_store_uint_relaxed(&(var), (v))
+#define LOAD_SSIZE(var) _Py_atomic_load_ssize_relaxed(&(var))
+#define STORE_SSIZE(var, v) _Py_atomic_store_ssize_relaxed(&(var), (v))
+#define LOAD_INT64(var) _Py_atomic_load_int64_relaxed(&(var))
+#define STORE_INT64(var, v) _Py_atomic_store_int64_relaxed(&(var), (v))
+#define LOAD_PTR(var) _Py_atomic_load_ptr_relaxed(&(var))
+#define STORE_PTR(var, v) _Py_atomic_store_ptr_relaxed(&(var), (v))
+static PyMutex module_lock = {0};
+#define LOCK_MODULE() PyMutex_Lock(&module_lock)
+#define UNLOCK_MODULE() PyMutex_Unlock(&module_lock)
+#else
+#define ATOMIC_ADD(var, n) ((var) += (n))
+#define ATOMIC_MAX(var, n) do { \
+    Py_ssize_t _new = (n); \
+    if ((var) < _new) { \
+        (var) = _new; \
+    } \
+} while (0)
+#define LOAD_INT(var) (var)
+#define STORE_INT(var, v) ((var) = (v))
+#define LOAD_UINT(var) (var)
+#define STORE_UINT(var, v) ((var) = (v))
+#define LOAD_SSIZE(var) (var)
+#define STORE_SSIZE(var, v) ((var) = (v))
+#define LOAD_INT64(var) (var)
+#define STORE_INT64(var, v) ((var) = (v))
+#define LOAD_PTR(var) (var)
+#define STORE_PTR(var, v) ((var) = (v))
+#define LOCK_MODULE()
+#define UNLOCK_MODULE()
+#endif
+
+#if PY_VERSION_HEX < 0x030D0000
+#define Py_BEGIN_CRITICAL_SECTION(op) {
+#define Py_END_CRITICAL_SECTION() }
+
+static int
+PyDict_GetItemRef(PyObject *dict, PyObject *key, PyObject **result)
+{
+    *result = PyDict_GetItemWithError(dict, key);
+    Py_XINCREF(*result);
+    return *result ? 1 : (PyErr_Occurred() ? -1 : 0);
+}
+#endif
+
+/* Whether the caller holds the only reference to 'ob', so no other
+ * thread can see it. */
+#ifdef Py_GIL_DISABLED
+#if PY_VERSION_HEX >= 0x030E0000
+#define IS_UNIQUE(ob) PyUnstable_Object_IsUniquelyReferenced(ob)
+#else
+#define IS_UNIQUE(ob) \
+    (_Py_IsOwnedByCurrentThread(ob) && \
+     _Py_atomic_load_uint32_relaxed(&(ob)->ob_ref_local) == 1 && \
+     _Py_atomic_load_ssize_relaxed(&(ob)->ob_ref_shared) == 0)
+#endif
+#else
+#define IS_UNIQUE(ob) (Py_REFCNT(ob) == 1)
+#endif
+
 static PyObject *py__add__, *py__sub__, *py__mul__, *py__div__,
   *py__mod__, *py__pow__, *py__divmod__, *py__lshift__, *py__rshift__,
   *py__and__, *py__or__, *py__xor__, *py__coerce__, *py__neg__,
@@ -39,7 +132,12 @@ static PyObject *py__add__, *py__sub__, *py__mul__, *py__div__,
   *py__cmp__, *py__parent__, *py__iter__, *py__bool__, *py__index__, *py__iadd__,
   *py__isub__, *py__imul__, *py__imod__, *py__ipow__, *py__ilshift__, *py__irshift__,
   *py__iand__, *py__ixor__, *py__ior__, *py__floordiv__, *py__truediv__,
-  *py__ifloordiv__, *py__itruediv__, *py__matmul__, *py__imatmul__, *py__idiv__;
+  *py__ifloordiv__, *py__itruediv__, *py__matmul__, *py__imatmul__, *py__idiv__,
+  *py__aq_acquirable__, *py__aq_local_only__,
+  *py__providedBy__, *py__provides__, *py__implemented__, *py__class__;
+
+/* The __class__ descriptor of object, see Wrapper_getattr_private. */
+static PyObject *object_class_descr = NULL;
 
 static PyObject *Acquired = NULL;
 
@@ -106,7 +204,19 @@ init_py_names(void)
   INIT_PY_NAME(__matmul__);
   INIT_PY_NAME(__imatmul__);
   INIT_PY_NAME(__idiv__);
+  INIT_PY_NAME(__aq_acquirable__);
+  INIT_PY_NAME(__aq_local_only__);
 #undef INIT_PY_NAME
+
+  /* Interned, so that INTERFACE_NAME can compare them by identity. */
+#define INIT_INTERNED_NAME(N) py ## N = PyUnicode_InternFromString(#N)
+  INIT_INTERNED_NAME(__providedBy__);
+  INIT_INTERNED_NAME(__provides__);
+  INIT_INTERNED_NAME(__implemented__);
+  INIT_INTERNED_NAME(__class__);
+#undef INIT_INTERNED_NAME
+
+  object_class_descr = _PyType_Lookup(&PyBaseObject_Type, py__class__);
 }
 
 static PyObject *
@@ -211,12 +321,297 @@ swallow_attribute_error(void)
     return 0;
 }
 
+#if PY_VERSION_HEX >= 0x030D0000
+#define lookup_optional_attr PyObject_GetOptionalAttr
+#else
+#define lookup_optional_attr _PyObject_LookupAttr
+#endif
+
+/* Gets the __parent__ of an object which is not a wrapper.
+ * Most objects at the root of a chain have no __parent__, so this
+ * reports a missing one without raising and clearing an AttributeError
+ * whenever the type allows it: For ExtensionClass and plain Python
+ * objects, a __parent__ not defined on the class (found via the type
+ * attribute cache) can only be in the instance dict.
+ * Returns a new reference.
+ * Returns NULL without an exception set if there is no __parent__.
+ * Returns NULL with an exception set on error.
+ */
+static PyObject *
+get_parent(PyObject *obj)
+{
+    PyTypeObject *tp = Py_TYPE(obj);
+    PyObject **dictptr, *result;
+
+    if (tp->tp_getattro == Py_FindAttr &&
+            tp->tp_dict != NULL &&
+            _PyType_Lookup(tp, py__parent__) == NULL)
+    {
+        dictptr = _PyObject_GetDictPtr(obj);
+        if (dictptr == NULL || *dictptr == NULL) {
+            return NULL;
+        }
+
+        PyDict_GetItemRef(*dictptr, py__parent__, &result);
+        return result;
+    }
+
+    /* This doesn't raise for types using PyObject_GenericGetAttr. */
+    if (lookup_optional_attr(obj, py__parent__, &result) < 0) {
+        return NULL;
+    }
+
+    return result;
+}
+
+/* Returns 1 if 'ob' definitely doesn't have the attribute 'name', so
+ * looking it up would only raise an AttributeError. This is known for
+ * objects using the default ExtensionClass getattro: the type lookup
+ * is served by the type attribute cache (and invalidated on changes of
+ * the class through its version tag), leaving the instance dict to be
+ * checked. 'type_checked' says that the caller already knows the type
+ * doesn't provide the name.
+ * Returns 0 if 'ob' may have the attribute.
+ * Returns -1 on error.
+ */
+static int
+lacks_attribute(PyObject *ob, PyObject *name, int type_checked)
+{
+    PyTypeObject *tp = Py_TYPE(ob);
+    PyObject **dictptr;
+
+    if (tp->tp_getattro != Py_FindAttr ||
+            tp->tp_dict == NULL ||
+            !PyUnicode_CheckExact(name))
+    {
+        return 0;
+    }
+
+    if (!type_checked && _PyType_Lookup(tp, name) != NULL) {
+        return 0;
+    }
+
+    dictptr = _PyObject_GetDictPtr(ob);
+    if (dictptr && *dictptr) {
+        if (PyDict_GetItemWithError(*dictptr, name) != NULL) {
+            return 0;
+        }
+        if (PyErr_Occurred()) {
+            return -1;
+        }
+    }
+
+    return 1;
+}
+
+/* Returns 1 if the policy 'policy' of a class, named 'attr', contains
+ * 'name', 0 if not. Policies must be sets, frozensets or tuples of
+ * names, so that a string doesn't match the substrings of its name.
+ * Returns -1 on error.
+ */
+static int
+policy_contains(PyObject *policy, PyObject *attr, PyObject *name)
+{
+    int result;
+
+    if (!PyAnySet_Check(policy) && !PyTuple_Check(policy)) {
+        PyErr_Format(PyExc_TypeError,
+                     "%U must be a set, frozenset or tuple of names, "
+                     "not %.200s",
+                     attr, Py_TYPE(policy)->tp_name);
+        return -1;
+    }
+
+    Py_INCREF(policy);
+    result = PySequence_Contains(policy, name);
+    Py_DECREF(policy);
+    return result;
+}
+
+/* Returns 1 if the class of 'ob' doesn't let its instances acquire
+ * 'name' from their parents: the name is in its __aq_local_only__, or
+ * the class has an __aq_acquirable__ without the name. Both are looked
+ * up on the class only, which the type attribute cache makes cheap.
+ * Returns 0 if 'ob' may acquire the name.
+ * Returns -1 on error.
+ */
+static int
+acquisition_denied(PyObject *ob, PyObject *name)
+{
+    PyTypeObject *tp = Py_TYPE(ob);
+    PyObject *policy;
+    int result;
+
+    if (tp->tp_dict == NULL) {
+        return 0;
+    }
+
+    policy = _PyType_Lookup(tp, py__aq_local_only__);
+    if (policy != NULL && policy != Py_None) {
+        result = policy_contains(policy, py__aq_local_only__, name);
+        if (result != 0) {
+            return result;
+        }
+    }
+
+    policy = _PyType_Lookup(tp, py__aq_acquirable__);
+    if (policy != NULL && policy != Py_None) {
+        result = policy_contains(policy, py__aq_acquirable__, name);
+        return result < 0 ? -1 : !result;
+    }
+
+    return 0;
+}
+
+/* Whether Wrapper_findattr skips objects lacking a name, and how well
+ * that works. */
+static int name_filter = 0;
+static Py_ssize_t name_filter_probes = 0;
+static Py_ssize_t name_filter_rejects = 0;
+static Py_ssize_t name_filter_false_positives = 0;
+
+#define NAME_FILTER_APPLIES(ob, name) \
+    (Py_TYPE(ob)->tp_getattro == Py_FindAttr && PyUnicode_CheckExact(name))
+
+/* Same as lacks_attribute, but keeps the statistics of the filter. */
+static int
+name_filter_rejects_attribute(PyObject *ob, PyObject *name)
+{
+    int result;
+
+    if (!NAME_FILTER_APPLIES(ob, name)) {
+        return 0;
+    }
+
+    ATOMIC_ADD(name_filter_probes, 1);
+    if ((result = lacks_attribute(ob, name, 0)) == 1) {
+        ATOMIC_ADD(name_filter_rejects, 1);
+    }
+
+    return result;
+}
+
+/* Statistics of the acquisition engine, only kept while stats_enabled
+ * is set, see module_stats. */
+
+#define STATS_MAX_LEVELS 32
+
+typedef struct {
+    Py_ssize_t findattr_calls;
+    Py_ssize_t lookups;
+    /* Number of lookups by the levels they walked, the last entry
+     * counts all lookups with STATS_MAX_LEVELS or more. */
+    Py_ssize_t levels[STATS_MAX_LEVELS + 1];
+    Py_ssize_t parent_hops;
+    Py_ssize_t filter_calls;
+    Py_ssize_t filter_accepts;
+    Py_ssize_t filter_rejects;
+    Py_ssize_t wrappers_created;
+    Py_ssize_t of_simplifications;
+    Py_ssize_t clone_copies;
+} AcquisitionStats;
+
+static AcquisitionStats stats;
+static int stats_enabled = 0;
+
+#define COUNT(field) do { \
+    if (LOAD_INT(stats_enabled)) { \
+        ATOMIC_ADD(stats.field, 1); \
+    } \
+} while (0)
+
+/* Number of wrappers created so far, for the trace of the lookups. */
+static Py_ssize_t wrappers_allocated = 0;
+
+/* Memory used by the live wrappers: the number of wrappers, their size
+ * in bytes and the highest size since the last reset, see
+ * module_wrapper_memory. tracemalloc already traces them, as objects
+ * allocated by Python.
+ */
+static Py_ssize_t wrapper_memory_live = 0;
+static Py_ssize_t wrapper_memory_current = 0;
+static Py_ssize_t wrapper_memory_peak = 0;
+
+static void
+track_wrapper(PyObject *self)
+{
+    Py_ssize_t size = Py_TYPE(self)->tp_basicsize;
+
+    ATOMIC_ADD(wrapper_memory_live, 1);
+    ATOMIC_ADD(wrapper_memory_current, size);
+    ATOMIC_MAX(wrapper_memory_peak, LOAD_SSIZE(wrapper_memory_current));
+}
+
+static void
+untrack_wrapper(PyObject *self)
+{
+    ATOMIC_ADD(wrapper_memory_live, -1);
+    ATOMIC_ADD(wrapper_memory_current, -Py_TYPE(self)->tp_basicsize);
+}
+
+/* Census of the live wrappers, see module_set_census. Maps the address
+ * of each wrapper created while the census is enabled to its serial
+ * number, the entry is removed when the wrapper is deallocated.
+ */
+static PyObject *census = NULL;
+static int census_enabled = 0;
+static unsigned long long census_serial = 0;
+
+/* Adds a new wrapper to the census. Errors are swallowed, the census
+ * must not break the creation of wrappers. */
+static void
+census_add(PyObject *self)
+{
+    PyObject *key, *serial;
+
+#if defined(Py_GIL_DISABLED) && PY_VERSION_HEX >= 0x030E0000
+    /* For module_census_wrappers. */
+    PyUnstable_EnableTryIncRef(self);
+#endif
+
+    LOCK_MODULE();
+    key = PyLong_FromVoidPtr(self);
+    serial = PyLong_FromUnsignedLongLong(++census_serial);
+    if (key == NULL || serial == NULL ||
+        PyDict_SetItem(census, key, serial) < 0)
+    {
+        PyErr_Clear();
+    }
+    Py_XDECREF(key);
+    Py_XDECREF(serial);
+    UNLOCK_MODULE();
+}
+
+/* Removes a deallocated wrapper from the census. */
+static void
+census_remove(PyObject *self)
+{
+    PyObject *type, *value, *traceback, *key;
+
+    PyErr_Fetch(&type, &value, &traceback);
+    LOCK_MODULE();
+    if ((key = PyLong_FromVoidPtr(self)) == NULL ||
+        PyDict_DelItem(census, key) < 0)
+    {
+        /* Wrappers created before the census was enabled. */
+        PyErr_Clear();
+    }
+    Py_XDECREF(key);
+    UNLOCK_MODULE();
+    PyErr_Restore(type, value, traceback);
+}
+
 /* Declarations for objects of type Wrapper */
 
 typedef struct {
   PyObject_HEAD
   PyObject *obj;
   PyObject *container;
+#ifdef Py_GIL_DISABLED
+  /* Former values of 'obj' and 'container' which other threads may
+   * still use, see wrapper_set_field. */
+  PyObject *retired;
+#endif
 } Wrapper;
 
 static PyExtensionClass Wrappertype, XaqWrappertype;
@@ -226,6 +621,41 @@ static PyExtensionClass Wrappertype, XaqWrappertype;
 
 #define isWrapper(o) (isImplicitWrapper(o) || isExplicitWrapper(o))
 
+/* Stores 'value', a new reference or NULL, in the 'obj' or 'container'
+ * field of 'self'. In free-threaded builds other threads may be looking
+ * up attributes through 'self' with borrowed references to the former
+ * value, so unless the caller holds the only reference to 'self', the
+ * former value is kept alive until 'self' is deallocated.
+ */
+static void
+wrapper_set_field(Wrapper *self, PyObject **field, PyObject *value)
+{
+    PyObject *old;
+
+    Py_BEGIN_CRITICAL_SECTION(self);
+    old = *field;
+#ifdef Py_GIL_DISABLED
+    _Py_atomic_store_ptr_release(field, value);
+    if (old != NULL && !IS_UNIQUE(OBJECT(self))) {
+        if (self->retired == NULL) {
+            self->retired = PyList_New(0);
+        }
+        if (self->retired != NULL && PyList_Append(self->retired, old) == 0) {
+            Py_DECREF(old);
+        } else {
+            /* Rather leak it than release it too early. */
+            PyErr_Clear();
+        }
+        old = NULL;
+    }
+#else
+    *field = value;
+#endif
+    Py_END_CRITICAL_SECTION();
+
+    Py_XDECREF(old);
+}
+
 /* Same as isWrapper but does a check for NULL pointer. */
 #define XisWrapper(o) ((o) ? isWrapper(o) : 0)
 
@@ -234,6 +664,11 @@ static PyExtensionClass Wrappertype, XaqWrappertype;
 #define newWrapper(obj, container, Wrappertype) \
     PyObject_CallFunctionObjArgs(OBJECT(Wrappertype), obj, container, NULL)
 
+/* The __of__ methods of Acquirer and ExplicitAcquirer, used to recognize
+ * objects which get wrapped by the stock implementation. */
+static PyObject *Acquirer__of__ = NULL;
+static PyObject *ExplicitAcquirer__of__ = NULL;
+
 static char *init_kwlist[] = {"obj", "container", NULL};
 
 static int
@@ -257,16 +692,14 @@ Wrapper_init(Wrapper *self, PyObject *args, PyObject *kwargs)
     }
 
     /* Avoid memory leak if __init__ is called multiple times. */
-    Py_CLEAR(self->obj);
-    Py_CLEAR(self->container);
-
     Py_INCREF(obj);
-    self->obj = obj;
+    wrapper_set_field(self, &self->obj, obj);
 
-    if (container != Py_None) {
-        Py_INCREF(container);
-        self->container = container;
+    if (container == Py_None) {
+        container = NULL;
     }
+    Py_XINCREF(container);
+    wrapper_set_field(self, &self->container, container);
 
     return 0;
 }
@@ -275,11 +708,20 @@ static PyObject *
 Wrapper__new__(PyTypeObject *type, PyObject *args, PyObject *kwargs)
 {
     Wrapper *self = WRAPPER(type->tp_alloc(type, 0));
+    if (self == NULL) {
+        return NULL;
+    }
+    track_wrapper(OBJECT(self));
     if (Wrapper_init(self, args, kwargs) == -1) {
         Py_DECREF(self);
         return NULL;
     }
 
+    COUNT(wrappers_created);
+    ATOMIC_ADD(wrappers_allocated, 1);
+    if (LOAD_INT(census_enabled)) {
+        census_add(OBJECT(self));
+    }
     return OBJECT(self);
 }
 
@@ -290,6 +732,98 @@ Wrapper__init__(Wrapper *self, PyObject *args, PyObject *kwargs)
     return Wrapper_init(self, args, kwargs);
 }
 
+/* Creates a new wrapper without going through the argument parsing of
+ * Wrapper__new__ and Wrapper__init__. Only to be used for the exact
+ * wrapper types, subclasses must be created with newWrapper.
+ * Returns a new reference.
+ * Returns NULL on error.
+ */
+static PyObject *
+Wrapper_New(PyTypeObject *type, PyObject *obj, PyObject *container)
+{
+    Wrapper *self = WRAPPER(type->tp_alloc(type, 0));
+    if (self == NULL) {
+        return NULL;
+    }
+
+    track_wrapper(OBJECT(self));
+    COUNT(wrappers_created);
+    ATOMIC_ADD(wrappers_allocated, 1);
+    if (LOAD_INT(census_enabled)) {
+        census_add(OBJECT(self));
+    }
+    Py_INCREF(obj);
+    self->obj = obj;
+
+    if (container != Py_None) {
+        Py_INCREF(container);
+        self->container = container;
+    }
+
+    return OBJECT(self);
+}
+
+/* Cache of the wrappers created for objects which are not wrapped but
+ * have a __parent__ pointer, keyed by the address of the object. The
+ * cached wrappers hold the object, so the address can't be reused while
+ * the entry exists. Disabled while parent_cache_size is 0.
+ */
+static PyObject *parent_cache = NULL;
+static Py_ssize_t parent_cache_size = 0;
+
+/* Creates a wrapper for 'obj' in the context of 'parent', which is the
+ * current value of its __parent__. With the parent cache enabled the
+ * wrapper is shared between lookups and must not be mutated.
+ * Returns a new reference.
+ * Returns NULL on error.
+ */
+static PyObject *
+parent_wrapper(PyObject *obj, PyObject *parent)
+{
+    PyObject *key, *result;
+    Py_ssize_t size = LOAD_SSIZE(parent_cache_size);
+
+    if (size <= 0) {
+        return newWrapper(obj, parent, &Wrappertype);
+    }
+
+    if ((key = PyLong_FromVoidPtr(obj)) == NULL) {
+        return NULL;
+    }
+
+    if (PyDict_GetItemRef(parent_cache, key, &result) < 0) {
+        Py_DECREF(key);
+        return NULL;
+    }
+    if (result != NULL &&
+            WRAPPER(result)->obj == obj &&
+            WRAPPER(result)->container == parent)
+    {
+        Py_DECREF(key);
+        return result;
+    }
+    Py_XDECREF(result);
+
+    if ((result = newWrapper(obj, parent, &Wrappertype)) == NULL) {
+        Py_DECREF(key);
+        return NULL;
+    }
+
+    /* Start over instead of tracking the usage of the entries. */
+    if (PyDict_GET_SIZE(parent_cache) >= size) {
+        PyDict_Clear(parent_cache);
+    }
+
+    if (PyDict_SetItem(parent_cache, key, result) < 0) {
+        Py_DECREF(key);
+        Py_DECREF(result);
+        return NULL;
+    }
+
+    Py_DECREF(key);
+    return result;
+}
+
 /* ---------------------------------------------------------------- */
 
 /* Creates a new Wrapper object with the values from the old one.
@@ -303,10 +837,11 @@ clone_wrapper(Wrapper *ob)
     PyObject *tmp;
 
     /* Only clone if its shared with others. */
-    if (Py_REFCNT(ob) == 1) {
+    if (IS_UNIQUE(OBJECT(ob))) {
         return (PyObject*) ob;
     }
 
+    COUNT(clone_copies);
     tmp = newWrapper(ob->obj, ob->container, Py_TYPE(ob));
     Py_DECREF(ob);
     return tmp;
@@ -329,6 +864,7 @@ __of__(PyObject *inst, PyObject *parent)
             }
 
             /* Simplify wrapper */
+            COUNT(of_simplifications);
             Py_XINCREF(WRAPPER(WRAPPER(result)->obj)->obj);
             ASSIGN(WRAPPER(result)->obj, WRAPPER(WRAPPER(result)->obj)->obj);
         }
@@ -391,6 +927,9 @@ Wrapper_traverse(Wrapper *self, visitproc visit, void *arg)
 {
     Py_VISIT(self->obj);
     Py_VISIT(self->container);
+#ifdef Py_GIL_DISABLED
+    Py_VISIT(self->retired);
+#endif
     return 0;
 }
 
@@ -399,12 +938,19 @@ Wrapper_clear(Wrapper *self)
 {
     Py_CLEAR(self->obj);
     Py_CLEAR(self->container);
+#ifdef Py_GIL_DISABLED
+    Py_CLEAR(self->retired);
+#endif
     return 0;
 }
 
 static void
 Wrapper_dealloc(Wrapper *self)
 {
+    if (LOAD_INT(census_enabled)) {
+        census_remove(OBJECT(self));
+    }
+    untrack_wrapper(OBJECT(self));
     PyObject_GC_UnTrack(OBJECT(self));
     Wrapper_clear(self);
     Py_TYPE(self)->tp_free(OBJECT(self));
@@ -513,6 +1059,7 @@ apply_filter(PyObject *filter, PyObject *inst, PyObject *oname, PyObject *r,
     PyObject *py_res;
     int res;
 
+    COUNT(filter_calls);
     py_res = PyObject_CallFunctionObjArgs(filter, orig, inst, oname, r, extra, NULL);
     if (py_res == NULL) {
         Py_DECREF(r);
@@ -523,53 +1070,503 @@ apply_filter(PyObject *filter, PyObject *inst, PyObject *oname, PyObject *r,
     Py_DECREF(py_res);
 
     if (res == 0 || res == -1) {
+        if (res == 0) {
+            COUNT(filter_rejects);
+        }
         Py_DECREF(r);
         return res;
     }
 
+    COUNT(filter_accepts);
     return 1;
 }
 
-static PyObject *
-Wrapper_acquire(Wrapper *self, PyObject *oname,
-                PyObject *filter, PyObject *extra, PyObject *orig,
-                int explicit, int containment);
-
-static PyObject *
-Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
-                      PyObject *filter, PyObject *extra, PyObject *orig,
-                      int sob, int sco, int explicit, int containment);
-
-static PyObject *
-Wrapper_findattr(Wrapper *self, PyObject *oname,
-                 PyObject *filter, PyObject *extra, PyObject *orig,
-                 int sob, int sco, int explicit, int containment)
-/*
-  Parameters:
-
-  sob
-    Search self->obj for the 'oname' attribute
+/* Binary trace of the lookups, see module_set_trace. The records are
+ * kept in a ring buffer of trace_capacity entries, trace_count is the
+ * number of lookups recorded since the trace was started. Names and
+ * types are stored as indexes into the trace_names and trace_types
+ * dicts, which map them to their index.
+ */
+typedef struct {
+    /* Performance counter at the end of the lookup in nanoseconds. */
+    uint64_t time;
+    uint32_t name;
+    /* Type of the object the lookup was started on. */
+    uint32_t type;
+    uint16_t levels;
+    uint16_t misses;
+    uint8_t kind;
+    uint8_t reserved;
+    /* Number of wrappers created during the lookup. */
+    uint16_t wrappers;
+} TraceRecord;
+
+enum {TRACE_FOUND, TRACE_ACQUIRED, TRACE_MISSING, TRACE_ERROR};
+
+static TraceRecord *trace_records = NULL;
+static Py_ssize_t trace_capacity = 0;
+static unsigned long long trace_count = 0;
+static PyObject *trace_names = NULL;
+static PyObject *trace_types = NULL;
+
+/* State shared by all levels of a single lookup. It lives on the stack
+ * of the function starting the lookup.
+ */
+typedef struct {
+    /* Store the wrappers created for __parent__ pointers in the
+     * wrappers of the chain, see Wrapper_acquire. */
+    int mutate;
+    /* Number of levels searched so far. */
+    Py_ssize_t levels;
+    /* Number of objects which didn't provide the name. */
+    Py_ssize_t misses;
+    /* Where an acquired name was found, only set by the profiler:
+     * The name (borrowed), the type of the object providing it and the
+     * level of the object. */
+    PyObject *name;
+    PyTypeObject *provider;
+    Py_ssize_t depth;
+    /* Start of the lookup in nanoseconds, only set while there is a
+     * slow lookup hook or for aq_explain. */
+    int64_t start;
+    /* List of the steps of the lookup, only set for aq_explain. */
+    PyObject *steps;
+    /* Value of wrappers_allocated at the start of the lookup, only set
+     * while tracing. */
+    Py_ssize_t wrappers;
+    /* Set of the (object, container) pairs searched, only created when
+     * the lookup gets deeper than CYCLE_GUARD_LEVELS, see check_depth. */
+    PyObject *visited;
+} LookupState;
+
+/* Maximum number of levels searched by a lookup, 0 for no limit, see
+ * module_set_max_depth. */
+static Py_ssize_t max_depth = 0;
+
+/* Lookups deeper than this check for cycles in the chain. */
+#define CYCLE_GUARD_LEVELS 64
+
+/* Hook called for lookups which searched more than slow_lookup_levels
+ * levels or took more than slow_lookup_time_ns nanoseconds, see
+ * module_set_slow_lookup_hook. A threshold of 0 is not checked.
+ */
+static PyObject *slow_lookup_hook = NULL;
+static Py_ssize_t slow_lookup_levels = 0;
+static int64_t slow_lookup_time_ns = 0;
+/* Set while the current thread runs the hook, whose own lookups are
+ * not reported. */
+static Py_tss_t in_slow_lookup_hook = Py_tss_NEEDS_INIT;
+
+/* Returns the value of the performance counter in nanoseconds. */
+static int64_t
+perf_counter_ns(void)
+{
+#if PY_VERSION_HEX >= 0x030D0000
+    PyTime_t t;
+    if (PyTime_PerfCounterRaw(&t) < 0) {
+        return 0;
+    }
+    return t;
+#else
+    return _PyTime_GetPerfCounter();
+#endif
+}
 
-  sco
-    Search self->container for the 'oname' attribute
+/* Whether lookups store the wrappers created for __parent__ pointers,
+ * unless a caller asks otherwise. */
+static int mutate_wrappers = 1;
+
+#define LOOKUP_STATE(state) \
+    LookupState state = {LOAD_INT(mutate_wrappers), 0, 0, NULL, NULL, 0, \
+                         LOAD_PTR(slow_lookup_hook) ? perf_counter_ns() : 0, \
+                         NULL, \
+                         LOAD_PTR(trace_records) ? \
+                            LOAD_SSIZE(wrappers_allocated) : 0, \
+                         NULL}
+
+/* Sampling profiler of the acquired names, see module_set_profiler.
+ * Every profiler_interval-th acquisition is counted in 'profile', keyed
+ * by (name, depth, type of the provider, misses). It holds at most
+ * profiler_max_entries keys, samples with new keys are dropped once it
+ * is full. Disabled while profiler_interval is 0.
+ */
+static PyObject *profile = NULL;
+static Py_ssize_t profiler_interval = 0;
+static Py_ssize_t profiler_max_entries = 1000;
+static Py_ssize_t profiler_countdown = 0;
+static Py_ssize_t profiler_dropped = 0;
+
+/* Remembers where 'oname' was found for the profiler, 'depth' is the
+ * level of 'obj' in the lookup. Names found on the object of the first
+ * level are not acquired. */
+static void
+profile_hit(LookupState *state, PyObject *obj, PyObject *oname,
+            Py_ssize_t depth)
+{
+    if (depth > 1) {
+        Py_XDECREF(state->provider);
+        Py_INCREF(Py_TYPE(obj));
+        state->provider = Py_TYPE(obj);
+        state->name = oname;
+        state->depth = depth;
+    }
+}
 
-  explicit
-    Explicitly acquire 'oname' attribute from container (assumed with
-    implicit acquisition wrapper)
+#define PROFILE_HIT(state, obj, oname, depth) do { \
+    if (LOAD_SSIZE(profiler_interval)) { \
+        profile_hit(state, obj, oname, depth); \
+    } \
+} while (0)
 
-  containment
-    Use the innermost wrapper ("aq_inner") for looking up the 'oname'
-    attribute.
-*/
+/* Counts the acquisition remembered in 'state' if it is sampled.
+ * Errors are swallowed, the profiler must not break lookups. */
+static void
+profile_lookup(LookupState *state)
 {
-    PyObject *tmp, *result;
+    PyObject *key, *count;
 
-    if ((tmp = convert_name(oname)) == NULL) {
-        return NULL;
+    LOCK_MODULE();
+    if (--profiler_countdown > 0) {
+        UNLOCK_MODULE();
+        return;
     }
+    profiler_countdown = profiler_interval;
 
-    result = Wrapper_findattr_name(self, PyBytes_AS_STRING(tmp), oname, filter,
-                                   extra, orig, sob, sco, explicit, containment);
+    key = Py_BuildValue("(OnOn)", state->name, state->depth,
+                        OBJECT(state->provider), state->misses);
+    if (key == NULL) {
+        PyErr_Clear();
+        UNLOCK_MODULE();
+        return;
+    }
+
+    if ((count = PyDict_GetItemWithError(profile, key))) {
+        count = PyLong_FromSsize_t(PyLong_AsSsize_t(count) + 1);
+    } else if (PyErr_Occurred()) {
+        count = NULL;
+    } else if (PyDict_GET_SIZE(profile) >= profiler_max_entries) {
+        profiler_dropped++;
+        Py_DECREF(key);
+        UNLOCK_MODULE();
+        return;
+    } else {
+        count = PyLong_FromLong(1);
+    }
+
+    if (count == NULL || PyDict_SetItem(profile, key, count) < 0) {
+        PyErr_Clear();
+    }
+    Py_XDECREF(count);
+    Py_DECREF(key);
+    UNLOCK_MODULE();
+}
+
+static PyObject *capi_aq_chain(PyObject *self, int containment);
+
+/* Appends a step of the lookup to the list of aq_explain: what happened
+ * ('step' and 'detail') on which level to an object of which type.
+ * Returns -1 on error.
+ */
+static int
+add_step(LookupState *state, const char *step, PyObject *ob,
+         const char *detail)
+{
+    PyObject *record;
+    int r;
+
+    record = Py_BuildValue(
+        "{s:s,s:n,s:O,s:z,s:d}",
+        "step", step,
+        "level", state->levels,
+        "type", ob ? OBJECT(Py_TYPE(get_base(ob))) : Py_None,
+        "detail", detail,
+        "time", (perf_counter_ns() - state->start) / 1000.0);
+    if (record == NULL) {
+        return -1;
+    }
+
+    r = PyList_Append(state->steps, record);
+    Py_DECREF(record);
+    return r;
+}
+
+#define ADD_STEP(state, step, ob, detail) \
+    ((state)->steps ? add_step(state, step, ob, detail) : 0)
+
+/* Calls the slow lookup hook for the lookup of 'oname' on 'ob'.
+ * Errors of the hook are reported as unraisable, the hook must not
+ * break lookups. */
+static void
+report_slow_lookup(LookupState *state, PyObject *ob, PyObject *oname,
+                   PyObject *filter, double elapsed)
+{
+    PyObject *type, *value, *traceback;
+    PyObject *hook, *chain, *info = NULL, *r;
+    Py_ssize_t i;
+
+    if (PyThread_tss_get(&in_slow_lookup_hook) != NULL) {
+        return;
+    }
+
+    PyErr_Fetch(&type, &value, &traceback);
+
+    /* The hook may replace itself. */
+    LOCK_MODULE();
+    hook = slow_lookup_hook;
+    Py_XINCREF(hook);
+    UNLOCK_MODULE();
+    if (hook == NULL) {
+        PyErr_Restore(type, value, traceback);
+        return;
+    }
+
+    /* The shape of the chain: the types of the objects on each level. */
+    if ((chain = capi_aq_chain(ob, 0)) == NULL) {
+        goto finally;
+    }
+    for (i = 0; i < PyList_GET_SIZE(chain); i++) {
+        PyObject *tp = OBJECT(Py_TYPE(get_base(PyList_GET_ITEM(chain, i))));
+        Py_INCREF(tp);
+        PyList_SetItem(chain, i, tp);
+    }
+
+    info = Py_BuildValue("{s:O,s:n,s:d,s:O,s:N}",
+                         "name", oname,
+                         "levels", state->levels,
+                         "elapsed", elapsed,
+                         "filter", filter ? filter : Py_None,
+                         "chain", chain);
+    if (info == NULL) {
+        goto finally;
+    }
+
+    if (PyThread_tss_set(&in_slow_lookup_hook, &in_slow_lookup_hook) != 0) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "can't mark the slow lookup hook as running");
+        goto finally;
+    }
+    r = PyObject_CallFunctionObjArgs(hook, info, NULL);
+    Py_XDECREF(r);
+    PyThread_tss_set(&in_slow_lookup_hook, NULL);
+
+finally:
+    if (PyErr_Occurred()) {
+        PyErr_WriteUnraisable(hook);
+    }
+    Py_DECREF(hook);
+    Py_XDECREF(info);
+    PyErr_Restore(type, value, traceback);
+}
+
+/* Returns the index of 'key' in 'table', adding it if it is new.
+ * Returns -1 on error.
+ */
+static Py_ssize_t
+trace_index(PyObject *table, PyObject *key)
+{
+    PyObject *index;
+    Py_ssize_t result;
+
+    if ((index = PyDict_GetItemWithError(table, key))) {
+        return PyLong_AsSsize_t(index);
+    }
+    if (PyErr_Occurred()) {
+        return -1;
+    }
+
+    result = PyDict_GET_SIZE(table);
+    if ((index = PyLong_FromSsize_t(result)) == NULL) {
+        return -1;
+    }
+    if (PyDict_SetItem(table, key, index) < 0) {
+        result = -1;
+    }
+    Py_DECREF(index);
+    return result;
+}
+
+#define CLIP16(n) ((uint16_t)Py_MIN((n), 0xffff))
+
+/* Appends the lookup of 'oname' on 'ob' to the trace. Errors are
+ * swallowed, tracing must not break lookups. */
+static void
+trace_lookup(LookupState *state, PyObject *ob, PyObject *oname)
+{
+    PyObject *type, *value, *traceback;
+    TraceRecord *record;
+    Py_ssize_t name, tp;
+    int kind;
+
+    if (!PyErr_Occurred()) {
+        kind = state->misses ? TRACE_ACQUIRED : TRACE_FOUND;
+    } else if (PyErr_ExceptionMatches(PyExc_AttributeError)) {
+        kind = TRACE_MISSING;
+    } else {
+        kind = TRACE_ERROR;
+    }
+
+    PyErr_Fetch(&type, &value, &traceback);
+    LOCK_MODULE();
+
+    /* Another thread may have stopped or restarted the trace since the
+     * caller checked it. */
+    if (trace_records == NULL || trace_capacity == 0) {
+        UNLOCK_MODULE();
+        PyErr_Restore(type, value, traceback);
+        return;
+    }
+
+    name = trace_index(trace_names, oname);
+    tp = name < 0 ? -1 : trace_index(trace_types,
+                                     OBJECT(Py_TYPE(get_base(ob))));
+    if (tp < 0) {
+        PyErr_Clear();
+    } else {
+        record = &trace_records[trace_count++ % trace_capacity];
+        record->time = (uint64_t)perf_counter_ns();
+        record->name = (uint32_t)name;
+        record->type = (uint32_t)tp;
+        record->levels = CLIP16(state->levels);
+        record->misses = CLIP16(state->misses);
+        record->kind = (uint8_t)kind;
+        record->reserved = 0;
+        record->wrappers = CLIP16(LOAD_SSIZE(wrappers_allocated) -
+                                  state->wrappers);
+    }
+
+    UNLOCK_MODULE();
+    PyErr_Restore(type, value, traceback);
+}
+
+/* Records the statistics of a finished lookup of 'oname' on 'ob'. */
+static void
+end_lookup(LookupState *state, PyObject *ob, PyObject *oname,
+           PyObject *filter)
+{
+    int64_t elapsed, time;
+    Py_ssize_t levels;
+
+    if (LOAD_INT(stats_enabled)) {
+        ATOMIC_ADD(stats.lookups, 1);
+        ATOMIC_ADD(stats.levels[Py_MIN(state->levels, STATS_MAX_LEVELS)], 1);
+    }
+
+    if (state->provider) {
+        if (LOAD_SSIZE(profiler_interval) && !PyErr_Occurred()) {
+            profile_lookup(state);
+        }
+        Py_CLEAR(state->provider);
+    }
+
+    if (LOAD_PTR(slow_lookup_hook) && state->start) {
+        elapsed = perf_counter_ns() - state->start;
+        levels = LOAD_SSIZE(slow_lookup_levels);
+        time = LOAD_INT64(slow_lookup_time_ns);
+        if ((levels && state->levels > levels) || (time && elapsed > time)) {
+            report_slow_lookup(state, ob, oname, filter, elapsed / 1000.0);
+        }
+    }
+
+    if (LOAD_PTR(trace_records)) {
+        trace_lookup(state, ob, oname);
+    }
+
+    Py_CLEAR(state->visited);
+}
+
+/* Fails lookups exceeding max_depth and those searching the same object
+ * in the same container twice, which only happens in a cycle. Only
+ * lookups deeper than CYCLE_GUARD_LEVELS pay for the latter.
+ * Returns -1 on error.
+ */
+static int
+check_depth(Wrapper *self, PyObject *oname, LookupState *state)
+{
+    PyObject *key;
+    Py_ssize_t depth = LOAD_SSIZE(max_depth);
+    int seen;
+
+    if (depth && state->levels > depth) {
+        PyErr_Format(PyExc_RuntimeError,
+                     "Acquisition depth limit of %zd exceeded looking up %R",
+                     depth, oname);
+        return -1;
+    }
+
+    if (state->levels <= CYCLE_GUARD_LEVELS) {
+        return 0;
+    }
+
+    if (!state->visited && (state->visited = PySet_New(NULL)) == NULL) {
+        return -1;
+    }
+
+    key = Py_BuildValue(
+        "(NN)", PyLong_FromVoidPtr(self->obj),
+        PyLong_FromVoidPtr(self->container ? get_base(self->container) : NULL));
+    if (key == NULL) {
+        return -1;
+    }
+
+    if ((seen = PySet_Contains(state->visited, key)) == 0) {
+        seen = PySet_Add(state->visited, key);
+    } else if (seen == 1) {
+        PyErr_Format(PyExc_RuntimeError,
+                     "Cycle detected in acquisition chain looking up %R",
+                     oname);
+        seen = -1;
+    }
+
+    Py_DECREF(key);
+    return seen;
+}
+
+static PyObject *
+Wrapper_acquire(Wrapper *self, PyObject *oname,
+                PyObject *filter, PyObject *extra, PyObject *orig,
+                int explicit, int containment, LookupState *state);
+
+static PyObject *
+Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
+                      PyObject *filter, PyObject *extra, PyObject *orig,
+                      int sob, int sco, int explicit, int containment,
+                      LookupState *state);
+
+static PyObject *
+Wrapper_findattr(Wrapper *self, PyObject *oname,
+                 PyObject *filter, PyObject *extra, PyObject *orig,
+                 int sob, int sco, int explicit, int containment,
+                 LookupState *state)
+/*
+  Parameters:
+
+  sob
+    Search self->obj for the 'oname' attribute
+
+  sco
+    Search self->container for the 'oname' attribute
+
+  explicit
+    Explicitly acquire 'oname' attribute from container (assumed with
+    implicit acquisition wrapper)
+
+  containment
+    Use the innermost wrapper ("aq_inner") for looking up the 'oname'
+    attribute.
+
+  state
+    The state of the whole lookup, see LookupState.
+*/
+{
+    PyObject *tmp, *result;
+
+    if ((tmp = convert_name(oname)) == NULL) {
+        return NULL;
+    }
+
+    result = Wrapper_findattr_name(self, PyBytes_AS_STRING(tmp), oname, filter,
+                                   extra, orig, sob, sco, explicit, containment,
+                                   state);
     Py_XDECREF(tmp);
     return result;
 }
@@ -577,7 +1574,8 @@ Wrapper_findattr(Wrapper *self, PyObject *oname,
 static PyObject *
 Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
                       PyObject *filter, PyObject *extra, PyObject *orig,
-                      int sob, int sco, int explicit, int containment)
+                      int sob, int sco, int explicit, int containment,
+                      LookupState *state)
 /*
  Exactly the same as Wrapper_findattr, except that the incoming
  Python name string/unicode object has already been decoded
@@ -594,6 +1592,16 @@ Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
 */
 {
     PyObject *r;
+    int skip;
+
+    COUNT(findattr_calls);
+    state->levels++;
+
+    if ((LOAD_SSIZE(max_depth) || state->levels > CYCLE_GUARD_LEVELS) &&
+        check_depth(self, oname, state) < 0)
+    {
+        return NULL;
+    }
 
     if (STR_STARTSWITH(name, "aq_") || STR_EQ(name, "__parent__")) {
         /* __parent__ is an alias to aq_parent */
@@ -614,7 +1622,8 @@ Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
     } else if (STR_STARTSWITH(name, "__") &&
                     (STR_EQ(name, "__reduce__") ||
                      STR_EQ(name, "__reduce_ex__") ||
-                     STR_EQ(name, "__getstate__"))) {
+                     STR_EQ(name, "__getstate__") ||
+                     STR_EQ(name, "__sizeof__"))) {
 
         return PyObject_GenericGetAttr(OBJECT(self), oname);
     }
@@ -641,7 +1650,8 @@ Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
                     or object is implicit acquirer */
                     explicit || isImplicitWrapper(self->obj),
                     explicit,
-                    containment);
+                    containment,
+                    state);
 
             if (r) {
                 if (PyECMethod_Check(r) && PyECMethod_Self(r) == self->obj) {
@@ -665,12 +1675,30 @@ Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
             return NULL;
         }
 
+        /* Skip the normal lookup if the object can't have the name. */
+        else if (LOAD_INT(name_filter) &&
+                 (skip = name_filter_rejects_attribute(self->obj,
+                                                       oname)) != 0)
+        {
+            if (skip < 0) {
+                return NULL;
+            }
+            state->misses++;
+            if (ADD_STEP(state, "probe", self->obj, "skipped") < 0) {
+                return NULL;
+            }
+        }
+
         /* normal attribute lookup */
         else if ((r = PyObject_GetAttr(self->obj, oname))) {
             if (r == Acquired) {
                 Py_DECREF(r);
+                if (ADD_STEP(state, "probe", self->obj, "Acquired") < 0) {
+                    return NULL;
+                }
                 return Wrapper_acquire(
-                        self, oname, filter, extra, orig, 1, containment);
+                        self, oname, filter, extra, orig, 1, containment,
+                        state);
             }
 
             if (PyECMethod_Check(r) && PyECMethod_Self(r) == self->obj) {
@@ -682,22 +1710,58 @@ Wrapper_findattr_name(Wrapper *self, char* name, PyObject *oname,
             if (r && filter) {
                 switch(apply_filter(filter, OBJECT(self), oname, r, extra, orig)) {
                     case -1: return NULL;
-                    case 1: return r;
+                    case 1:
+                        PROFILE_HIT(state, self->obj, oname, state->levels);
+                        if (ADD_STEP(state, "probe", self->obj, "found") < 0) {
+                            Py_DECREF(r);
+                            return NULL;
+                        }
+                        return r;
+                }
+                state->misses++;
+                if (ADD_STEP(state, "probe", self->obj, "rejected") < 0) {
+                    return NULL;
                 }
             } else {
+                if (r) {
+                    PROFILE_HIT(state, self->obj, oname, state->levels);
+                    if (ADD_STEP(state, "probe", self->obj, "found") < 0) {
+                        Py_DECREF(r);
+                        return NULL;
+                    }
+                }
                 return r;
             }
         } else if (!swallow_attribute_error()) {
             return NULL;
+        } else {
+            state->misses++;
+            if (LOAD_INT(name_filter) &&
+                    NAME_FILTER_APPLIES(self->obj, oname))
+            {
+                ATOMIC_ADD(name_filter_false_positives, 1);
+            }
+            if (ADD_STEP(state, "probe", self->obj, "missing") < 0) {
+                return NULL;
+            }
         }
 
         PyErr_Clear();
     }
 
-    /* Lookup has failed, acquire it from parent. */
+    /* Lookup has failed, acquire it from parent, unless the class of
+     * the object forbids it. */
     if (sco && (*name != '_' || explicit)) {
-        return Wrapper_acquire(
-                self, oname, filter, extra, orig, explicit, containment);
+        if ((sco = acquisition_denied(self->obj, oname)) == 0) {
+            return Wrapper_acquire(
+                    self, oname, filter, extra, orig, explicit, containment,
+                    state);
+        }
+        if (sco < 0 ||
+            ADD_STEP(state, "prune", self->obj, "sco: class policy") < 0)
+        {
+            return NULL;
+        }
     }
 
     PyErr_SetObject(PyExc_AttributeError, oname);
@@ -712,9 +1776,10 @@ Wrapper_acquire(
     PyObject *extra,
     PyObject *orig,
     int explicit,
-    int containment)
+    int containment,
+    LookupState *state)
 {
-    PyObject *r;
+    PyObject *r, *container;
     int sob = 1;
     int sco = 1;
 
@@ -733,8 +1798,16 @@ Wrapper_acquire(
              */
             if (WRAPPER(self->obj)->container == WRAPPER(self->container)->container) {
                 sco = 0;
+                if (ADD_STEP(state, "prune", self->container,
+                             "sco: repeated container") < 0) {
+                    return NULL;
+                }
             } else if (WRAPPER(self->obj)->container == WRAPPER(self->container)->obj) {
                 sob = 0;
+                if (ADD_STEP(state, "prune", self->container,
+                             "sob: repeated object") < 0) {
+                    return NULL;
+                }
             }
         }
 
@@ -744,10 +1817,15 @@ Wrapper_acquire(
         if (WRAPPER(self->container)->container == WRAPPER(self)->obj) {
             sco = 0;
             containment = 1;
+            if (ADD_STEP(state, "prune", self->container,
+                         "sco: container of container is object") < 0 ||
+                ADD_STEP(state, "containment", self->container, NULL) < 0) {
+                return NULL;
+            }
         }
 
         r = Wrapper_findattr(WRAPPER(self->container), oname, filter, extra,
-                             orig, sob, sco, explicit, containment);
+                             orig, sob, sco, explicit, containment, state);
 
         return apply__of__(r, OBJECT(self));
     }
@@ -757,7 +1835,9 @@ Wrapper_acquire(
      * with Wrapper_findattr, just as if the container had an
      * acquisition wrapper in the first place (see above).
      */
-    else if ((r = PyObject_GetAttr(self->container, py__parent__))) {
+    else if ((r = get_parent(self->container))) {
+        COUNT(parent_hops);
+
         /* Don't search the container when the parent of the parent
          * is the same object as 'self'
          */
@@ -768,18 +1848,51 @@ Wrapper_acquire(
             sco = 0;
         }
 
-        ASSIGN(self->container, newWrapper(self->container, r, &Wrappertype));
+        if (state->steps &&
+            ((!sco && add_step(state, "prune", self->container,
+                               "sco: parent is object") < 0) ||
+             add_step(state, "parent", self->container,
+                      (LOAD_SSIZE(parent_cache_size) > 0 || !state->mutate) ?
+                      "temporary" : "stored") < 0))
+        {
+            Py_DECREF(r);
+            return NULL;
+        }
+
+        if (LOAD_SSIZE(parent_cache_size) > 0 || !state->mutate) {
+            /* The wrapper for the container only lives as long as this
+             * lookup or is shared through the cache, so leave 'self'
+             * alone and continue the search in it directly. */
+            container = parent_wrapper(self->container, r);
+            Py_DECREF(r);
+            if (container == NULL) {
+                return NULL;
+            }
+
+            r = Wrapper_findattr(WRAPPER(container), oname, filter, extra,
+                                 orig, sob, sco, explicit, containment,
+                                 state);
+            Py_DECREF(container);
+            return r;
+        }
+
+        container = newWrapper(self->container, r, &Wrappertype);
 
         /* don't need __parent__ anymore */
         Py_DECREF(r);
 
-        r = Wrapper_findattr(WRAPPER(self->container), oname, filter, extra,
-                             orig, sob, sco, explicit, containment);
+        if (container == NULL) {
+            return NULL;
+        }
 
-        /* There's no need to DECREF the wrapper here because it's
-         * not stored in self->container, thus 'self' owns its
-         * reference now
-         */
+        /* Store it in 'self' and keep a reference for the search, as
+         * another thread may replace it in the meantime. */
+        Py_INCREF(container);
+        wrapper_set_field(self, &self->container, container);
+
+        r = Wrapper_findattr(WRAPPER(container), oname, filter, extra,
+                             orig, sob, sco, explicit, containment, state);
+        Py_DECREF(container);
         return r;
     }
 
@@ -787,26 +1900,53 @@ Wrapper_acquire(
      * can't look up the attribute here, we can't look it up at all.
      */
     else {
-        /* We need to clean up the AttributeError from the previous
-         * getattr (because it has clearly failed).
-         */
-        if(!swallow_attribute_error()) {
+        if (PyErr_Occurred()) {
             return NULL;
         }
 
         if ((r = PyObject_GetAttr(self->container, oname)) == NULL) {
             /* May be AttributeError or some other kind of error */
+            if (state->steps && PyErr_ExceptionMatches(PyExc_AttributeError)) {
+                PyObject *type, *value, *traceback;
+                PyErr_Fetch(&type, &value, &traceback);
+                if (add_step(state, "probe", self->container, "missing") < 0) {
+                    Py_XDECREF(type);
+                    Py_XDECREF(value);
+                    Py_XDECREF(traceback);
+                    return NULL;
+                }
+                PyErr_Restore(type, value, traceback);
+            }
             return NULL;
         }
 
         if (r == Acquired) {
             Py_DECREF(r);
+            if (ADD_STEP(state, "probe", self->container, "Acquired") < 0) {
+                return NULL;
+            }
         } else if (filter) {
             switch(apply_filter(filter, self->container, oname, r, extra, orig)) {
                 case -1: return NULL;
-                case 1: return apply__of__(r, OBJECT(self));
+                case 1:
+                    PROFILE_HIT(state, self->container, oname,
+                                state->levels + 1);
+                    if (ADD_STEP(state, "probe", self->container,
+                                 "found") < 0) {
+                        Py_DECREF(r);
+                        return NULL;
+                    }
+                    return apply__of__(r, OBJECT(self));
+            }
+            if (ADD_STEP(state, "probe", self->container, "rejected") < 0) {
+                return NULL;
             }
         } else {
+            PROFILE_HIT(state, self->container, oname, state->levels + 1);
+            if (ADD_STEP(state, "probe", self->container, "found") < 0) {
+                Py_DECREF(r);
+                return NULL;
+            }
             return apply__of__(r, OBJECT(self));
         }
     }
@@ -815,16 +1955,111 @@ Wrapper_acquire(
     return NULL;
 }
 
+/* Whether 'oname' starts with a single underscore, like the _p_ and _v_
+ * attributes of persistent objects. Such names are never acquired
+ * implicitly. */
+#define PRIVATE_NAME(oname) \
+    (PyUnicode_CheckExact(oname) && \
+     PyUnicode_GET_LENGTH(oname) > 1 && \
+     PyUnicode_READ_CHAR(oname, 0) == '_' && \
+     PyUnicode_READ_CHAR(oname, 1) != '_')
+
+/* Whether 'oname' is one of the names zope.interface looks up for every
+ * providedBy and adapter lookup. Being dunder names, they aren't
+ * acquired implicitly either. Names not interned take the normal path.
+ */
+#define INTERFACE_NAME(oname) \
+    ((oname) == py__providedBy__ || (oname) == py__provides__ || \
+     (oname) == py__implemented__ || (oname) == py__class__)
+
+/* Whether Wrapper_getattr_private may look up a private or interface
+ * name of 'self' instead of Wrapper_findattr, which then does nothing more but would
+ * miss it for the statistics, profiler, slow lookup hook and trace. */
+#define PRIVATE_FAST_PATH(self) \
+    (!isWrapper((self)->obj) && \
+     !((self)->container && isWrapper((self)->container) && \
+       WRAPPER((self)->container)->container == OBJECT(self)) && \
+     !LOAD_INT(stats_enabled) && !LOAD_SSIZE(profiler_interval) && \
+     !LOAD_PTR(slow_lookup_hook) && !LOAD_PTR(trace_records))
+
+/* Looks up the private or interface name 'oname' on the object of
+ * 'self' only, with the result bound to 'self' as Wrapper_findattr
+ * would. The __class__ of an object using the default attribute lookup
+ * and the __class__ descriptor of object is its type, which the type
+ * attribute cache tells without calling the descriptor.
+ * Returns NULL without an exception set if the object asks to acquire
+ * the name, so the caller has to do a full lookup.
+ */
+static PyObject *
+Wrapper_getattr_private(Wrapper *self, PyObject *oname)
+{
+    PyTypeObject *tp;
+    PyObject *r;
+
+    if (oname == py__class__) {
+        tp = Py_TYPE(self->obj);
+        if ((tp->tp_getattro == Py_FindAttr ||
+             tp->tp_getattro == PyObject_GenericGetAttr) &&
+            _PyType_Lookup(tp, py__class__) == object_class_descr)
+        {
+            r = OBJECT(tp);
+            Py_INCREF(r);
+            return apply__of__(r, OBJECT(self));
+        }
+    }
+
+    if ((r = PyObject_GetAttr(self->obj, oname)) == NULL) {
+        if (swallow_attribute_error()) {
+            PyErr_SetObject(PyExc_AttributeError, oname);
+        }
+        return NULL;
+    }
+
+    if (r == Acquired) {
+        Py_DECREF(r);
+        return NULL;
+    }
+
+    if (PyECMethod_Check(r) && PyECMethod_Self(r) == self->obj) {
+        ASSIGN(r, PyECMethod_New(r, OBJECT(self)));
+    }
+
+    return apply__of__(r, OBJECT(self));
+}
+
 static PyObject *
 Wrapper_getattro(Wrapper *self, PyObject *oname)
 {
-    return Wrapper_findattr(self, oname, NULL, NULL, NULL, 1, 1, 0, 0);
+    PyObject *result;
+    LOOKUP_STATE(state);
+
+    if ((PRIVATE_NAME(oname) || INTERFACE_NAME(oname)) &&
+        PRIVATE_FAST_PATH(self) &&
+        ((result = Wrapper_getattr_private(self, oname)) != NULL ||
+         PyErr_Occurred()))
+    {
+        return result;
+    }
+
+    result = Wrapper_findattr(self, oname, NULL, NULL, NULL, 1, 1, 0, 0,
+                              &state);
+    end_lookup(&state, OBJECT(self), oname, NULL);
+    return result;
 }
 
 static PyObject *
 Xaq_getattro(Wrapper *self, PyObject *oname)
 {
     PyObject *tmp, *result;
+    LOOKUP_STATE(state);
+
+    if ((PRIVATE_NAME(oname) || INTERFACE_NAME(oname)) &&
+        PRIVATE_FAST_PATH(self) &&
+        ((result = Wrapper_getattr_private(self, oname)) != NULL ||
+         PyErr_Occurred()))
+    {
+        return result;
+    }
 
     if ((tmp = convert_name(oname)) == NULL) {
         return NULL;
@@ -834,7 +2069,9 @@ Xaq_getattro(Wrapper *self, PyObject *oname)
     if (STR_EQ(PyBytes_AS_STRING(tmp), "acquire")) {
         result = Py_FindAttr(OBJECT(self), oname);
     } else {
-        result = Wrapper_findattr(self, oname, NULL, NULL, NULL, 1, 0, 0, 0);
+        result = Wrapper_findattr(self, oname, NULL, NULL, NULL, 1, 0, 0, 0,
+                                  &state);
+        end_lookup(&state, OBJECT(self), oname, NULL);
     }
 
     Py_DECREF(tmp);
@@ -857,7 +2094,7 @@ Wrapper_setattro(Wrapper *self, PyObject *oname, PyObject *v)
 
     if (STR_EQ(name, "aq_parent") || STR_EQ(name, "__parent__")) {
         Py_XINCREF(v);
-        ASSIGN(self->container, v);
+        wrapper_set_field(self, &self->container, v);
         result = 0;
     } else {
         if (v) {
@@ -1182,6 +2419,24 @@ static PyMappingMethods Wrapper_as_mapping = {
 
 /* -------------------------------------------------------------- */
 
+/* Code to access Wrapper objects as buffers */
+
+static int
+Wrapper_getbuffer(Wrapper *self, Py_buffer *view, int flags)
+{
+    /* Export the buffer of the wrapped object itself, without a copy.
+     * view->obj is set to the wrapped object, so releasing the view
+     * goes straight to it and the wrapper can go away meanwhile. */
+    return PyObject_GetBuffer(self->obj, view, flags);
+}
+
+static PyBufferProcs Wrapper_as_buffer = {
+    (getbufferproc)Wrapper_getbuffer,   /*bf_getbuffer*/
+    (releasebufferproc)0,               /*bf_releasebuffer*/
+};
+
+/* -------------------------------------------------------------- */
+
 /* Code to access Wrapper objects as numbers */
 
 #define WRAP_UNARYOP(OPNAME) \
@@ -1320,24 +2575,57 @@ static PyNumberMethods Wrapper_as_number = {
 
 
 static char *acquire_args[] = {"object", "name", "filter", "extra", "explicit",
-                               "default", "containment", NULL};
+                               "default", "containment", "mutate", NULL};
 
-static PyObject *
-Wrapper_acquire_method(Wrapper *self, PyObject *args, PyObject *kw)
+/* Sets up the state of a lookup for the 'mutate' argument of the
+ * acquire functions, None means the global setting.
+ * Returns -1 on error.
+ */
+static int
+init_lookup_state(LookupState *state, PyObject *mutate)
 {
-    PyObject *name, *filter = NULL, *extra = Py_None;
-    PyObject *expl = NULL, *defalt = NULL;
+    state->mutate = LOAD_INT(mutate_wrappers);
+    state->levels = 0;
+    state->misses = 0;
+    state->name = NULL;
+    state->provider = NULL;
+    state->depth = 0;
+    state->start = LOAD_PTR(slow_lookup_hook) ? perf_counter_ns() : 0;
+    state->steps = NULL;
+    state->wrappers = (LOAD_PTR(trace_records) ?
+                       LOAD_SSIZE(wrappers_allocated) : 0);
+    state->visited = NULL;
+
+    if (mutate && mutate != Py_None) {
+        if ((state->mutate = PyObject_IsTrue(mutate)) < 0) {
+            return -1;
+        }
+    }
+
+    return 0;
+}
+
+static PyObject *
+Wrapper_acquire_method(Wrapper *self, PyObject *args, PyObject *kw)
+{
+    PyObject *name, *filter = NULL, *extra = Py_None;
+    PyObject *expl = NULL, *defalt = NULL, *mutate = NULL;
     int explicit = 1;
     int containment = 0;
     PyObject *result;
+    LookupState state;
 
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|OOOOi", acquire_args+1,
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|OOOOiO", acquire_args+1,
                                      &name, &filter, &extra, &expl,
-                                     &defalt, &containment))
+                                     &defalt, &containment, &mutate))
     {
         return NULL;
     }
 
+    if (init_lookup_state(&state, mutate) < 0) {
+        return NULL;
+    }
+
     if (expl) {
         explicit = PyObject_IsTrue(expl);
     }
@@ -1348,7 +2636,8 @@ Wrapper_acquire_method(Wrapper *self, PyObject *args, PyObject *kw)
 
     result = Wrapper_findattr(self, name, filter, extra, OBJECT(self), 1,
                               explicit || isImplicitWrapper(self),
-                              explicit, containment);
+                              explicit, containment, &state);
+    end_lookup(&state, OBJECT(self), name, filter);
 
     if (result == NULL && defalt != NULL) {
         /* as "Python/bltinmodule.c:builtin_getattr" turn
@@ -1394,6 +2683,12 @@ Wrapper___getnewargs__(PyObject *self)
     return PyTuple_New(0);
 }
 
+static PyObject *
+Wrapper_sizeof(Wrapper *self, PyObject *unused)
+{
+    return PyLong_FromSsize_t(Py_TYPE(self)->tp_basicsize);
+}
+
 static struct PyMethodDef Wrapper_methods[] = {
   {"acquire", (PyCFunction)Wrapper_acquire_method,
    METH_VARARGS|METH_KEYWORDS,
@@ -1415,6 +2710,8 @@ static struct PyMethodDef Wrapper_methods[] = {
    "Unicode"},
   {"__bytes__", (PyCFunction)Wrapper_bytes, METH_NOARGS,
    "Bytes"},
+  {"__sizeof__", (PyCFunction)Wrapper_sizeof, METH_NOARGS,
+   "Size of the wrapper in memory, without the wrapped objects"},
   {NULL,  NULL}
 };
 
@@ -1437,7 +2734,7 @@ static PyExtensionClass Wrappertype = {
     (reprfunc)Wrapper_str,                          /* tp_str */
     (getattrofunc)Wrapper_getattro,                 /* tp_getattro */
     (setattrofunc)Wrapper_setattro,                 /* tp_setattro */
-    0,                                              /* tp_as_buffer */
+    &Wrapper_as_buffer,                             /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE |
           Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_HAVE_VERSION_TAG, /* tp_flags */
     "Wrapper object for implicit acquisition",      /* tp_doc */
@@ -1479,7 +2776,7 @@ static PyExtensionClass XaqWrappertype = {
     (reprfunc)Wrapper_str,                          /* tp_str */
     (getattrofunc)Xaq_getattro,                     /* tp_getattro */
     (setattrofunc)Wrapper_setattro,                 /* tp_setattro */
-    0,                                              /* tp_as_buffer */
+    &Wrapper_as_buffer,                             /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE |
           Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_HAVE_VERSION_TAG, /* tp_flags */
     "Wrapper object for explicit acquisition",      /* tp_doc */
@@ -1542,344 +2839,1630 @@ static struct PyMethodDef ExplicitAcquirer_methods[] = {
     {NULL, NULL}
 };
 
+/* Returns 'obj' in the context of 'container', like obj.__of__(container).
+ * Objects using the stock __of__ of Acquirer or ExplicitAcquirer get
+ * their wrapper constructed directly instead of calling the method.
+ * Returns a new reference.
+ * Returns NULL on error.
+ */
 static PyObject *
-capi_aq_acquire(
-    PyObject *self,
-    PyObject *name,
-    PyObject *filter,
-    PyObject *extra,
-    int explicit,
-    PyObject *defalt,
-    int containment)
+wrap_in_context(PyObject *obj, PyObject *container)
 {
-    PyObject *result;
+    PyObject *of;
 
-    if (filter == Py_None) {
-        filter = NULL;
+    if (!has__of__(obj)) {
+        Py_INCREF(obj);
+        return obj;
     }
 
-    /* We got a wrapped object, so business as usual */
-    if (isWrapper(self)) {
-        result = Wrapper_findattr(WRAPPER(self), name, filter, extra,
-                                  OBJECT(self), 1,
-                                  explicit || isImplicitWrapper(self),
-                                  explicit, containment);
-    }
+    if (!isWrapper(obj) && PyExtensionInstance_Check(container)) {
+        of = _PyType_Lookup(Py_TYPE(obj), py__of__);
 
-    /* Not wrapped; check if we have a __parent__ pointer.  If that's
-     * the case, create a wrapper and pretend it's business as usual.
-     */
-    else if ((result = PyObject_GetAttr(self, py__parent__))) {
-        self = newWrapper(self, result, &Wrappertype);
+        if (of != NULL && of == Acquirer__of__) {
+            return Wrapper_New((PyTypeObject*)&Wrappertype, obj, container);
+        } else if (of != NULL && of == ExplicitAcquirer__of__) {
+            return Wrapper_New((PyTypeObject*)&XaqWrappertype, obj, container);
+        }
+    }
 
-        /* don't need __parent__ anymore */
-        Py_DECREF(result);
+    return __of__(obj, container);
+}
 
-        result = Wrapper_findattr(WRAPPER(self), name, filter, extra,
-                                  OBJECT(self), 1, 1, explicit, containment);
+/* Declarations for objects of type WrapperArray
+ *
+ * A WrapperArray stores the shared container once plus an array of the
+ * unwrapped children. Wrappers are only created when an item is
+ * accessed and escapes, so large listings don't need one GC tracked
+ * wrapper per child.
+ */
 
-        /* Get rid of temporary wrapper */
-        Py_DECREF(self);
-    }
+typedef struct {
+  PyObject_VAR_HEAD
+  PyObject *container;
+  PyObject *items[1];
+} WrapperArray;
 
-    /* No wrapper and no __parent__, so just getattr. */
-    else {
-        /* Clean up the AttributeError from the previous getattr
-         * (because it has clearly failed).
-         */
-        if (!swallow_attribute_error()) {
-            return NULL;
-        }
+static PyTypeObject WrapperArrayType;
 
-        if (!filter) {
-            result = PyObject_GetAttr(self, name);
-        } else {
-            /* Construct a wrapper so we can use Wrapper_findattr */
-            if ((self = newWrapper(self, Py_None, &Wrappertype)) == NULL) {
-                return NULL;
-            }
+#define WRAPPERARRAY(O) ((WrapperArray*)(O))
 
-            result = Wrapper_findattr(WRAPPER(self), name, filter, extra,
-                                      OBJECT(self), 1, 1, explicit, containment);
+/* Creates an empty WrapperArray for 'size' items, which the caller has
+ * to fill in.
+ * Returns a new reference.
+ * Returns NULL on error.
+ */
+static WrapperArray *
+WrapperArray_Alloc(Py_ssize_t size, PyObject *container)
+{
+    WrapperArray *self;
+    Py_ssize_t i;
 
-            /* Get rid of temporary wrapper */
-            Py_DECREF(self);
-        }
+    self = PyObject_GC_NewVar(WrapperArray, &WrapperArrayType, size);
+    if (self == NULL) {
+        return NULL;
     }
 
-    if (result == NULL && defalt != NULL) {
-        /* Python/bltinmodule.c:builtin_getattr turns only 'AttributeError'
-         * into a default value.
-         */
-        if (swallow_attribute_error()) {
-            Py_INCREF(defalt);
-            result = defalt;
-        }
+    for (i = 0; i < size; i++) {
+        self->items[i] = NULL;
     }
 
-    return result;
+    Py_INCREF(container);
+    self->container = container;
+    return self;
 }
 
+/* Creates a lazy sequence which wraps the items of 'objs' in the context
+ * of 'container' when they are accessed.
+ * Returns a new reference.
+ * Returns NULL on error.
+ */
 static PyObject *
-module_aq_acquire(PyObject *ignored, PyObject *args, PyObject *kw)
+WrapperArray_New(PyObject *objs, PyObject *container)
 {
-    PyObject *self;
-    PyObject *name, *filter = NULL, *extra = Py_None;
-    PyObject *expl = NULL, *defalt = NULL;
-    int explicit = 1, containment = 0;
+    WrapperArray *self;
+    PyObject *seq;
+    Py_ssize_t i, size;
 
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|OOOOi", acquire_args,
-                                     &self, &name, &filter, &extra, &expl,
-                                     &defalt, &containment))
-    {
+    if ((seq = PySequence_Tuple(objs)) == NULL) {
         return NULL;
     }
 
-    if (expl) {
-        explicit = PyObject_IsTrue(expl);
+    size = PyTuple_GET_SIZE(seq);
+    if ((self = WrapperArray_Alloc(size, container)) == NULL) {
+        Py_DECREF(seq);
+        return NULL;
+    }
+
+    for (i = 0; i < size; i++) {
+        Py_INCREF(PyTuple_GET_ITEM(seq, i));
+        self->items[i] = PyTuple_GET_ITEM(seq, i);
     }
 
-    return capi_aq_acquire(self, name, filter, extra,
-                           explicit, defalt, containment);
+    Py_DECREF(seq);
+    PyObject_GC_Track(OBJECT(self));
+    return OBJECT(self);
 }
 
+static char *wrapperarray_kwlist[] = {"objs", "container", NULL};
+
 static PyObject *
-capi_aq_get(PyObject *self, PyObject *name, PyObject *defalt, int containment)
+WrapperArray__new__(PyTypeObject *type, PyObject *args, PyObject *kwargs)
 {
-    PyObject *result;
+    PyObject *objs, *container;
 
-    result = capi_aq_acquire(self, name, NULL, NULL, 1, defalt, containment);
-
-    if (result == NULL && defalt) {
-        PyErr_Clear();
-        Py_INCREF(defalt);
-        return defalt;
-    } else {
-        return result;
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO:WrapperArray",
+                                     wrapperarray_kwlist, &objs, &container))
+    {
+        return NULL;
     }
+
+    return WrapperArray_New(objs, container);
 }
 
-static PyObject *
-module_aq_get(PyObject *r, PyObject *args)
+static int
+WrapperArray_traverse(WrapperArray *self, visitproc visit, void *arg)
 {
-    PyObject *self, *name, *defalt = NULL;
-    int containment = 0;
+    Py_ssize_t i;
 
-    if (!PyArg_ParseTuple(args, "OO|Oi", &self, &name, &defalt, &containment)) {
-        return NULL;
+    for (i = Py_SIZE(self); --i >= 0; ) {
+        Py_VISIT(self->items[i]);
     }
-
-    return capi_aq_get(self, name, defalt, containment);
+    Py_VISIT(self->container);
+    return 0;
 }
 
 static int
-capi_aq_iswrapper(PyObject *self) {
-    return isWrapper(self);
+WrapperArray_clear(WrapperArray *self)
+{
+    Py_ssize_t i;
+
+    for (i = Py_SIZE(self); --i >= 0; ) {
+        Py_CLEAR(self->items[i]);
+    }
+    Py_CLEAR(self->container);
+    return 0;
 }
 
-static PyObject *
-capi_aq_base(PyObject *self)
+static void
+WrapperArray_dealloc(WrapperArray *self)
 {
-    PyObject *result = get_base(self);
-    Py_INCREF(result);
-    return result;
+    PyObject_GC_UnTrack(OBJECT(self));
+    WrapperArray_clear(self);
+    PyObject_GC_Del(OBJECT(self));
 }
 
-static PyObject *
-module_aq_base(PyObject *ignored, PyObject *self)
+static Py_ssize_t
+WrapperArray_length(WrapperArray *self)
 {
-    return capi_aq_base(self);
+    return Py_SIZE(self);
 }
 
 static PyObject *
-capi_aq_parent(PyObject *self)
+WrapperArray_item(WrapperArray *self, Py_ssize_t i)
 {
-    PyObject *result;
-
-    if (isWrapper(self) && WRAPPER(self)->container) {
-        Py_INCREF(WRAPPER(self)->container);
-        return WRAPPER(self)->container;
+    if (i < 0 || i >= Py_SIZE(self)) {
+        PyErr_SetString(PyExc_IndexError, "WrapperArray index out of range");
+        return NULL;
     }
-    else if ((result = PyObject_GetAttr(self, py__parent__))) {
-        /* We already own the reference to result (PyObject_GetAttr gives
-         * it to us), no need to INCREF here.
-         */
-        return result;
-    } else {
-        /* We need to clean up the AttributeError from the previous
-         * getattr (because it has clearly failed).
-         */
-        if (!swallow_attribute_error()) {
-            return NULL;
-        }
 
-        Py_RETURN_NONE;
-    }
+    return wrap_in_context(self->items[i], self->container);
 }
 
 static PyObject *
-module_aq_parent(PyObject *ignored, PyObject *self)
+WrapperArray_slice(WrapperArray *self, PyObject *key)
 {
-    return capi_aq_parent(self);
-}
+    WrapperArray *result;
+    Py_ssize_t start, stop, step, size, cur, i;
 
-static PyObject *
-capi_aq_self(PyObject *self)
-{
-    PyObject *result;
+    if (PySlice_Unpack(key, &start, &stop, &step) < 0) {
+        return NULL;
+    }
 
-    if (!isWrapper(self)) {
-        result = self;
-    } else {
-        result = WRAPPER(self)->obj;
+    size = PySlice_AdjustIndices(Py_SIZE(self), &start, &stop, step);
+    if ((result = WrapperArray_Alloc(size, self->container)) == NULL) {
+        return NULL;
     }
 
-    Py_INCREF(result);
-    return result;
-}
+    for (cur = start, i = 0; i < size; cur += step, i++) {
+        Py_INCREF(self->items[cur]);
+        result->items[i] = self->items[cur];
+    }
 
-static PyObject *
-module_aq_self(PyObject *ignored, PyObject *self)
-{
-    return capi_aq_self(self);
+    PyObject_GC_Track(OBJECT(result));
+    return OBJECT(result);
 }
 
 static PyObject *
-capi_aq_inner(PyObject *self)
+WrapperArray_subscript(WrapperArray *self, PyObject *key)
 {
-    self = get_inner(self);
-    Py_INCREF(self);
-    return self;
-}
+    Py_ssize_t i;
 
-static PyObject *
-module_aq_inner(PyObject *ignored, PyObject *self)
-{
-    return capi_aq_inner(self);
+    if (PySlice_Check(key)) {
+        return WrapperArray_slice(self, key);
+    }
+
+    i = PyNumber_AsSsize_t(key, PyExc_IndexError);
+    if (i == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+
+    if (i < 0) {
+        i += Py_SIZE(self);
+    }
+
+    return WrapperArray_item(self, i);
 }
 
 static PyObject *
-capi_aq_chain(PyObject *self, int containment)
+WrapperArray_getattr_each(WrapperArray *self, PyObject *args)
 {
-    PyObject *result;
+    PyObject *name, *defalt = NULL;
+    PyObject *result, *item, *r;
+    PyTypeObject *target;
+    Wrapper *scratch = NULL;
+    Py_ssize_t i;
 
-    /* This allows Py_XDECREF at the end.
-     * Needed, because the result of PyObject_GetAttr(self, py__parent__) must
-     * be kept alive until not needed anymore. It could be that the refcount of
-     * its return value is 1 => calling Py_DECREF too early leads to segfault.
-     */
-    Py_INCREF(self);
-
-    if ((result = PyList_New(0)) == NULL) {
+    if (!PyArg_ParseTuple(args, "O|O:getattr_each", &name, &defalt)) {
         return NULL;
     }
 
-    while (1) {
-        if (isWrapper(self)) {
-            if (containment) {
-                ASSIGN(self, get_inner(self));
-                Py_INCREF(self);
-            }
+    if ((result = PyList_New(Py_SIZE(self))) == NULL) {
+        return NULL;
+    }
 
-            if (PyList_Append(result, OBJECT(self)) < 0) {
-                goto err;
+    for (i = 0; i < Py_SIZE(self); i++) {
+        target = NULL;
+        if (has__of__(self->items[i]) && !isWrapper(self->items[i]) &&
+                PyExtensionInstance_Check(self->container))
+        {
+            r = _PyType_Lookup(Py_TYPE(self->items[i]), py__of__);
+            if (r != NULL && r == Acquirer__of__) {
+                target = (PyTypeObject*)&Wrappertype;
+            } else if (r != NULL && r == ExplicitAcquirer__of__) {
+                target = (PyTypeObject*)&XaqWrappertype;
             }
+        }
 
-            if (WRAPPER(self)->container) {
-                ASSIGN(self, WRAPPER(self)->container);
-                Py_INCREF(self);
-                continue;
+        if (target == NULL) {
+            /* Custom __of__ or no acquirer at all. */
+            item = wrap_in_context(self->items[i], self->container);
+        } else if (scratch && Py_TYPE(scratch) == target) {
+            /* The wrapper of the previous item did not escape,
+             * so it can be reused for this one. */
+            Py_INCREF(self->items[i]);
+            ASSIGN(scratch->obj, self->items[i]);
+            if (scratch->container != self->container) {
+                /* A lookup through __parent__ replaced it. */
+                Py_INCREF(self->container);
+                ASSIGN(scratch->container, self->container);
             }
+            Py_INCREF(scratch);
+            item = OBJECT(scratch);
         } else {
-            if (PyList_Append(result, self) < 0) {
-                goto err;
+            Py_CLEAR(scratch);
+            item = Wrapper_New(target, self->items[i], self->container);
+            if (item != NULL) {
+                Py_INCREF(item);
+                scratch = WRAPPER(item);
             }
+        }
 
-            ASSIGN(self, PyObject_GetAttr(self, py__parent__));
-            if (self) {
-                if (self != Py_None) {
-                    continue;
-                }
-            } else if (!swallow_attribute_error()) {
+        if (item == NULL) {
+            goto err;
+        }
+
+        r = PyObject_GetAttr(item, name);
+        Py_DECREF(item);
+
+        if (r == NULL) {
+            if (defalt == NULL || !swallow_attribute_error()) {
                 goto err;
             }
+            Py_INCREF(defalt);
+            r = defalt;
+        }
+        PyList_SET_ITEM(result, i, r);
+
+        /* The wrapper escaped if anybody else holds a reference to it
+         * now, e.g. a method bound to it or an object wrapped in its
+         * context. */
+        if (scratch && !IS_UNIQUE(OBJECT(scratch))) {
+            Py_CLEAR(scratch);
         }
-        break;
     }
 
-    Py_XDECREF(self);
+    Py_XDECREF(scratch);
     return result;
+
 err:
-    Py_XDECREF(self);
+    Py_XDECREF(scratch);
     Py_DECREF(result);
     return NULL;
 }
 
 static PyObject *
-module_aq_chain(PyObject *ignored, PyObject *args)
+WrapperArray_get_parent(WrapperArray *self, void *closure)
 {
-    PyObject *self;
-    int containment = 0;
-
-    if (!PyArg_ParseTuple(args, "O|i", &self, &containment)) {
-        return NULL;
-    }
-
-    return capi_aq_chain(self, containment);
+    Py_INCREF(self->container);
+    return self->container;
 }
 
-static PyObject *
-capi_aq_inContextOf(PyObject *self, PyObject *o, int inner)
-{
-    PyObject *result = Py_False;
+static PySequenceMethods WrapperArray_as_sequence = {
+    (lenfunc)WrapperArray_length,           /* sq_length */
+    0,                                      /* sq_concat */
+    0,                                      /* sq_repeat */
+    (ssizeargfunc)WrapperArray_item,        /* sq_item */
+};
 
-    o = get_base(o);
+static PyMappingMethods WrapperArray_as_mapping = {
+    (lenfunc)WrapperArray_length,           /* mp_length */
+    (binaryfunc)WrapperArray_subscript,     /* mp_subscript */
+    0,                                      /* mp_ass_subscript */
+};
+
+static struct PyMethodDef WrapperArray_methods[] = {
+  {"getattr_each", (PyCFunction)WrapperArray_getattr_each, METH_VARARGS,
+   "getattr_each(name [, default]) -- "
+   "Get an attribute of every item in the context of the container"},
+  {NULL,  NULL}
+};
+
+static PyGetSetDef WrapperArray_getset[] = {
+  {"aq_parent", (getter)WrapperArray_get_parent, NULL,
+   "The container of the items", NULL},
+  {NULL}
+};
+
+static PyTypeObject WrapperArrayType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "Acquisition.WrapperArray",                     /* tp_name */
+    offsetof(WrapperArray, items),                  /* tp_basicsize */
+    sizeof(PyObject *),                             /* tp_itemsize */
+    (destructor)WrapperArray_dealloc,               /* tp_dealloc */
+    0,                                              /* tp_print */
+    0,                                              /* tp_getattr */
+    0,                                              /* tp_setattr */
+    0,                                              /* tp_compare */
+    0,                                              /* tp_repr */
+    0,                                              /* tp_as_number */
+    &WrapperArray_as_sequence,                      /* tp_as_sequence */
+    &WrapperArray_as_mapping,                       /* tp_as_mapping */
+    0,                                              /* tp_hash */
+    0,                                              /* tp_call */
+    0,                                              /* tp_str */
+    0,                                              /* tp_getattro */
+    0,                                              /* tp_setattro */
+    0,                                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC,        /* tp_flags */
+    "Sequence of objects wrapped in the context of a container "
+    "when accessed",                                /* tp_doc */
+    (traverseproc)WrapperArray_traverse,            /* tp_traverse */
+    (inquiry)WrapperArray_clear,                    /* tp_clear */
+    0,                                              /* tp_richcompare */
+    0,                                              /* tp_weaklistoffset */
+    0,                                              /* tp_iter */
+    0,                                              /* tp_iternext */
+    WrapperArray_methods,                           /* tp_methods */
+    0,                                              /* tp_members */
+    WrapperArray_getset,                            /* tp_getset */
+    0,                                              /* tp_base */
+    0,                                              /* tp_dict */
+    0,                                              /* tp_descr_get */
+    0,                                              /* tp_descr_set */
+    0,                                              /* tp_dictoffset */
+    0,                                              /* tp_init */
+    0,                                              /* tp_alloc */
+    WrapperArray__new__                             /* tp_new */
+};
+
+/* Declarations for objects of type AcquiredName
+ *
+ * An AcquiredName looks up a single name in the context of implicit
+ * wrappers and remembers the types of the objects it had to skip to get
+ * to the level providing it. As long as the chain has the same types
+ * (and the types weren't modified), the next lookup only needs to check
+ * the instance dicts of the skipped objects, instead of raising and
+ * swallowing an AttributeError on each level.
+ */
+
+#define ACQUIRED_NAME_MAX_DEPTH 16
+
+#ifdef Py_TPFLAGS_VALID_VERSION_TAG
+#define VERSION_TAG(tp) \
+    (PyType_HasFeature(tp, Py_TPFLAGS_VALID_VERSION_TAG) ? \
+     (tp)->tp_version_tag : 0)
+#else
+#define VERSION_TAG(tp) ((tp)->tp_version_tag)
+#endif
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *name;
+    /* Whether the name is looked up like any other attribute. */
+    int plain;
+    /* Number of levels recorded in 'tags'. */
+    Py_ssize_t depth;
+    /* Version tags of the types of the objects skipped at each level,
+     * 0 if the type has none. The cache is shared by all threads, each
+     * tag is only a hint checked against the type. */
+    unsigned int tags[ACQUIRED_NAME_MAX_DEPTH];
+} AcquiredName;
+
+static PyTypeObject AcquiredNameType;
+
+static PyObject *
+AcquiredName__new__(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+    AcquiredName *self;
+    PyObject *name;
+
+    if (!PyArg_ParseTuple(args, "U:acquired", &name)) {
+        return NULL;
+    }
+
+    if ((self = (AcquiredName*)type->tp_alloc(type, 0)) == NULL) {
+        return NULL;
+    }
+
+    /* Make sure the dict lookups work on an exact, interned string. */
+    self->name = PyUnicode_FromObject(name);
+    if (self->name == NULL) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    PyUnicode_InternInPlace(&self->name);
+
+    /* Underscore names aren't acquired implicitly, the aq_ names are
+     * provided by the wrappers. */
+    self->plain = (PyUnicode_GET_LENGTH(self->name) > 0 &&
+                   PyUnicode_READ_CHAR(self->name, 0) != '_' &&
+                   !(PyUnicode_GET_LENGTH(self->name) >= 3 &&
+                     PyUnicode_READ_CHAR(self->name, 0) == 'a' &&
+                     PyUnicode_READ_CHAR(self->name, 1) == 'q' &&
+                     PyUnicode_READ_CHAR(self->name, 2) == '_'));
+
+    return OBJECT(self);
+}
+
+static void
+AcquiredName_dealloc(AcquiredName *self)
+{
+    Py_XDECREF(self->name);
+    Py_TYPE(self)->tp_free(OBJECT(self));
+}
+
+static PyObject *
+AcquiredName_lookup(AcquiredName *self, PyObject *ob)
+{
+    Wrapper *levels[ACQUIRED_NAME_MAX_DEPTH];
+    Wrapper *w = WRAPPER(ob);
+    PyTypeObject *tp;
+    PyObject *result;
+    Py_ssize_t depth = 0, cached_depth, i;
+    unsigned int tag;
+    int skip, cached, denied;
+    LOOKUP_STATE(state);
+
+    cached_depth = LOAD_SSIZE(self->depth);
+
+    while (self->plain &&
+           depth < ACQUIRED_NAME_MAX_DEPTH &&
+           Py_TYPE(w) == (PyTypeObject*)&Wrappertype &&
+           w->obj && !isWrapper(w->obj) && w->container)
+    {
+        tp = Py_TYPE(w->obj);
+
+        /* Circles and repeated objects get special treatment by
+         * Wrapper_findattr and Wrapper_acquire. */
+        if (isWrapper(w->container) &&
+                (WRAPPER(w->container)->container == OBJECT(w) ||
+                 WRAPPER(w->container)->container == w->obj))
+        {
+            break;
+        }
+
+        tag = VERSION_TAG(tp);
+        cached = (depth < cached_depth && tag != 0 &&
+                  LOAD_UINT(self->tags[depth]) == tag);
+
+        if ((skip = lacks_attribute(w->obj, self->name, cached)) < 0) {
+            return NULL;
+        }
+        if (!skip) {
+            break;
+        }
+
+        /* The regular lookup applies the policy of the class. */
+        if ((denied = acquisition_denied(w->obj, self->name)) < 0) {
+            return NULL;
+        }
+        if (denied) {
+            break;
+        }
+
+        if (!cached) {
+            STORE_UINT(self->tags[depth], tag);
+        }
+        levels[depth++] = w;
+
+        if (!isWrapper(w->container)) {
+            break;
+        }
+        w = WRAPPER(w->container);
+    }
+
+    if (depth == 0) {
+        return PyObject_GetAttr(ob, self->name);
+    }
+    if (depth != cached_depth) {
+        STORE_SSIZE(self->depth, depth);
+    }
+    state.levels = depth;
+    state.misses = depth;
+
+    /* The code run by the lookup may rewire the wrappers. */
+    for (i = 0; i < depth; i++) {
+        Py_INCREF(levels[i]);
+    }
+
+    /* This is what Wrapper_findattr does on each of the skipped levels
+     * after the attribute was not found on the object. */
+    result = Wrapper_acquire(levels[depth - 1], self->name,
+                             NULL, NULL, NULL, 0, 0, &state);
+    for (i = depth - 2; i >= 0; i--) {
+        result = apply__of__(result, OBJECT(levels[i]));
+    }
+
+    for (i = 0; i < depth; i++) {
+        Py_DECREF(levels[i]);
+    }
+
+    end_lookup(&state, ob, self->name, NULL);
+    return result;
+}
+
+static char *acquired_name_call_args[] = {"object", "default", NULL};
+
+static PyObject *
+AcquiredName_call(AcquiredName *self, PyObject *args, PyObject *kwargs)
+{
+    PyObject *ob, *defalt = NULL, *result;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "O|O",
+                                     acquired_name_call_args,
+                                     &ob, &defalt))
+    {
+        return NULL;
+    }
+
+    result = AcquiredName_lookup(self, ob);
+
+    if (result == NULL && defalt != NULL && swallow_attribute_error()) {
+        Py_INCREF(defalt);
+        result = defalt;
+    }
+
+    return result;
+}
+
+static PyObject *
+AcquiredName_repr(AcquiredName *self)
+{
+    return PyUnicode_FromFormat("acquired(%R)", self->name);
+}
+
+static PyObject *
+AcquiredName_get_name(AcquiredName *self, void *closure)
+{
+    Py_INCREF(self->name);
+    return self->name;
+}
+
+static PyObject *
+AcquiredName_get_depth(AcquiredName *self, void *closure)
+{
+    return PyLong_FromSsize_t(self->depth);
+}
+
+static PyGetSetDef AcquiredName_getset[] = {
+  {"name", (getter)AcquiredName_get_name, NULL,
+   "The name to look up", NULL},
+  {"depth", (getter)AcquiredName_get_depth, NULL,
+   "The number of levels skipped by the last lookup", NULL},
+  {NULL}
+};
+
+static PyTypeObject AcquiredNameType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "Acquisition.AcquiredName",                     /* tp_name */
+    sizeof(AcquiredName),                           /* tp_basicsize */
+    0,                                              /* tp_itemsize */
+    (destructor)AcquiredName_dealloc,               /* tp_dealloc */
+    0,                                              /* tp_print */
+    0,                                              /* tp_getattr */
+    0,                                              /* tp_setattr */
+    0,                                              /* tp_compare */
+    (reprfunc)AcquiredName_repr,                    /* tp_repr */
+    0,                                              /* tp_as_number */
+    0,                                              /* tp_as_sequence */
+    0,                                              /* tp_as_mapping */
+    0,                                              /* tp_hash */
+    (ternaryfunc)AcquiredName_call,                 /* tp_call */
+    0,                                              /* tp_str */
+    0,                                              /* tp_getattro */
+    0,                                              /* tp_setattro */
+    0,                                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                             /* tp_flags */
+    "acquired(name) -- Look up a name in the context of an object, "
+    "remembering where it was found",               /* tp_doc */
+    0,                                              /* tp_traverse */
+    0,                                              /* tp_clear */
+    0,                                              /* tp_richcompare */
+    0,                                              /* tp_weaklistoffset */
+    0,                                              /* tp_iter */
+    0,                                              /* tp_iternext */
+    0,                                              /* tp_methods */
+    0,                                              /* tp_members */
+    AcquiredName_getset,                            /* tp_getset */
+    0,                                              /* tp_base */
+    0,                                              /* tp_dict */
+    0,                                              /* tp_descr_get */
+    0,                                              /* tp_descr_set */
+    0,                                              /* tp_dictoffset */
+    0,                                              /* tp_init */
+    0,                                              /* tp_alloc */
+    AcquiredName__new__                             /* tp_new */
+};
+
+static PyObject *
+acquire_with_state(
+    PyObject *self,
+    PyObject *name,
+    PyObject *filter,
+    PyObject *extra,
+    int explicit,
+    PyObject *defalt,
+    int containment,
+    LookupState *state)
+{
+    PyObject *result, *start = self;
+
+    if (filter == Py_None) {
+        filter = NULL;
+    }
+
+    /* We got a wrapped object, so business as usual */
+    if (isWrapper(self)) {
+        result = Wrapper_findattr(WRAPPER(self), name, filter, extra,
+                                  OBJECT(self), 1,
+                                  explicit || isImplicitWrapper(self),
+                                  explicit, containment, state);
+    }
+
+    /* Not wrapped; check if we have a __parent__ pointer.  If that's
+     * the case, create a wrapper and pretend it's business as usual.
+     */
+    else if ((result = get_parent(self))) {
+        COUNT(parent_hops);
+        if (ADD_STEP(state, "parent", self, "temporary") < 0) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        self = parent_wrapper(self, result);
+
+        /* don't need __parent__ anymore */
+        Py_DECREF(result);
+
+        if (self == NULL) {
+            return NULL;
+        }
+
+        result = Wrapper_findattr(WRAPPER(self), name, filter, extra,
+                                  OBJECT(self), 1, 1, explicit, containment,
+                                  state);
+
+        /* Get rid of temporary wrapper */
+        Py_DECREF(self);
+    }
+
+    /* No wrapper and no __parent__, so just getattr. */
+    else {
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+
+        if (!filter) {
+            result = PyObject_GetAttr(self, name);
+            if (state->steps) {
+                if (result) {
+                    if (add_step(state, "probe", self, "found") < 0) {
+                        Py_CLEAR(result);
+                    }
+                } else if (PyErr_ExceptionMatches(PyExc_AttributeError)) {
+                    PyErr_Clear();
+                    if (add_step(state, "probe", self, "missing") == 0) {
+                        PyErr_SetObject(PyExc_AttributeError, name);
+                    }
+                }
+            }
+        } else {
+            /* Construct a wrapper so we can use Wrapper_findattr */
+            if ((self = newWrapper(self, Py_None, &Wrappertype)) == NULL) {
+                return NULL;
+            }
+
+            result = Wrapper_findattr(WRAPPER(self), name, filter, extra,
+                                      OBJECT(self), 1, 1, explicit,
+                                      containment, state);
+
+            /* Get rid of temporary wrapper */
+            Py_DECREF(self);
+        }
+    }
+
+    end_lookup(state, start, name, filter);
+
+    if (result == NULL && defalt != NULL) {
+        /* Python/bltinmodule.c:builtin_getattr turns only 'AttributeError'
+         * into a default value.
+         */
+        if (swallow_attribute_error()) {
+            Py_INCREF(defalt);
+            result = defalt;
+        }
+    }
+
+    return result;
+}
+
+static PyObject *
+capi_aq_acquire(
+    PyObject *self,
+    PyObject *name,
+    PyObject *filter,
+    PyObject *extra,
+    int explicit,
+    PyObject *defalt,
+    int containment)
+{
+    LOOKUP_STATE(state);
+    return acquire_with_state(self, name, filter, extra, explicit, defalt,
+                              containment, &state);
+}
+
+static PyObject *
+module_aq_acquire(PyObject *ignored, PyObject *args, PyObject *kw)
+{
+    PyObject *self;
+    PyObject *name, *filter = NULL, *extra = Py_None;
+    PyObject *expl = NULL, *defalt = NULL, *mutate = NULL;
+    int explicit = 1, containment = 0;
+    LookupState state;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|OOOOiO", acquire_args,
+                                     &self, &name, &filter, &extra, &expl,
+                                     &defalt, &containment, &mutate))
+    {
+        return NULL;
+    }
+
+    if (expl) {
+        explicit = PyObject_IsTrue(expl);
+    }
+
+    if (init_lookup_state(&state, mutate) < 0) {
+        return NULL;
+    }
+
+    return acquire_with_state(self, name, filter, extra,
+                              explicit, defalt, containment, &state);
+}
+
+static PyObject *
+module_aq_explain(PyObject *ignored, PyObject *args, PyObject *kw)
+{
+    PyObject *self;
+    PyObject *name, *filter = NULL, *extra = Py_None;
+    PyObject *expl = NULL, *defalt = NULL, *mutate = NULL;
+    PyObject *result;
+    int explicit = 1, containment = 0;
+    LookupState state;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|OOOOiO", acquire_args,
+                                     &self, &name, &filter, &extra, &expl,
+                                     &defalt, &containment, &mutate))
+    {
+        return NULL;
+    }
+
+    if (expl) {
+        explicit = PyObject_IsTrue(expl);
+    }
+
+    if (init_lookup_state(&state, mutate) < 0) {
+        return NULL;
+    }
+
+    if ((state.steps = PyList_New(0)) == NULL) {
+        return NULL;
+    }
+    state.start = perf_counter_ns();
+
+    /* The default is ignored, a failed search is part of the result. */
+    result = acquire_with_state(self, name, filter, extra,
+                                explicit, NULL, containment, &state);
+
+    if (result) {
+        Py_DECREF(result);
+        result = OBJECT(state.steps);
+        if (add_step(&state, "done", NULL, "found") < 0) {
+            Py_CLEAR(result);
+        }
+    } else if (swallow_attribute_error()) {
+        result = OBJECT(state.steps);
+        if (add_step(&state, "done", NULL, "AttributeError") < 0) {
+            Py_CLEAR(result);
+        }
+    } else {
+        Py_DECREF(state.steps);
+    }
+
+    return result;
+}
+
+static PyObject *
+capi_aq_get(PyObject *self, PyObject *name, PyObject *defalt, int containment)
+{
+    PyObject *result;
+
+    result = capi_aq_acquire(self, name, NULL, NULL, 1, defalt, containment);
+
+    if (result == NULL && defalt) {
+        PyErr_Clear();
+        Py_INCREF(defalt);
+        return defalt;
+    } else {
+        return result;
+    }
+}
+
+static PyObject *
+module_aq_get(PyObject *r, PyObject *args)
+{
+    PyObject *self, *name, *defalt = NULL;
+    int containment = 0;
+
+    if (!PyArg_ParseTuple(args, "OO|Oi", &self, &name, &defalt, &containment)) {
+        return NULL;
+    }
+
+    return capi_aq_get(self, name, defalt, containment);
+}
+
+static int
+capi_aq_iswrapper(PyObject *self) {
+    return isWrapper(self);
+}
+
+static PyObject *
+capi_aq_base(PyObject *self)
+{
+    PyObject *result = get_base(self);
+    Py_INCREF(result);
+    return result;
+}
+
+static PyObject *
+module_aq_base(PyObject *ignored, PyObject *self)
+{
+    return capi_aq_base(self);
+}
+
+static PyObject *
+capi_aq_parent(PyObject *self)
+{
+    PyObject *result;
+
+    if (isWrapper(self) && WRAPPER(self)->container) {
+        Py_INCREF(WRAPPER(self)->container);
+        return WRAPPER(self)->container;
+    }
+    else if ((result = get_parent(self))) {
+        /* We already own the reference to result (get_parent gives
+         * it to us), no need to INCREF here.
+         */
+        return result;
+    } else {
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+
+        Py_RETURN_NONE;
+    }
+}
+
+static PyObject *
+module_aq_parent(PyObject *ignored, PyObject *self)
+{
+    return capi_aq_parent(self);
+}
+
+static PyObject *
+capi_aq_self(PyObject *self)
+{
+    PyObject *result;
+
+    if (!isWrapper(self)) {
+        result = self;
+    } else {
+        result = WRAPPER(self)->obj;
+    }
+
+    Py_INCREF(result);
+    return result;
+}
+
+static PyObject *
+module_aq_self(PyObject *ignored, PyObject *self)
+{
+    return capi_aq_self(self);
+}
+
+static PyObject *
+capi_aq_inner(PyObject *self)
+{
+    self = get_inner(self);
+    Py_INCREF(self);
+    return self;
+}
+
+static PyObject *
+module_aq_inner(PyObject *ignored, PyObject *self)
+{
+    return capi_aq_inner(self);
+}
+
+static PyObject *
+capi_aq_chain(PyObject *self, int containment)
+{
+    PyObject *result;
+
+    /* This allows Py_XDECREF at the end.
+     * Needed, because the result of get_parent(self) must
+     * be kept alive until not needed anymore. It could be that the refcount of
+     * its return value is 1 => calling Py_DECREF too early leads to segfault.
+     */
+    Py_INCREF(self);
+
+    if ((result = PyList_New(0)) == NULL) {
+        return NULL;
+    }
+
+    while (1) {
+        if (isWrapper(self)) {
+            if (containment) {
+                ASSIGN(self, get_inner(self));
+                Py_INCREF(self);
+            }
+
+            if (PyList_Append(result, OBJECT(self)) < 0) {
+                goto err;
+            }
+
+            if (WRAPPER(self)->container) {
+                ASSIGN(self, WRAPPER(self)->container);
+                Py_INCREF(self);
+                continue;
+            }
+        } else {
+            if (PyList_Append(result, self) < 0) {
+                goto err;
+            }
+
+            ASSIGN(self, get_parent(self));
+            if (self) {
+                if (self != Py_None) {
+                    continue;
+                }
+            } else if (PyErr_Occurred()) {
+                goto err;
+            }
+        }
+        break;
+    }
+
+    Py_XDECREF(self);
+    return result;
+err:
+    Py_XDECREF(self);
+    Py_DECREF(result);
+    return NULL;
+}
+
+static PyObject *
+module_aq_chain(PyObject *ignored, PyObject *args)
+{
+    PyObject *self;
+    int containment = 0;
+
+    if (!PyArg_ParseTuple(args, "O|i", &self, &containment)) {
+        return NULL;
+    }
+
+    return capi_aq_chain(self, containment);
+}
+
+static PyObject *
+capi_aq_inContextOf(PyObject *self, PyObject *o, int inner)
+{
+    PyObject *result = Py_False;
+
+    o = get_base(o);
+
+    /* This allows Py_DECREF at the end, if the while loop did nothing. */
+    Py_INCREF(self);
+
+    while (1) {
+        /* if aq_base(self) is o: return 1 */
+        if (get_base(self) == o) {
+            result = Py_True;
+            break;
+        }
+
+        if (inner) {
+            ASSIGN(self, capi_aq_inner(self));
+            if (self == NULL) {
+                return NULL;
+            } else if (self == Py_None) {
+                result = Py_False;
+                break;
+            }
+        }
+
+        ASSIGN(self, capi_aq_parent(self));
+        if (self == NULL) {
+            return NULL;
+        } else if (self == Py_None) {
+            result = Py_False;
+            break;
+        }
+    }
+
+    Py_DECREF(self);
+    Py_INCREF(result);
+    return result;
+}
+
+static PyObject *
+module_aq_inContextOf(PyObject *ignored, PyObject *args)
+{
+    PyObject *self, *o;
+    int inner = 1;
+
+    if (!PyArg_ParseTuple(args, "OO|i", &self, &o, &inner)) {
+        return NULL;
+    }
+
+    return capi_aq_inContextOf(self, o, inner);
+}
+
+static char *wrap_many_args[] = {"objs", "container", "lazy", NULL};
+
+static PyObject *
+module_aq_wrap_many(PyObject *ignored, PyObject *args, PyObject *kw)
+{
+    PyObject *objs, *container, *result, *item;
+    int lazy = 0;
+    Py_ssize_t i, len;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|p", wrap_many_args,
+                                     &objs, &container, &lazy))
+    {
+        return NULL;
+    }
+
+    if (lazy) {
+        return WrapperArray_New(objs, container);
+    }
+
+    /* Work on a copy, __of__ methods could mutate the sequence. */
+    if ((objs = PySequence_Tuple(objs)) == NULL) {
+        return NULL;
+    }
+
+    len = PyTuple_GET_SIZE(objs);
+    if ((result = PyList_New(len)) == NULL) {
+        Py_DECREF(objs);
+        return NULL;
+    }
+
+    for (i = 0; i < len; i++) {
+        item = wrap_in_context(PyTuple_GET_ITEM(objs, i), container);
+        if (item == NULL) {
+            Py_DECREF(result);
+            Py_DECREF(objs);
+            return NULL;
+        }
+        PyList_SET_ITEM(result, i, item);
+    }
+
+    Py_DECREF(objs);
+    return result;
+}
+
+static PyObject *
+module_set_parent_cache_size(PyObject *ignored, PyObject *args)
+{
+    Py_ssize_t size;
+
+    if (!PyArg_ParseTuple(args, "n:set_parent_cache_size", &size)) {
+        return NULL;
+    }
+
+    if (size < 0) {
+        PyErr_SetString(PyExc_ValueError, "size must not be negative");
+        return NULL;
+    }
+
+    STORE_SSIZE(parent_cache_size, size);
+    PyDict_Clear(parent_cache);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_clear_parent_cache(PyObject *ignored, PyObject *unused)
+{
+    PyDict_Clear(parent_cache);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_stats(PyObject *ignored, PyObject *unused)
+{
+    PyObject *levels, *key, *count, *result;
+    Py_ssize_t i;
+    int rc;
+
+    if ((levels = PyDict_New()) == NULL) {
+        return NULL;
+    }
+
+    for (i = 0; i <= STATS_MAX_LEVELS; i++) {
+        if (LOAD_SSIZE(stats.levels[i]) == 0) {
+            continue;
+        }
+
+        key = PyLong_FromSsize_t(i);
+        count = PyLong_FromSsize_t(LOAD_SSIZE(stats.levels[i]));
+        rc = (key && count) ? PyDict_SetItem(levels, key, count) : -1;
+        Py_XDECREF(key);
+        Py_XDECREF(count);
+
+        if (rc < 0) {
+            Py_DECREF(levels);
+            return NULL;
+        }
+    }
+
+    result = Py_BuildValue(
+        "{s:O,s:n,s:n,s:N,s:n,s:n,s:n,s:n,s:n,s:n,s:n}",
+        "enabled", LOAD_INT(stats_enabled) ? Py_True : Py_False,
+        "findattr_calls", LOAD_SSIZE(stats.findattr_calls),
+        "lookups", LOAD_SSIZE(stats.lookups),
+        "levels", levels,
+        "parent_hops", LOAD_SSIZE(stats.parent_hops),
+        "filter_calls", LOAD_SSIZE(stats.filter_calls),
+        "filter_accepts", LOAD_SSIZE(stats.filter_accepts),
+        "filter_rejects", LOAD_SSIZE(stats.filter_rejects),
+        "wrappers_created", LOAD_SSIZE(stats.wrappers_created),
+        "of_simplifications", LOAD_SSIZE(stats.of_simplifications),
+        "clone_copies", LOAD_SSIZE(stats.clone_copies));
+
+    return result;
+}
+
+static PyObject *
+module_reset_stats(PyObject *ignored, PyObject *unused)
+{
+    /* All the fields are counters. */
+    Py_ssize_t *counters = (Py_ssize_t*)&stats;
+    size_t i;
+
+    for (i = 0; i < sizeof(stats) / sizeof(Py_ssize_t); i++) {
+        STORE_SSIZE(counters[i], 0);
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_set_stats_enabled(PyObject *ignored, PyObject *flag)
+{
+    int enabled;
+
+    if ((enabled = PyObject_IsTrue(flag)) < 0) {
+        return NULL;
+    }
+
+    STORE_INT(stats_enabled, enabled);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_set_profiler(PyObject *ignored, PyObject *args, PyObject *kw)
+{
+    static char *kwlist[] = {"interval", "max_entries", NULL};
+    Py_ssize_t interval, max_entries = 1000;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "n|n", kwlist,
+                                     &interval, &max_entries))
+    {
+        return NULL;
+    }
+
+    if (interval < 0 || max_entries < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "interval and max_entries must not be negative");
+        return NULL;
+    }
+
+    LOCK_MODULE();
+    STORE_SSIZE(profiler_interval, interval);
+    profiler_max_entries = max_entries;
+    profiler_countdown = interval;
+    UNLOCK_MODULE();
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_reset_profiler(PyObject *ignored, PyObject *unused)
+{
+    PyObject *empty;
+
+    if ((empty = PyDict_New()) == NULL) {
+        return NULL;
+    }
+
+    /* Release the former entries after unlocking. */
+    LOCK_MODULE();
+    SWAP(PyObject *, empty, profile);
+    profiler_countdown = profiler_interval;
+    profiler_dropped = 0;
+    UNLOCK_MODULE();
+
+    Py_DECREF(empty);
+    Py_RETURN_NONE;
+}
 
-    /* This allows Py_DECREF at the end, if the while loop did nothing. */
-    Py_INCREF(self);
+static PyObject *
+module_profiler_report(PyObject *ignored, PyObject *args, PyObject *kw)
+{
+    static char *kwlist[] = {"n", NULL};
+    Py_ssize_t n = 20, i, size;
+    PyObject *items, *item, *key, *order, *entry, *result = NULL;
 
-    while (1) {
-        /* if aq_base(self) is o: return 1 */
-        if (get_base(self) == o) {
-            result = Py_True;
-            break;
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "|n", kwlist, &n)) {
+        return NULL;
+    }
+
+    LOCK_MODULE();
+    items = PyDict_Items(profile);
+    UNLOCK_MODULE();
+    if (items == NULL) {
+        return NULL;
+    }
+
+    /* Sort (-count, index) pairs to keep the sort away from the types
+     * in the keys. */
+    if ((order = PyList_New(PyList_GET_SIZE(items))) == NULL) {
+        goto finally;
+    }
+    for (i = 0; i < PyList_GET_SIZE(items); i++) {
+        item = PyList_GET_ITEM(items, i);
+        entry = Py_BuildValue(
+            "(nn)", -PyLong_AsSsize_t(PyTuple_GET_ITEM(item, 1)), i);
+        if (entry == NULL) {
+            goto finally;
         }
+        PyList_SET_ITEM(order, i, entry);
+    }
+    if (PyList_Sort(order) < 0) {
+        goto finally;
+    }
 
-        if (inner) {
-            ASSIGN(self, capi_aq_inner(self));
-            if (self == NULL) {
-                return NULL;
-            } else if (self == Py_None) {
-                result = Py_False;
-                break;
-            }
+    size = Py_MAX(0, Py_MIN(n, PyList_GET_SIZE(order)));
+    if ((result = PyList_New(size)) == NULL) {
+        goto finally;
+    }
+
+    for (i = 0; i < size; i++) {
+        entry = PyList_GET_ITEM(order, i);
+        item = PyList_GET_ITEM(
+            items, PyLong_AsSsize_t(PyTuple_GET_ITEM(entry, 1)));
+        key = PyTuple_GET_ITEM(item, 0);
+        entry = Py_BuildValue("{s:O,s:O,s:O,s:O,s:O}",
+                              "name", PyTuple_GET_ITEM(key, 0),
+                              "depth", PyTuple_GET_ITEM(key, 1),
+                              "provider", PyTuple_GET_ITEM(key, 2),
+                              "misses", PyTuple_GET_ITEM(key, 3),
+                              "count", PyTuple_GET_ITEM(item, 1));
+        if (entry == NULL) {
+            Py_CLEAR(result);
+            goto finally;
         }
+        PyList_SET_ITEM(result, i, entry);
+    }
 
-        ASSIGN(self, capi_aq_parent(self));
-        if (self == NULL) {
-            return NULL;
-        } else if (self == Py_None) {
-            result = Py_False;
-            break;
+finally:
+    Py_DECREF(items);
+    Py_XDECREF(order);
+    return result;
+}
+
+static PyObject *
+module_profiler_dropped(PyObject *ignored, PyObject *unused)
+{
+    Py_ssize_t dropped;
+
+    LOCK_MODULE();
+    dropped = profiler_dropped;
+    UNLOCK_MODULE();
+    return PyLong_FromSsize_t(dropped);
+}
+
+static PyObject *
+module_set_slow_lookup_hook(PyObject *ignored, PyObject *args, PyObject *kw)
+{
+    static char *kwlist[] = {"hook", "levels", "time", NULL};
+    PyObject *hook, *old;
+    Py_ssize_t levels = 0;
+    double time = 0;
+    int64_t time_ns;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|nd", kwlist,
+                                     &hook, &levels, &time))
+    {
+        return NULL;
+    }
+
+    if (levels < 0 || time < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "levels and time must not be negative");
+        return NULL;
+    }
+
+    if (hook == Py_None) {
+        hook = NULL;
+    } else if (!PyCallable_Check(hook)) {
+        PyErr_SetString(PyExc_TypeError, "hook must be callable or None");
+        return NULL;
+    }
+
+    /* In nanoseconds, rounded up so that any threshold above 0 is
+     * checked. */
+    time_ns = time > 0 ? (int64_t)Py_MIN(ceil(time * 1000),
+                                         (double)INT64_MAX / 2) : 0;
+
+    Py_XINCREF(hook);
+    LOCK_MODULE();
+    old = slow_lookup_hook;
+    STORE_PTR(slow_lookup_hook, hook);
+    STORE_SSIZE(slow_lookup_levels, levels);
+    STORE_INT64(slow_lookup_time_ns, time_ns);
+    UNLOCK_MODULE();
+    Py_XDECREF(old);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_set_trace(PyObject *ignored, PyObject *arg)
+{
+    Py_ssize_t capacity;
+    TraceRecord *records = NULL, *old_records;
+    PyObject *names, *types;
+
+    if ((capacity = PyLong_AsSsize_t(arg)) == -1 && PyErr_Occurred()) {
+        return NULL;
+    }
+
+    if (capacity < 0) {
+        PyErr_SetString(PyExc_ValueError, "capacity must not be negative");
+        return NULL;
+    }
+
+    if (capacity && (records = PyMem_New(TraceRecord, capacity)) == NULL) {
+        return PyErr_NoMemory();
+    }
+
+    if ((names = PyDict_New()) == NULL || (types = PyDict_New()) == NULL) {
+        Py_XDECREF(names);
+        PyMem_Free(records);
+        return NULL;
+    }
+
+    /* Swap the state and release the former one after unlocking. */
+    LOCK_MODULE();
+    old_records = trace_records;
+    STORE_PTR(trace_records, records);
+    records = old_records;
+    SWAP(PyObject *, names, trace_names);
+    SWAP(PyObject *, types, trace_types);
+    trace_capacity = capacity;
+    trace_count = 0;
+    UNLOCK_MODULE();
+
+    PyMem_Free(records);
+    Py_DECREF(names);
+    Py_DECREF(types);
+    Py_RETURN_NONE;
+}
+
+/* Returns the keys of 'table' ordered by their index. */
+static PyObject *
+trace_table(PyObject *table)
+{
+    PyObject *result, *key, *index;
+    Py_ssize_t pos = 0;
+
+    if ((result = PyList_New(PyDict_GET_SIZE(table))) == NULL) {
+        return NULL;
+    }
+
+    while (PyDict_Next(table, &pos, &key, &index)) {
+        Py_INCREF(key);
+        PyList_SET_ITEM(result, PyLong_AsSsize_t(index), key);
+    }
+
+    return result;
+}
+
+static PyObject *
+module_trace_data(PyObject *ignored, PyObject *unused)
+{
+    PyObject *records, *names, *types;
+    Py_ssize_t size, start;
+    unsigned long long count;
+    char *buffer;
+
+    LOCK_MODULE();
+    count = trace_count;
+    size = (Py_ssize_t)Py_MIN(count, (unsigned long long)trace_capacity);
+    records = PyBytes_FromStringAndSize(NULL, size * sizeof(TraceRecord));
+    if (records == NULL) {
+        UNLOCK_MODULE();
+        return NULL;
+    }
+
+    /* Oldest record first. Nothing is recorded while tracing is off. */
+    if (size) {
+        buffer = PyBytes_AS_STRING(records);
+        start = size < trace_capacity ? 0 : count % trace_capacity;
+        memcpy(buffer, trace_records + start,
+               (size - start) * sizeof(TraceRecord));
+        memcpy(buffer + (size - start) * sizeof(TraceRecord), trace_records,
+               start * sizeof(TraceRecord));
+    }
+
+    names = trace_table(trace_names);
+    types = trace_table(trace_types);
+    UNLOCK_MODULE();
+
+    return Py_BuildValue("(NNNK)", records, names, types, count);
+}
+
+static PyObject *
+module_set_census(PyObject *ignored, PyObject *flag)
+{
+    int enabled;
+
+    if ((enabled = PyObject_IsTrue(flag)) < 0) {
+        return NULL;
+    }
+
+#if defined(Py_GIL_DISABLED) && PY_VERSION_HEX < 0x030E0000
+    /* census_wrappers can't safely take references to the wrappers. */
+    if (enabled) {
+        PyErr_SetString(PyExc_NotImplementedError,
+                        "the census needs Python 3.14 or newer in "
+                        "free-threaded builds");
+        return NULL;
+    }
+#endif
+
+    /* The entries only hold integers. */
+    LOCK_MODULE();
+    STORE_INT(census_enabled, enabled);
+    if (!enabled) {
+        PyDict_Clear(census);
+    }
+    UNLOCK_MODULE();
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_census_wrappers(PyObject *ignored, PyObject *args)
+{
+    unsigned long long since = 0;
+    PyObject *result, *key, *serial, *wrapper;
+    Py_ssize_t pos = 0;
+    int rc = 0;
+
+    if (!PyArg_ParseTuple(args, "|K", &since)) {
+        return NULL;
+    }
+
+    if ((result = PyList_New(0)) == NULL) {
+        return NULL;
+    }
+
+    LOCK_MODULE();
+    while (rc == 0 && PyDict_Next(census, &pos, &key, &serial)) {
+        if (PyLong_AsUnsignedLongLong(serial) <= since) {
+            continue;
         }
+        wrapper = OBJECT(PyLong_AsVoidPtr(key));
+#if defined(Py_GIL_DISABLED) && PY_VERSION_HEX >= 0x030E0000
+        /* Skip wrappers being deallocated by other threads. */
+        if (!PyUnstable_TryIncRef(wrapper)) {
+            continue;
+        }
+#else
+        Py_INCREF(wrapper);
+#endif
+        rc = PyList_Append(result, wrapper);
+        /* Not the last reference, the list or the caller of
+         * PyUnstable_TryIncRef hold another one. */
+        Py_DECREF(wrapper);
     }
+    UNLOCK_MODULE();
 
-    Py_DECREF(self);
-    Py_INCREF(result);
+    if (rc < 0) {
+        Py_CLEAR(result);
+    }
     return result;
 }
 
 static PyObject *
-module_aq_inContextOf(PyObject *ignored, PyObject *args)
+module_census_serial(PyObject *ignored, PyObject *unused)
 {
-    PyObject *self, *o;
-    int inner = 1;
+    unsigned long long serial;
 
-    if (!PyArg_ParseTuple(args, "OO|i", &self, &o, &inner)) {
+    LOCK_MODULE();
+    serial = census_serial;
+    UNLOCK_MODULE();
+    return PyLong_FromUnsignedLongLong(serial);
+}
+
+static PyObject *
+module_wrapper_memory(PyObject *ignored, PyObject *unused)
+{
+    return Py_BuildValue("{s:n,s:n,s:n}",
+                         "live", LOAD_SSIZE(wrapper_memory_live),
+                         "current", LOAD_SSIZE(wrapper_memory_current),
+                         "peak", LOAD_SSIZE(wrapper_memory_peak));
+}
+
+static PyObject *
+module_reset_wrapper_memory_peak(PyObject *ignored, PyObject *unused)
+{
+    STORE_SSIZE(wrapper_memory_peak, LOAD_SSIZE(wrapper_memory_current));
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_set_max_depth(PyObject *ignored, PyObject *arg)
+{
+    Py_ssize_t depth;
+
+    if ((depth = PyLong_AsSsize_t(arg)) == -1 && PyErr_Occurred()) {
         return NULL;
     }
 
-    return capi_aq_inContextOf(self, o, inner);
+    if (depth < 0) {
+        PyErr_SetString(PyExc_ValueError, "depth must not be negative");
+        return NULL;
+    }
+
+    STORE_SSIZE(max_depth, depth);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_set_name_filter(PyObject *ignored, PyObject *flag)
+{
+    int enabled;
+
+    if ((enabled = PyObject_IsTrue(flag)) < 0) {
+        return NULL;
+    }
+
+    STORE_INT(name_filter, enabled);
+    STORE_SSIZE(name_filter_probes, 0);
+    STORE_SSIZE(name_filter_rejects, 0);
+    STORE_SSIZE(name_filter_false_positives, 0);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+module_name_filter_stats(PyObject *ignored, PyObject *unused)
+{
+    return Py_BuildValue("{s:n,s:n,s:n}",
+                         "probes", LOAD_SSIZE(name_filter_probes),
+                         "rejects", LOAD_SSIZE(name_filter_rejects),
+                         "false_positives",
+                         LOAD_SSIZE(name_filter_false_positives));
+}
+
+static PyObject *
+module_set_mutating_lookups(PyObject *ignored, PyObject *flag)
+{
+    int mutate;
+
+    if ((mutate = PyObject_IsTrue(flag)) < 0) {
+        return NULL;
+    }
+
+    STORE_INT(mutate_wrappers, mutate);
+    Py_RETURN_NONE;
 }
 
 static struct PyMethodDef methods[] = {
@@ -1887,6 +4470,10 @@ static struct PyMethodDef methods[] = {
    "aq_acquire(ob, name [, filter, extra, explicit]) -- "
    "Get an attribute, acquiring it if necessary"
   },
+  {"aq_explain", (PyCFunction)module_aq_explain,
+   METH_VARARGS|METH_KEYWORDS,
+   "aq_explain(ob, name [, filter, extra, explicit, default, containment, "
+   "mutate]) -- Get the steps of the search done by aq_acquire"},
   {"aq_get", (PyCFunction)module_aq_get, METH_VARARGS,
    "aq_get(ob, name [, default]) -- "
    "Get an attribute, acquiring it if necessary."
@@ -1906,27 +4493,135 @@ static struct PyMethodDef methods[] = {
   {"aq_inContextOf", (PyCFunction)module_aq_inContextOf, METH_VARARGS,
    "aq_inContextOf(base, ob [, inner]) -- "
    "Determine whether the object is in the acquisition context of base."},
+  {"aq_wrap_many", (PyCFunction)module_aq_wrap_many,
+   METH_VARARGS|METH_KEYWORDS,
+   "aq_wrap_many(objs, container [, lazy]) -- "
+   "Get the objects in the context of the container"},
+  {"set_parent_cache_size", (PyCFunction)module_set_parent_cache_size,
+   METH_VARARGS,
+   "set_parent_cache_size(size) -- "
+   "Set the number of wrappers cached for objects with a __parent__"},
+  {"clear_parent_cache", (PyCFunction)module_clear_parent_cache, METH_NOARGS,
+   "clear_parent_cache() -- "
+   "Drop the wrappers cached for objects with a __parent__"},
+  {"stats", (PyCFunction)module_stats, METH_NOARGS,
+   "stats() -- Get the statistics of the acquisition engine"},
+  {"reset_stats", (PyCFunction)module_reset_stats, METH_NOARGS,
+   "reset_stats() -- Reset the statistics of the acquisition engine"},
+  {"set_stats_enabled", (PyCFunction)module_set_stats_enabled, METH_O,
+   "set_stats_enabled(flag) -- "
+   "Set whether the acquisition engine keeps statistics"},
+  {"set_trace", (PyCFunction)module_set_trace, METH_O,
+   "set_trace(capacity) -- "
+   "Record the last capacity lookups in the trace, 0 stops tracing"},
+  {"trace_data", (PyCFunction)module_trace_data, METH_NOARGS,
+   "trace_data() -- Get the records, names, types and number of "
+   "lookups of the trace"},
+  {"wrapper_memory", (PyCFunction)module_wrapper_memory, METH_NOARGS,
+   "wrapper_memory() -- Get the number and size of the live wrappers "
+   "and the peak size"},
+  {"reset_wrapper_memory_peak", (PyCFunction)module_reset_wrapper_memory_peak,
+   METH_NOARGS,
+   "reset_wrapper_memory_peak() -- Set the peak size to the current size"},
+  {"set_max_depth", (PyCFunction)module_set_max_depth, METH_O,
+   "set_max_depth(depth) -- "
+   "Set the maximum number of levels searched by a lookup, 0 for no limit"},
+  {"set_census", (PyCFunction)module_set_census, METH_O,
+   "set_census(flag) -- Set whether the live wrappers are counted"},
+  {"census_wrappers", (PyCFunction)module_census_wrappers, METH_VARARGS,
+   "census_wrappers([since]) -- "
+   "Get the live wrappers created after the census serial since"},
+  {"census_serial", (PyCFunction)module_census_serial, METH_NOARGS,
+   "census_serial() -- Get the serial of the last wrapper in the census"},
+  {"set_slow_lookup_hook", (PyCFunction)module_set_slow_lookup_hook,
+   METH_VARARGS|METH_KEYWORDS,
+   "set_slow_lookup_hook(hook, levels=0, time=0) -- "
+   "Call hook for lookups searching more levels or taking more "
+   "microseconds"},
+  {"set_name_filter", (PyCFunction)module_set_name_filter, METH_O,
+   "set_name_filter(flag) -- "
+   "Set whether lookups skip objects which can't have the name"},
+  {"set_profiler", (PyCFunction)module_set_profiler,
+   METH_VARARGS|METH_KEYWORDS,
+   "set_profiler(interval, max_entries=1000) -- "
+   "Profile every interval-th acquired name, 0 disables the profiler"},
+  {"reset_profiler", (PyCFunction)module_reset_profiler, METH_NOARGS,
+   "reset_profiler() -- Forget the names counted by the profiler"},
+  {"profiler_report", (PyCFunction)module_profiler_report,
+   METH_VARARGS|METH_KEYWORDS,
+   "profiler_report(n=20) -- Get the n most often acquired names"},
+  {"profiler_dropped", (PyCFunction)module_profiler_dropped, METH_NOARGS,
+   "profiler_dropped() -- "
+   "Get the number of samples dropped because the profile was full"},
+  {"name_filter_stats", (PyCFunction)module_name_filter_stats, METH_NOARGS,
+   "name_filter_stats() -- "
+   "Get the number of probes, rejects and false positives of the filter"},
+  {"set_mutating_lookups", (PyCFunction)module_set_mutating_lookups, METH_O,
+   "set_mutating_lookups(flag) -- "
+   "Set whether lookups store wrappers created for __parent__ in the chain"},
   {NULL,	NULL}
 };
 
-static struct PyModuleDef moduledef =
+/* Creates the state shared by all instances of the module, once per
+ * process. The wrapper types are static ExtensionClass types, like the
+ * ones of ExtensionClass itself, so the engine can't have state per
+ * interpreter, and the module doesn't support subinterpreters.
+ * Returns -1 on error.
+ */
+static int
+init_shared_state(void)
 {
-    PyModuleDef_HEAD_INIT,
-    "_Acquisition",                         /* m_name */
-    "Provide base classes for acquiring objects",   /* m_doc */
-    -1,                                     /* m_size */
-    methods,                                /* m_methods */
-    NULL,                                   /* m_reload */
-    NULL,                                   /* m_traverse */
-    NULL,                                   /* m_clear */
-    NULL,                                   /* m_free */
-};
+    static int initialized = 0;
 
+    if (initialized) {
+        return 0;
+    }
 
-static PyObject*
-module_init(void)
+    init_py_names();
+
+    Acquired = NATIVE_FROM_STRING("<Special Object Used to Force Acquisition>");
+    if (Acquired == NULL) {
+        return -1;
+    }
+
+    if (PyThread_tss_create(&in_slow_lookup_hook) != 0) {
+        PyErr_SetString(PyExc_RuntimeError,
+                        "can't create the thread key of the slow lookup hook");
+        return -1;
+    }
+
+    if ((parent_cache = PyDict_New()) == NULL ||
+        (profile = PyDict_New()) == NULL ||
+        (census = PyDict_New()) == NULL ||
+        (trace_names = PyDict_New()) == NULL ||
+        (trace_types = PyDict_New()) == NULL)
+    {
+        return -1;
+    }
+
+    AcquisitionCAPI.AQ_Acquire = capi_aq_acquire;
+    AcquisitionCAPI.AQ_Get = capi_aq_get;
+    AcquisitionCAPI.AQ_IsWrapper = capi_aq_iswrapper;
+    AcquisitionCAPI.AQ_Base = capi_aq_base;
+    AcquisitionCAPI.AQ_Parent = capi_aq_parent;
+    AcquisitionCAPI.AQ_Self = capi_aq_self;
+    AcquisitionCAPI.AQ_Inner = capi_aq_inner;
+    AcquisitionCAPI.AQ_Chain = capi_aq_chain;
+
+    initialized = 1;
+    return 0;
+}
+
+#define EXPORT_CLASS(D, N, T) \
+    PyExtensionClassCAPI->PyExtensionClass_Export_((D), (N), &(T))
+
+/* Fills a new instance of the module, once per import of it.
+ * Returns -1 on error.
+ */
+static int
+module_exec(PyObject *m)
 {
-    PyObject *m, *d;
+    PyObject *d;
     PyObject *api;
 
     PURE_MIXIN_CLASS(Acquirer,
@@ -1940,45 +4635,88 @@ module_init(void)
                      ExplicitAcquirer_methods);
 
     if (!ExtensionClassImported) {
-        return NULL;
+        return -1;
     }
 
-    Acquired = NATIVE_FROM_STRING("<Special Object Used to Force Acquisition>");
-    if (Acquired == NULL) {
-        return NULL;
+    if (init_shared_state() < 0) {
+        return -1;
     }
 
-    m = PyModule_Create(&moduledef);
+    /* PyExtensionClass_Export returns NULL on error, which is wrong
+     * for an exec slot, so call the C API of ExtensionClass directly. */
     d = PyModule_GetDict(m);
-    init_py_names();
-    PyExtensionClass_Export(d,"Acquirer", AcquirerType);
-    PyExtensionClass_Export(d,"ImplicitAcquisitionWrapper", Wrappertype);
-    PyExtensionClass_Export(d,"ExplicitAcquirer", ExplicitAcquirerType);
-    PyExtensionClass_Export(d,"ExplicitAcquisitionWrapper", XaqWrappertype);
-
-    /* Create aliases */
-    PyDict_SetItemString(d,"Implicit", OBJECT(&AcquirerType));
-    PyDict_SetItemString(d,"Explicit", OBJECT(&ExplicitAcquirerType));
-    PyDict_SetItemString(d,"Acquired", Acquired);
+    if (EXPORT_CLASS(d, "Acquirer", AcquirerType) < 0 ||
+        EXPORT_CLASS(d, "ImplicitAcquisitionWrapper", Wrappertype) < 0 ||
+        EXPORT_CLASS(d, "ExplicitAcquirer", ExplicitAcquirerType) < 0 ||
+        EXPORT_CLASS(d, "ExplicitAcquisitionWrapper", XaqWrappertype) < 0)
+    {
+        return -1;
+    }
 
-    AcquisitionCAPI.AQ_Acquire = capi_aq_acquire;
-    AcquisitionCAPI.AQ_Get = capi_aq_get;
-    AcquisitionCAPI.AQ_IsWrapper = capi_aq_iswrapper;
-    AcquisitionCAPI.AQ_Base = capi_aq_base;
-    AcquisitionCAPI.AQ_Parent = capi_aq_parent;
-    AcquisitionCAPI.AQ_Self = capi_aq_self;
-    AcquisitionCAPI.AQ_Inner = capi_aq_inner;
-    AcquisitionCAPI.AQ_Chain = capi_aq_chain;
+    if (PyType_Ready(&WrapperArrayType) < 0 ||
+        PyType_Ready(&AcquiredNameType) < 0)
+    {
+        return -1;
+    }
 
+    /* The capsule belongs to this instance of the module. */
     api = PyCapsule_New(&AcquisitionCAPI, "Acquisition.AcquisitionCAPI", NULL);
+    if (api == NULL) {
+        return -1;
+    }
 
-    PyDict_SetItemString(d, "AcquisitionCAPI", api);
+    if (PyDict_SetItemString(d, "WrapperArray",
+                             OBJECT(&WrapperArrayType)) < 0 ||
+        PyDict_SetItemString(d, "AcquiredName",
+                             OBJECT(&AcquiredNameType)) < 0 ||
+        /* Create aliases */
+        PyDict_SetItemString(d, "Implicit", OBJECT(&AcquirerType)) < 0 ||
+        PyDict_SetItemString(d, "Explicit",
+                             OBJECT(&ExplicitAcquirerType)) < 0 ||
+        PyDict_SetItemString(d, "Acquired", Acquired) < 0 ||
+        PyDict_SetItemString(d, "acquired", OBJECT(&AcquiredNameType)) < 0 ||
+        PyDict_SetItemString(d, "AcquisitionCAPI", api) < 0)
+    {
+        Py_DECREF(api);
+        return -1;
+    }
     Py_DECREF(api);
 
-    return m;
+    Acquirer__of__ = PyDict_GetItem(
+        ((PyTypeObject*)&AcquirerType)->tp_dict, py__of__);
+    ExplicitAcquirer__of__ = PyDict_GetItem(
+        ((PyTypeObject*)&ExplicitAcquirerType)->tp_dict, py__of__);
+
+    return 0;
 }
 
+static PyModuleDef_Slot module_slots[] = {
+    {Py_mod_exec, module_exec},
+#if PY_VERSION_HEX >= 0x030C0000
+    /* The engine state is per process, see init_shared_state, so one
+     * interpreter would keep and call the objects of another. */
+    {Py_mod_multiple_interpreters, Py_MOD_MULTIPLE_INTERPRETERS_NOT_SUPPORTED},
+#endif
+#if PY_VERSION_HEX >= 0x030D0000
+    {Py_mod_gil, Py_MOD_GIL_NOT_USED},
+#endif
+    {0, NULL}
+};
+
+static struct PyModuleDef moduledef =
+{
+    PyModuleDef_HEAD_INIT,
+    "_Acquisition",                         /* m_name */
+    "Provide base classes for acquiring objects",   /* m_doc */
+    0,                                      /* m_size */
+    methods,                                /* m_methods */
+    module_slots,                           /* m_slots */
+    NULL,                                   /* m_traverse */
+    NULL,                                   /* m_clear */
+    NULL,                                   /* m_free */
+};
+
 PyMODINIT_FUNC PyInit__Acquisition(void)
 {
-    return module_init();
+    return PyModuleDef_Init(&moduledef);
 }
@@ -0,0 +1,2046 @@
+"""The Python implementation of Acquisition.
+
+It is only imported when the C implementation is not used, or when one
+of its private names is asked for, see ``Acquisition.__getattr__``.
+"""
+# pylint:disable=W0212,R0911,R0912
+
+
+import _thread
+import collections
+import copyreg
+import operator
+import struct
+import sys
+import time
+import types
+import weakref
+
+import ExtensionClass
+
+
+Acquired = "<Special Object Used to Force Acquisition>"
+_NOT_FOUND = object()  # marker
+
+###
+# Helper functions
+###
+
+
+def _has__of__(obj):
+    """Check whether an object has an __of__ method for returning itself
+    in the context of a container."""
+    # It is necessary to check both the type (or we get into cycles)
+    # as well as the presence of the method (or mixins of Base pre- or
+    # post-class-creation as done in, e.g.,
+    # zopefoundation/Persistence) can fail.
+    return (isinstance(obj, ExtensionClass.Base) and
+            hasattr(type(obj), '__of__'))
+
+
+def _apply_filter(predicate, inst, name, result, extra, orig):
+    if not _stats_enabled:
+        return predicate(orig, inst, name, result, extra)
+    _stats['filter_calls'] += 1
+    accepted = bool(predicate(orig, inst, name, result, extra))
+    _stats['filter_accepts' if accepted else 'filter_rejects'] += 1
+    return accepted
+
+
+def _rebound_method(method, wrapper):
+    """Returns a version of the method with self bound to `wrapper`"""
+    if type(method) is types.MethodType:
+        method = types.MethodType(method.__func__, wrapper)
+    return method
+
+###
+# Wrapper object protocol, mostly ported from C directly
+###
+
+
+def _Wrapper_findspecial(wrapper, name):
+    """
+    Looks up the special acquisition attributes of an object.
+    :param str name: The attribute to find, with 'aq' already stripped.
+    """
+
+    result = _NOT_FOUND
+
+    if name == 'base':
+        result = wrapper._obj
+        while isinstance(result, _Wrapper) and result._obj is not None:
+            result = result._obj
+    elif name == 'parent':
+        result = wrapper._container
+    elif name == 'self':
+        result = wrapper._obj
+    elif name == 'explicit':
+        if type(wrapper)._IS_IMPLICIT:
+            result = ExplicitAcquisitionWrapper(
+                wrapper._obj, wrapper._container)
+        else:
+            result = wrapper
+    elif name == 'acquire':
+        result = object.__getattribute__(wrapper, 'aq_acquire')
+    elif name == 'chain':
+        # XXX: C has a second implementation here
+        result = aq_chain(wrapper)
+    elif name == 'inContextOf':
+        result = object.__getattribute__(wrapper, 'aq_inContextOf')
+    elif name == 'inner':
+        # XXX: C has a second implementation here
+        result = aq_inner(wrapper)
+    elif name == 'uncle':
+        result = 'Bob'
+
+    return result
+
+
+# Whether lookups skip objects which can't have the name, and how well
+# that works, see set_name_filter.
+_name_filter = False
+_name_filter_stats = {'probes': 0, 'rejects': 0, 'false_positives': 0}
+
+# Whether lookups store the wrappers created for __parent__ pointers in
+# the wrappers of the chain, unless a caller asks otherwise.
+_mutate_wrappers = True
+
+# Maximum number of levels searched by a lookup, 0 for no limit, see
+# set_max_depth.
+_max_depth = 0
+
+# Lookups deeper than this check for cycles in the chain.
+_CYCLE_GUARD_LEVELS = 64
+
+
+class _LookupState:
+    """State shared by all levels of a single lookup."""
+
+    __slots__ = ('mutate', 'levels', 'misses', 'hit', 'start', 'steps',
+                 'wrappers', 'visited')
+
+    def __init__(self, mutate=None):
+        self.mutate = _mutate_wrappers if mutate is None else bool(mutate)
+        # Number of levels searched so far
+        self.levels = 0
+        # Number of objects which didn't provide the name
+        self.misses = 0
+        # (name, depth, type of the provider) of an acquired name, only
+        # set by the profiler
+        self.hit = None
+        # Start of the lookup in nanoseconds, only set while there is a
+        # slow lookup hook or for aq_explain
+        self.start = time.perf_counter_ns() if _slow_lookup_hook else 0
+        # List of the steps of the lookup, only set for aq_explain
+        self.steps = None
+        # Value of _wrappers_allocated at the start of the lookup, only
+        # set while tracing
+        self.wrappers = _wrappers_allocated if _trace is not None else 0
+        # Set of the (object, container) pairs searched, only set when
+        # the lookup gets deeper than _CYCLE_GUARD_LEVELS
+        self.visited = None
+
+
+def _add_step(state, step, ob, detail=None):
+    """Append a step of the lookup to the list of `aq_explain`: what
+    happened (`step` and `detail`) on which level to an object of which
+    type."""
+    state.steps.append({
+        'step': step,
+        'level': state.levels,
+        'type': None if ob is None else type(aq_base(ob)),
+        'detail': detail,
+        'time': (time.perf_counter_ns() - state.start) / 1000})
+
+
+# Statistics of the acquisition engine, only kept while _stats_enabled
+# is set, see stats().
+_STATS_MAX_LEVELS = 32
+_stats_enabled = False
+_stats = {}
+
+# Sampling profiler of the acquired names, see set_profiler. Every
+# _profiler_interval-th acquisition is counted in _profile, keyed by
+# (name, depth, type of the provider, misses).
+_profile = {}
+_profiler_interval = 0
+_profiler_max_entries = 1000
+_profiler_countdown = 0
+_profiler_dropped = 0
+
+# Hook called for lookups which searched more than _slow_lookup_levels
+# levels or took more than _slow_lookup_time microseconds, see
+# set_slow_lookup_hook. A threshold of 0 is not checked.
+_slow_lookup_hook = None
+_slow_lookup_levels = 0
+_slow_lookup_time = 0
+# Its `running` attribute is set while the current thread runs the hook,
+# whose own lookups are not reported.
+_slow_lookup_thread = _thread._local()
+
+# Binary trace of the lookups, see set_trace. The packed records are
+# kept in a deque holding the last ones, _trace_count is the number of
+# lookups recorded since the trace was started. Names and types are
+# stored as indexes into _trace_names and _trace_types, which map them
+# to their index.
+_TRACE_RECORD = struct.Struct('=QIIHHBxH')
+_TRACE_FOUND, _TRACE_ACQUIRED, _TRACE_MISSING, _TRACE_ERROR = range(4)
+_trace = None
+_trace_count = 0
+_trace_names = {}
+_trace_types = {}
+
+# Number of wrappers created so far, only counted while tracing.
+_wrappers_allocated = 0
+
+# Census of the live wrappers, see set_census. Maps the id of each
+# wrapper created while the census is enabled to its serial number and
+# a weak reference removing the entry, None while disabled.
+_census = None
+_census_serial = 0
+
+
+def _census_add(wrapper):
+    global _census_serial
+    _census_serial += 1
+    key = id(wrapper)
+    _census[key] = (_census_serial,
+                    weakref.ref(wrapper, lambda ref: _census_remove(key)))
+
+
+def _census_remove(key):
+    if _census is not None:
+        _census.pop(key, None)
+
+
+# Whether complete lookups need a _LookupState, see _Wrapper_lookup.
+_track_lookups = False
+
+
+def _update_track_lookups():
+    global _track_lookups
+    _track_lookups = bool(_stats_enabled or _profiler_interval or
+                          _slow_lookup_hook or _trace is not None or
+                          _max_depth)
+
+
+def _check_depth(wrapper, name, state):
+    """Fail lookups exceeding _max_depth and those searching the same
+    object in the same container twice, which only happens in a cycle.
+    """
+    if _max_depth and state.levels > _max_depth:
+        raise RuntimeError(
+            f'Acquisition depth limit of {_max_depth} exceeded looking up '
+            f'{name!r}')
+    if state.levels <= _CYCLE_GUARD_LEVELS:
+        return
+    if state.visited is None:
+        state.visited = set()
+    container = object.__getattribute__(wrapper, '_container')
+    key = (id(object.__getattribute__(wrapper, '_obj')),
+           id(aq_base(container)) if container is not None else 0)
+    if key in state.visited:
+        raise RuntimeError(
+            f'Cycle detected in acquisition chain looking up {name!r}')
+    state.visited.add(key)
+
+
+def _profile_hit(state, obj, name, depth):
+    """Remember where `name` was found for the profiler, `depth` is the
+    level of `obj` in the lookup."""
+    # Names found on the object of the first level are not acquired.
+    if depth > 1:
+        state.hit = (name, depth, type(obj))
+
+
+def _profile_lookup(state):
+    """Count the acquisition remembered in `state` if it is sampled."""
+    global _profiler_countdown, _profiler_dropped
+    _profiler_countdown -= 1
+    if _profiler_countdown > 0:
+        return
+    _profiler_countdown = _profiler_interval
+
+    key = state.hit + (state.misses,)
+    if key in _profile:
+        _profile[key] += 1
+    elif len(_profile) >= _profiler_max_entries:
+        _profiler_dropped += 1
+    else:
+        _profile[key] = 1
+
+
+def _report_slow_lookup(state, obj, name, predicate, elapsed):
+    """Call the slow lookup hook for the lookup of `name` on `obj`.
+
+    Errors of the hook go to `sys.unraisablehook`, the hook must not
+    break lookups.
+    """
+    if getattr(_slow_lookup_thread, 'running', False):
+        return
+    hook = _slow_lookup_hook
+    _slow_lookup_thread.running = True
+    try:
+        hook({'name': name,
+              'levels': state.levels,
+              'elapsed': elapsed,
+              'filter': predicate,
+              'chain': [type(aq_base(ob)) for ob in aq_chain(obj)]})
+    except Exception as exc:
+        _write_unraisable(exc, hook)
+    finally:
+        _slow_lookup_thread.running = False
+
+
+def _write_unraisable(exc, obj):
+    # Like PyErr_WriteUnraisable. The default sys.unraisablehook only
+    # accepts the arguments made by the interpreter, so do its work.
+    if sys.unraisablehook is not sys.__unraisablehook__:
+        sys.unraisablehook(types.SimpleNamespace(
+            exc_type=type(exc), exc_value=exc,
+            exc_traceback=exc.__traceback__, err_msg=None, object=obj))
+        return
+    import traceback  # Only needed here, it is slow to import.
+    print(f'Exception ignored in: {obj!r}', file=sys.stderr)
+    traceback.print_exception(type(exc), exc, exc.__traceback__,
+                              file=sys.stderr)
+
+
+def _trace_index(table, key):
+    """Return the index of `key` in `table`, adding it if it is new."""
+    try:
+        return table[key]
+    except KeyError:
+        index = table[key] = len(table)
+        return index
+
+
+def _trace_lookup(state, obj, name, error):
+    """Append the lookup of `name` on `obj` to the trace."""
+    global _trace_count
+    if error is None:
+        kind = _TRACE_ACQUIRED if state.misses else _TRACE_FOUND
+    elif isinstance(error, AttributeError):
+        kind = _TRACE_MISSING
+    else:
+        kind = _TRACE_ERROR
+    _trace.append(_TRACE_RECORD.pack(
+        time.perf_counter_ns(),
+        _trace_index(_trace_names, name),
+        _trace_index(_trace_types, type(aq_base(obj))),
+        min(state.levels, 0xffff),
+        min(state.misses, 0xffff),
+        kind,
+        min(_wrappers_allocated - state.wrappers, 0xffff)))
+    _trace_count += 1
+
+
+def _end_lookup(state, obj, name, predicate=None, error=None):
+    """Record the statistics of a finished lookup of `name` on `obj`,
+    which failed with `error` unless it is None."""
+    if _stats_enabled:
+        _stats['lookups'] += 1
+        levels = min(state.levels, _STATS_MAX_LEVELS)
+        _stats['levels'][levels] = _stats['levels'].get(levels, 0) + 1
+    if state.hit is not None and _profiler_interval:
+        _profile_lookup(state)
+    if _slow_lookup_hook is not None and state.start:
+        elapsed = (time.perf_counter_ns() - state.start) / 1000
+        if ((_slow_lookup_levels and state.levels > _slow_lookup_levels) or
+                (_slow_lookup_time and elapsed > _slow_lookup_time)):
+            _report_slow_lookup(state, obj, name, predicate, elapsed)
+    if _trace is not None:
+        _trace_lookup(state, obj, name, error)
+
+
+def _Wrapper_lookup(wrapper, name, predicate=None, *args, state=None,
+                    **kwargs):
+    """Run `_Wrapper_findattr` as a complete lookup, which is counted
+    in the statistics."""
+    if state is None:
+        state = _LookupState()
+    try:
+        result = _Wrapper_findattr(wrapper, name, predicate, *args,
+                                   state=state, **kwargs)
+    except BaseException as exc:
+        _end_lookup(state, wrapper, name, predicate, exc)
+        raise
+    _end_lookup(state, wrapper, name, predicate)
+    return result
+
+
+# Cache of the wrappers created for objects which are not wrapped but
+# have a __parent__ pointer, keyed by the id of the object. The cached
+# wrappers hold the object, so the id can't be reused while the entry
+# exists. Disabled while _parent_cache_size is 0.
+_parent_cache = {}
+_parent_cache_size = 0
+
+
+def _parent_wrapper(obj, parent):
+    """Return a wrapper for `obj` in the context of `parent`, the
+    current value of its ``__parent__``.
+
+    With the parent cache enabled the wrapper is shared between lookups
+    and must not be mutated.
+    """
+    if not _parent_cache_size:
+        return ImplicitAcquisitionWrapper(obj, parent)
+    wrapper = _parent_cache.get(id(obj))
+    if (wrapper is not None
+            and wrapper._obj is obj
+            and wrapper._container is parent):
+        return wrapper
+    wrapper = ImplicitAcquisitionWrapper(obj, parent)
+    # Start over instead of tracking the usage of the entries.
+    if len(_parent_cache) >= _parent_cache_size:
+        _parent_cache.clear()
+    _parent_cache[id(obj)] = wrapper
+    return wrapper
+
+
+def _Wrapper_acquire(wrapper, name,
+                     predicate=None, predicate_extra=None,
+                     orig_object=None,
+                     explicit=True, containment=True, state=None):
+    """
+    Attempt to acquire the `name` from the parent of the wrapper.
+
+    :raises AttributeError: If the wrapper has no parent or the
+        attribute cannot be found.
+    """
+
+    # Read the fields once, another thread may rewire the wrapper.
+    container = wrapper._container
+    obj = wrapper._obj
+    if container is None:
+        raise AttributeError(name)
+
+    search_self = True
+    search_parent = True
+
+    # If the container has an acquisition wrapper itself, we'll use
+    # _Wrapper_findattr to progress further
+    if isinstance(container, _Wrapper):
+        if isinstance(obj, _Wrapper):
+            # try to optimize search by recognizing repeated objects in path
+            if obj._container is container._container:
+                search_parent = False
+                if state is not None and state.steps is not None:
+                    _add_step(state, 'prune', container,
+                              'sco: repeated container')
+            elif obj._container is container._obj:
+                search_self = False
+                if state is not None and state.steps is not None:
+                    _add_step(state, 'prune', container,
+                              'sob: repeated object')
+
+        # Don't search the container when the container of the container
+        # is the same object as `wrapper`
+        if container._container is obj:
+            search_parent = False
+            containment = True
+            if state is not None and state.steps is not None:
+                _add_step(state, 'prune', container,
+                          'sco: container of container is object')
+                _add_step(state, 'containment', container)
+        result = _Wrapper_findattr(container, name,
+                                   predicate=predicate,
+                                   predicate_extra=predicate_extra,
+                                   orig_object=orig_object,
+                                   search_self=search_self,
+                                   search_parent=search_parent,
+                                   explicit=explicit,
+                                   containment=containment,
+                                   state=state)
+        # XXX: Why does this branch of the C code check __of__,
+        # but the next one doesn't?
+        if _has__of__(result):
+            result = result.__of__(wrapper)
+        return result
+
+    # If the container has a __parent__ pointer, we create an
+    # acquisition wrapper for it accordingly.  Then we can proceed
+    # with Wrapper_findattr, just as if the container had an
+    # acquisition wrapper in the first place (see above).
+    # NOTE: This mutates the wrapper
+    elif hasattr(container, '__parent__'):
+        if _stats_enabled:
+            _stats['parent_hops'] += 1
+        parent = container.__parent__
+        # Don't search the container when the parent of the parent
+        # is the same object as 'self'
+        if parent is obj:
+            search_parent = False
+        elif isinstance(parent, _Wrapper) and parent._obj is obj:
+            # XXX: C code just does parent._obj, assumes its a wrapper
+            search_parent = False
+
+        mutate = _mutate_wrappers if state is None else state.mutate
+        if state is not None and state.steps is not None:
+            if not search_parent:
+                _add_step(state, 'prune', container,
+                          'sco: parent is object')
+            _add_step(state, 'parent', container,
+                      'temporary' if _parent_cache_size or not mutate
+                      else 'stored')
+        if _parent_cache_size or not mutate:
+            # The wrapper for the container only lives as long as this
+            # lookup or is shared through the cache, so don't store it
+            # in `wrapper`
+            container = _parent_wrapper(container, parent)
+        else:
+            container = wrapper._container = ImplicitAcquisitionWrapper(
+                container, parent)
+        return _Wrapper_findattr(container, name,
+                                 predicate=predicate,
+                                 predicate_extra=predicate_extra,
+                                 orig_object=orig_object,
+                                 search_self=search_self,
+                                 search_parent=search_parent,
+                                 explicit=explicit,
+                                 containment=containment,
+                                 state=state)
+    else:
+        # The container is the end of the acquisition chain; if we
+        # can't look up the attributes here, we can't look it up at all
+        explain = state is not None and state.steps is not None
+        try:
+            result = getattr(container, name)
+        except AttributeError:
+            if explain:
+                _add_step(state, 'probe', container, 'missing')
+            raise
+        if result is Acquired:
+            if explain:
+                _add_step(state, 'probe', container, 'Acquired')
+        else:
+            if predicate:
+                if _apply_filter(predicate, container, name,
+                                 result, predicate_extra, orig_object):
+                    if _profiler_interval and state is not None:
+                        _profile_hit(state, container, name,
+                                     state.levels + 1)
+                    if explain:
+                        _add_step(state, 'probe', container, 'found')
+                    return (result.__of__(wrapper)
+                            if _has__of__(result) else result)
+                else:
+                    if explain:
+                        _add_step(state, 'probe', container,
+                                  'rejected')
+                    raise AttributeError(name)
+            else:
+                if _profiler_interval and state is not None:
+                    _profile_hit(state, container, name,
+                                 state.levels + 1)
+                if explain:
+                    _add_step(state, 'probe', container, 'found')
+                if _has__of__(result):
+                    result = result.__of__(wrapper)
+                return result
+
+    # this line cannot be reached
+    raise AttributeError(name)  # pragma: no cover
+
+
+def _Wrapper_findattr(wrapper, name,
+                      predicate=None, predicate_extra=None,
+                      orig_object=None,
+                      search_self=True, search_parent=True,
+                      explicit=True, containment=True, state=None):
+    """
+    Search the `wrapper` object for the attribute `name`.
+
+    :param bool search_self: Search `wrapper.aq_self` for the attribute.
+    :param bool search_parent: Search `wrapper.aq_parent` for the attribute.
+    :param bool explicit: Explicitly acquire the attribute from the parent
+        (should be assumed with implicit wrapper)
+    :param bool containment: Use the innermost wrapper (`aq_inner`)
+        for looking up the attribute.
+    :param state: The `_LookupState` of the whole lookup, None for
+        the defaults.
+    """
+
+    if _stats_enabled:
+        _stats['findattr_calls'] += 1
+    if state is not None:
+        state.levels += 1
+        if _max_depth or state.levels > _CYCLE_GUARD_LEVELS:
+            _check_depth(wrapper, name, state)
+
+    orig_name = name
+    if orig_object is None:
+        orig_object = wrapper
+
+    # First, special names
+    if name.startswith('aq') or name == '__parent__':
+        # __parent__ is an alias of aq_parent
+        if name == '__parent__':
+            name = 'parent'
+        else:
+            name = name[3:]
+
+        result = _Wrapper_findspecial(wrapper, name)
+        if result is not _NOT_FOUND:
+            if predicate:
+                if _apply_filter(predicate, wrapper, orig_name,
+                                 result, predicate_extra, orig_object):
+                    return result
+                else:
+                    raise AttributeError(orig_name)
+            return result
+    elif name in ('__reduce__', '__reduce_ex__', '__getstate__', '__sizeof__',
+                  '__of__', '__cmp__', '__eq__', '__ne__', '__lt__',
+                  '__le__', '__gt__', '__ge__'):
+        return object.__getattribute__(wrapper, orig_name)
+
+    # If we're doing a containment search, replace the wrapper with aq_inner
+    if containment:
+        while isinstance(wrapper._obj, _Wrapper):
+            wrapper = wrapper._obj
+
+    if search_self and wrapper._obj is not None:
+        if isinstance(wrapper._obj, _Wrapper):
+            if wrapper is wrapper._obj:
+                raise RuntimeError("Recursion detected in acquisition wrapper")
+            try:
+                result = _Wrapper_findattr(wrapper._obj, orig_name,
+                                           predicate=predicate,
+                                           predicate_extra=predicate_extra,
+                                           orig_object=orig_object,
+                                           search_self=True,
+                                           search_parent=explicit or issubclass(type(wrapper._obj), ImplicitAcquisitionWrapper),  # NOQA
+                                           explicit=explicit,
+                                           containment=containment,
+                                           state=state)
+                if type(result) is types.MethodType:
+                    result = _rebound_method(result, wrapper)
+                elif _has__of__(result):
+                    result = result.__of__(wrapper)
+                return result
+            except AttributeError:
+                pass
+
+        # deal with mixed __parent__ / aq_parent circles
+        elif (isinstance(wrapper._container, _Wrapper) and
+              wrapper._container._container is wrapper):
+            raise RuntimeError("Recursion detected in acquisition wrapper")
+        # skip the normal lookup if the object can't have the name
+        elif _name_filter and _name_filter_rejects(wrapper._obj, orig_name):
+            if state is not None:
+                state.misses += 1
+                if state.steps is not None:
+                    _add_step(state, 'probe', wrapper._obj, 'skipped')
+        else:
+            # normal attribute lookup
+            try:
+                result = getattr(wrapper._obj, orig_name)
+            except AttributeError:
+                if _name_filter and _name_filter_applies(wrapper._obj,
+                                                         orig_name):
+                    _name_filter_stats['false_positives'] += 1
+                if state is not None:
+                    state.misses += 1
+                    if state.steps is not None:
+                        _add_step(state, 'probe', wrapper._obj, 'missing')
+            else:
+                if result is Acquired:
+                    if state is not None and state.steps is not None:
+                        _add_step(state, 'probe', wrapper._obj, 'Acquired')
+                    return _Wrapper_acquire(wrapper, orig_name,
+                                            predicate=predicate,
+                                            predicate_extra=predicate_extra,
+                                            orig_object=orig_object,
+                                            explicit=True,
+                                            containment=containment,
+                                            state=state)
+
+                if type(result) is types.MethodType:
+                    result = _rebound_method(result, wrapper)
+                elif _has__of__(result):
+                    result = result.__of__(wrapper)
+
+                if predicate:
+                    if _apply_filter(predicate, wrapper, orig_name,
+                                     result, predicate_extra, orig_object):
+                        if _profiler_interval and state is not None:
+                            _profile_hit(state, wrapper._obj, orig_name,
+                                         state.levels)
+                        if state is not None and state.steps is not None:
+                            _add_step(state, 'probe', wrapper._obj, 'found')
+                        return result
+                    if state is not None:
+                        state.misses += 1
+                        if state.steps is not None:
+                            _add_step(state, 'probe', wrapper._obj,
+                                      'rejected')
+                else:
+                    if _profiler_interval and state is not None:
+                        _profile_hit(state, wrapper._obj, orig_name,
+                                     state.levels)
+                    if state is not None and state.steps is not None:
+                        _add_step(state, 'probe', wrapper._obj, 'found')
+                    return result
+
+    # lookup has failed, acquire from the parent, unless the class of the
+    # object forbids it
+    if search_parent and (not name.startswith('_') or explicit):
+        if _acquisition_denied(wrapper._obj, orig_name):
+            if state is not None and state.steps is not None:
+                _add_step(state, 'prune', wrapper._obj, 'sco: class policy')
+            raise AttributeError(orig_name)
+        return _Wrapper_acquire(wrapper, orig_name,
+                                predicate=predicate,
+                                predicate_extra=predicate_extra,
+                                orig_object=orig_object,
+                                explicit=explicit,
+                                containment=containment,
+                                state=state)
+
+    raise AttributeError(orig_name)
+
+
+# Names zope.interface looks up for every providedBy and adapter lookup.
+_INTERFACE_NAMES = frozenset(
+    ('__providedBy__', '__provides__', '__implemented__', '__class__'))
+
+
+def _Wrapper_private(wrapper, name):
+    """Look up `name`, which starts with a single underscore or is in
+    `_INTERFACE_NAMES` and so is never acquired implicitly, on the object
+    of `wrapper` only.
+
+    Returns Acquired if the object asks to acquire the name, or when
+    `_Wrapper_findattr` has to do more than this.
+    """
+    obj = wrapper._obj
+    container = wrapper._container
+    if (isinstance(obj, _Wrapper) or
+            (isinstance(container, _Wrapper) and
+             container._container is wrapper)):
+        return Acquired
+    try:
+        result = getattr(obj, name)
+    except AttributeError:
+        raise AttributeError(name) from None
+    if type(result) is types.MethodType:
+        result = _rebound_method(result, wrapper)
+    elif _has__of__(result):
+        result = result.__of__(wrapper)
+    return result
+
+
+def _policy_contains(policy, attr, name):
+    # Policies must be collections of names, so that a string doesn't
+    # match the substrings of its name.
+    if not isinstance(policy, (set, frozenset, tuple)):
+        raise TypeError(f'{attr} must be a set, frozenset or tuple of '
+                        f'names, not {type(policy).__name__}')
+    return name in policy
+
+
+def _name_filter_applies(obj, name):
+    # Only objects finding their attributes in their type and instance
+    # dict, like Py_FindAttr of the C implementation.
+    type_obj = type(obj)
+    return (type(name) is str and
+            type_obj.__getattribute__ in _GENERIC_GETATTRIBUTES and
+            getattr(type_obj, '__getattr__', None) is None)
+
+
+def _name_filter_rejects(obj, name):
+    """Whether `obj` can't have the attribute `name`: neither its type
+    nor its instance dict has it. Keeps the statistics of the filter."""
+    if not _name_filter_applies(obj, name):
+        return False
+    _name_filter_stats['probes'] += 1
+    type_obj = type(obj)
+    if getattr(type_obj, name, _NOT_FOUND) is not _NOT_FOUND:
+        return False
+    get_dict = _instance_dict_getter(type_obj)
+    if get_dict is not None and name in get_dict(obj):
+        return False
+    _name_filter_stats['rejects'] += 1
+    return True
+
+
+def _acquisition_denied(obj, name):
+    """Whether the class of `obj` doesn't let its instances acquire
+    `name` from their parents, see `_Wrapper_findattr`."""
+    cls = type(obj)
+    local_only = getattr(cls, '__aq_local_only__', None)
+    if local_only is not None and _policy_contains(
+            local_only, '__aq_local_only__', name):
+        return True
+    acquirable = getattr(cls, '__aq_acquirable__', None)
+    return acquirable is not None and not _policy_contains(
+        acquirable, '__aq_acquirable__', name)
+
+
+def _Wrapper_special(wrapper, name):
+    """Look up the special method `name` of the object of `wrapper`
+    without searching: from the type of the object, as the interpreter
+    does for the object itself.
+
+    Returns the method bound to `wrapper` if it is a Python function, to
+    the object if it is implemented in C, or `_NOT_FOUND` if the object
+    doesn't have it. Returns None when the generic lookup has to decide,
+    because the method is another kind of descriptor, or the object is
+    not what its wrapper class was derived for, finds its attributes in
+    another way or has `name` in its instance dict.
+    """
+    special = type(wrapper)._Wrapper__SPECIAL
+    if special is None or _track_lookups or _stats_enabled:
+        return None
+    type_ref, get_dict = special
+    obj = _Wrapper_obj(wrapper)
+    type_obj = type(obj)
+    if (type_obj is not type_ref() or
+            type_obj.__getattribute__ not in _GENERIC_GETATTRIBUTES or
+            get_dict is not None and name in get_dict(obj)):
+        return None
+    container = _Wrapper_container(wrapper)
+    if (issubclass(type(container), _Wrapper) and
+            _Wrapper_container(container) is wrapper):
+        return None
+    # The descriptor itself, not what it returns for the type: a static
+    # method gives a function that must not be bound.
+    for klass in type_obj.__mro__:
+        attr = klass.__dict__.get(name, _NOT_FOUND)
+        if attr is not _NOT_FOUND:
+            break
+    if type(attr) is types.FunctionType:
+        return types.MethodType(attr, wrapper)
+    if type(attr) in _SLOT_TYPES:
+        return attr.__get__(obj, type_obj)
+    if attr is _NOT_FOUND and getattr(type_obj, '__getattr__', None) is None:
+        return _NOT_FOUND
+    return None
+
+
+def _Wrapper_fetch(self, name, default=AttributeError):
+    method = _Wrapper_special(self, name)
+    if method is _NOT_FOUND:
+        if type(default) is type and issubclass(default, Exception):
+            raise default(name)
+        return default
+    if method is not None:
+        return method
+    try:
+        if _track_lookups:
+            return _Wrapper_lookup(self, name, None, None, None, True,
+                                   type(self)._IS_IMPLICIT, False, False)
+        return _Wrapper_findattr(self, name, None, None, None, True,
+                                 type(self)._IS_IMPLICIT, False, False)
+    except AttributeError:
+        if type(default) is type and issubclass(default, Exception):
+            raise default(name)
+        return default
+
+
+_NOT_GIVEN = object()  # marker
+_OGA = object.__getattribute__
+
+# Map from the types of wrapped objects to a dict mapping each wrapper
+# class to its generated, derived wrapper class for that type (or None if
+# no derived type is made)
+_wrapper_subclass_cache = weakref.WeakKeyDictionary()
+
+# Names the wrapper answers itself, which the derived wrapper classes leave
+# to the generic lookup.
+_WRAPPER_NAMES = frozenset((
+    '_obj', '_container', '__parent__',
+    '__reduce__', '__reduce_ex__', '__getstate__', '__sizeof__', '__of__',
+    '__cmp__', '__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__'))
+
+
+def _make_getattribute(cls, type_obj):
+    """Make the ``__getattribute__`` of the derived `cls` for wrappers of
+    objects of `type_obj`.
+
+    It is `_Wrapper_findattr` of an implicit or explicit lookup without
+    filter, specialized for an object of `type_obj`, which isn't a
+    wrapper. Everything else, including lookups which are tracked or
+    counted, goes to the ``__getattribute__`` of `cls`.
+    """
+    generic = cls.__getattribute__
+    get_obj = _Wrapper._obj.__get__
+    get_container = _Wrapper._container.__get__
+    type_ref = weakref.ref(type_obj)
+    implicit = cls._IS_IMPLICIT
+    generic_names = _WRAPPER_NAMES
+    if not implicit:
+        generic_names |= {'acquire'}
+    MethodType = types.MethodType
+
+    def __getattribute__(self, name):
+        # The lookups use these all the time
+        if name == '_obj':
+            return get_obj(self)
+        if name == '_container':
+            return get_container(self)
+        obj = get_obj(self)
+        if (type(obj) is not type_ref() or name in generic_names or
+                name[:2] == 'aq' or _track_lookups or _stats_enabled):
+            return generic(self, name)
+        container = get_container(self)
+        if (issubclass(type(container), _Wrapper) and
+                get_container(container) is self):
+            # Leave the mixed __parent__ / aq_parent circle to the generic
+            # lookup to report.
+            return generic(self, name)
+        if not (_name_filter and _name_filter_rejects(obj, name)):
+            try:
+                result = getattr(obj, name)
+            except AttributeError:
+                if _name_filter and _name_filter_applies(obj, name):
+                    _name_filter_stats['false_positives'] += 1
+            else:
+                if result is Acquired:
+                    return _Wrapper_acquire(self, name, None, None, self,
+                                            True, False, None)
+                if type(result) is MethodType:
+                    return MethodType(result.__func__, self)
+                if _has__of__(result):
+                    return result.__of__(self)
+                return result
+        if not implicit or name[:1] == '_':
+            raise AttributeError(name)
+        if _acquisition_denied(obj, name):
+            raise AttributeError(name)
+        return _Wrapper_acquire(self, name, None, None, self,
+                                False, False, None)
+
+    return __getattribute__
+
+
+# Names whose use in a method of a class means that it may call the
+# generic attribute protocol of object on a wrapper, which it is rebound to.
+_OBJECT_PROTOCOL_NAMES = frozenset(
+    ('__getattribute__', '__setattr__', '__delattr__'))
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+# The types of the class attributes implemented in C, which are never
+# called with a wrapper.
+_C_DESCRIPTOR_TYPES = (
+    types.BuiltinFunctionType, types.WrapperDescriptorType,
+    types.MethodDescriptorType, types.ClassMethodDescriptorType,
+    types.GetSetDescriptorType, types.MemberDescriptorType)
+
+
+def _interface_descriptor_types():
+    # The descriptors zope.interface puts in classes only look up
+    # attributes through the wrapper. Acquisition doesn't import
+    # zope.interface, so only if it is imported.
+    declarations = sys.modules.get('zope.interface.declarations')
+    if declarations is None:
+        return ()
+    return (declarations.ObjectSpecificationDescriptor,
+            declarations.ClassProvides)
+
+
+def _may_bypass(value, name, seen):
+    """Whether `value` may get or set the attributes of a wrapper with the
+    generic protocol of object, when the wrapper is its ``self``.
+
+    Only values known not to are false: data, types, descriptors
+    implemented in C and Python functions which don't name one of the
+    methods of that protocol, nor wrap or close over something which may.
+    """
+    if isinstance(value, types.FunctionType) and (
+            name in _OBJECT_PROTOCOL_NAMES):
+        return True
+    if id(value) in seen:
+        return False
+    seen.add(id(value))
+    if isinstance(value, types.FunctionType):
+        if (not _OBJECT_PROTOCOL_NAMES.isdisjoint(
+                    _code_names(value.__code__))):
+            return True
+        # functools.wraps and other decorators hide the function they
+        # call in __wrapped__ or in a cell.
+        inner = []
+        for cell in value.__closure__ or ():
+            try:
+                inner.append(cell.cell_contents)
+            except ValueError:  # Not filled yet
+                pass
+        if hasattr(value, '__wrapped__'):
+            inner.append(value.__wrapped__)
+        for item in inner:
+            if isinstance(item, type) or not callable(item):
+                continue
+            if isinstance(item, types.FunctionType):
+                if _may_bypass(item, None, seen):
+                    return True
+            elif (not isinstance(item, _C_DESCRIPTOR_TYPES) or
+                    item.__name__ in _OBJECT_PROTOCOL_NAMES):
+                # Like object.__getattribute__ itself.
+                return True
+        return False
+    if isinstance(value, (staticmethod, classmethod)):
+        return _may_bypass(value.__func__, name, seen)
+    if isinstance(value, property):
+        return any(_may_bypass(func, None, seen)
+                   for func in (value.fget, value.fset, value.fdel)
+                   if func is not None)
+    if isinstance(value, (type,) + _C_DESCRIPTOR_TYPES +
+                  _interface_descriptor_types()):
+        return False
+    # Data is never bound to the wrapper, other descriptors may be.
+    return hasattr(type(value), '__get__')
+
+
+def _uses_object_protocol(type_obj):
+    """Whether the methods of `type_obj` may get or set the attributes of
+    a wrapper with the generic protocol of object, like
+    ``object.__getattribute__(self, name)``, bypassing the wrapper.
+
+    That is the case unless every attribute of the classes of the type
+    other than the bases of Acquisition is known not to, see _may_bypass.
+    """
+    seen = set()
+    for klass in type_obj.__mro__:
+        if klass in _PLAIN_BASES:
+            continue
+        for name, value in vars(klass).items():
+            if _may_bypass(value, name, seen):
+                return True
+    return False
+
+
+def _instance_dict_getter(type_obj):
+    """Return the function getting the instance dict of objects of
+    `type_obj`, or None if they don't have one."""
+    for klass in type_obj.__mro__:
+        descr = vars(klass).get('__dict__')
+        if descr is not None:
+            return descr.__get__
+    return None
+
+
+def _make_wrapper_subclass_if_needed(cls, obj, container):
+    # Wrappers get a class derived from `cls` for the type of the object
+    # they wrap, whose __getattribute__ is specialized for that type, see
+    # _make_getattribute.
+    # The methods of the object are called with the wrapper, so if they
+    # use object.__getattribute__ directly, see _uses_object_protocol,
+    # the wrapper needs the same attributes as the object: the wrapper
+    # subclass has descriptors for the __slots__ of the object, and
+    # wrappers share the __dict__ of their object.
+    if getattr(cls, '_Wrapper__DERIVED', False):
+        return None
+    type_obj = type(obj)
+    try:
+        subclasses = _wrapper_subclass_cache[type_obj]
+    except KeyError:
+        if obj is None or isinstance(obj, _Wrapper):
+            return None
+        subclasses = _wrapper_subclass_cache[type_obj] = {}
+    wrapper_subclass = subclasses.get(cls, _NOT_GIVEN)
+    if wrapper_subclass is _NOT_GIVEN:
+        new_type_dict = {'_Wrapper__DERIVED': True, '__slots__': ()}
+        if cls.__getattribute__ in (
+                _Wrapper.__getattribute__,
+                ExplicitAcquisitionWrapper.__getattribute__):
+            # Not for subclasses with their own lookup
+            new_type_dict['__getattribute__'] = _make_getattribute(
+                cls, type_obj)
+
+        def _make_property(slotname):
+            return property(lambda s: getattr(s._obj, slotname),
+                            lambda s, v: setattr(s._obj, slotname, v),
+                            lambda s: delattr(s._obj, slotname))
+        if new_type_dict.get('__getattribute__') is not None:
+            new_type_dict['_Wrapper__SPECIAL'] = (
+                weakref.ref(type_obj), _instance_dict_getter(type_obj))
+        if _uses_object_protocol(type_obj):
+            for slotname in copyreg._slotnames(type_obj):
+                new_type_dict[slotname] = _make_property(slotname)
+            new_type_dict['_Wrapper__SHARE_DICT'] = True
+            if not cls.__dictoffset__:
+                new_type_dict['__slots__'] = ('__dict__',)
+        if len(new_type_dict) > 2:
+            wrapper_subclass = type(cls.__name__ + '_' + type_obj.__name__,
+                                    (cls,), new_type_dict)
+        else:
+            wrapper_subclass = None
+        subclasses[cls] = wrapper_subclass
+
+    return wrapper_subclass
+
+
+class _Wrapper(ExtensionClass.Base):
+    # Only the wrapper classes derived for objects which need it have a
+    # __dict__, see _make_wrapper_subclass_if_needed.
+    __slots__ = ('_obj', '_container', '__weakref__')
+    _IS_IMPLICIT = None
+    __SHARE_DICT = False
+    # The type the class was derived for and the getter of the instance
+    # dict of its objects, see _Wrapper_special
+    __SPECIAL = None
+
+    def __new__(cls, obj, container):
+        wrapper_subclass = _make_wrapper_subclass_if_needed(cls, obj, container)  # NOQA
+        if wrapper_subclass:
+            inst = wrapper_subclass(obj, container)
+        else:
+            inst = super().__new__(cls)
+            if _stats_enabled:
+                _stats['wrappers_created'] += 1
+            if _trace is not None:
+                global _wrappers_allocated
+                _wrappers_allocated += 1
+            if _census is not None:
+                _census_add(inst)
+        inst._obj = obj
+        inst._container = container
+        if (cls.__SHARE_DICT and hasattr(obj, '__dict__') and
+                not isinstance(obj, _Wrapper)):
+            # Make our __dict__ refer to the same dict as the other object,
+            # so that if it has methods that use `object.__getattribute__`
+            # they still work. Note that because we have slots,
+            # we won't interfere with the contents of that dict.
+            od = obj.__dict__
+            if not isinstance(od, dict):
+                # Python 3 refuses to set ``__dict__`` to a non dict
+                # thus, convert
+                # Note: later changes to ``od`` will not be
+                # reflected by the wrapper. But, it is rare
+                # that ``od`` is not a dict (usually for class objects)
+                # and wrappers are transient entities. Thus, the
+                # risk should not be too high.
+                od = dict(od)
+            object.__setattr__(inst, '__dict__', od)
+        return inst
+
+    def __init__(self, obj, container):
+        super().__init__()
+        self._obj = obj
+        self._container = container
+
+    def __setattr__(self, name, value):
+        if name == '__parent__' or name == 'aq_parent':
+            object.__setattr__(self, '_container', value)
+            return
+        if name == '_obj' or name == '_container':
+            # should only happen at init time
+            object.__setattr__(self, name, value)
+            return
+
+        # If we are wrapping something, unwrap passed in wrappers
+        if self._obj is None:
+            raise AttributeError(
+                'Attempt to set attribute on empty acquisition wrapper')
+
+        while value is not None and isinstance(value, _Wrapper):
+            value = value._obj
+
+        setattr(self._obj, name, value)
+
+    def __delattr__(self, name):
+        if name == '__parent__' or name == 'aq_parent':
+            self._container = None
+        else:
+            delattr(self._obj, name)
+
+    def __getattribute__(self, name):
+        if name in ('_obj', '_container'):
+            return _OGA(self, name)
+        if (_OGA(self, '_obj') is not None or
+                _OGA(self, '_container') is not None):
+            if ((name[:1] == '_' and name[1:2] != '_' or
+                 name in _INTERFACE_NAMES) and not _track_lookups):
+                result = _Wrapper_private(self, name)
+                if result is not Acquired:
+                    return result
+            if _track_lookups:
+                return _Wrapper_lookup(self, name, None, None, None, True,
+                                       type(self)._IS_IMPLICIT, False, False)
+            return _Wrapper_findattr(self, name, None, None, None, True,
+                                     type(self)._IS_IMPLICIT, False, False)
+        return _OGA(self, name)
+
+    def __of__(self, parent):
+        # Based on __of__ in the C code;
+        # simplify a layer of wrapping.
+
+        # We have to call the raw __of__ method or we recurse on our
+        # own lookup (the C code does not have this issue, it can use
+        # the wrapped __of__ method because it gets here via the
+        # descriptor code path)...
+        wrapper = self._obj.__of__(parent)
+        if not isinstance(wrapper, _Wrapper):
+            return wrapper
+        # but the returned wrapper should be based on this object's
+        # wrapping chain
+        wrapper._obj = self
+
+        if not isinstance(wrapper._container, _Wrapper):
+            return wrapper
+
+        while (isinstance(wrapper._obj, _Wrapper) and
+               (wrapper._obj._container is wrapper._container._obj)):
+            # The C implementation copies the wrapper first if others
+            # hold it. Nothing else holds the one we just made, and
+            # changed above already.
+            if _stats_enabled:
+                _stats['of_simplifications'] += 1
+            wrapper._obj = wrapper._obj._obj
+        return wrapper
+
+    def aq_acquire(self, name,
+                   filter=None, extra=None,
+                   explicit=True,
+                   default=_NOT_GIVEN,
+                   containment=False,
+                   mutate=None):
+        try:
+            return _Wrapper_lookup(self, name, filter,
+                                   predicate_extra=extra,
+                                   orig_object=self,
+                                   search_self=True,
+                                   search_parent=explicit or type(self)._IS_IMPLICIT,  # NOQA
+                                   explicit=explicit,
+                                   containment=containment,
+                                   state=_LookupState(mutate))
+        except AttributeError:
+            if default is _NOT_GIVEN:
+                raise
+            return default
+
+    acquire = aq_acquire
+
+    def aq_inContextOf(self, o, inner=True):
+        return aq_inContextOf(self, o, inner=inner)
+
+    # Wrappers themselves are not picklable, but if the underlying
+    # object has a _p_oid, then the __getnewargs__ method is allowed
+    def __reduce__(self, *args):
+        raise TypeError("Can't pickle objects in acquisition wrappers.")
+    __reduce_ex__ = __reduce__
+    __getstate__ = __reduce__
+
+    def __getnewargs__(self):
+        return ()
+
+    def __sizeof__(self):
+        # Size of the wrapper in memory, without the wrapped objects
+        return object.__sizeof__(self)
+
+    # Equality and comparisons
+
+    def __hash__(self):
+        # The C implementation doesn't pass the wrapper
+        # to any __hash__ that the object implements,
+        # so it can't access derived attributes.
+        # (If that changes, just add this to __unary_special_methods__
+        # and remove this method)
+        return hash(self._obj)
+
+    # The C implementation forces all comparisons through the
+    # __cmp__ method, if it's implemented. If it's not implemented,
+    # then comparisons are based strictly on the memory addresses
+    # of the underlying object (aq_base). We could mostly emulate
+    # this behaviour on Python 2, but on Python 3 __cmp__ is gone,
+    # so users won't have an expectation to write it.
+    # Because users have never had an expectation that the rich comparison
+    # methods would be called on their wrapped objects (and so would not be
+    # accessing acquired attributes there), we can't/don't want to start
+    # proxying to them?
+    # For the moment, we settle for an emulation of the C behaviour:
+    # define __cmp__ the same way, and redirect the rich comparison operators
+    # to it. (Note that these attributes are also hardcoded in getattribute)
+    def __cmp__(self, other):
+        my_base = aq_base(self)
+        cmp = getattr(type(my_base), "__cmp__", None)
+        if cmp is not None:
+            return cmp(self, other)
+        other_base = aq_base(other)
+        if my_base is other_base:
+            return 0
+        return -1 if id(my_base) < id(other_base) else 1
+
+    def __eq__(self, other):
+        return self.__cmp__(other) == 0
+
+    def __ne__(self, other):
+        return self.__cmp__(other) != 0
+
+    def __lt__(self, other):
+        return self.__cmp__(other) < 0
+
+    def __le__(self, other):
+        return self.__cmp__(other) <= 0
+
+    def __gt__(self, other):
+        return self.__cmp__(other) > 0
+
+    def __ge__(self, other):
+        return self.__cmp__(other) >= 0
+
+    # Special methods:
+    # make implicitly called `obj.__method__`
+    # behave the same way as when emplicitly called
+
+    def __nonzero__(self):
+        nonzero = _Wrapper_fetch(self, '__nonzero__', None)
+        if nonzero is None:
+            # Py3 bool?
+            nonzero = _Wrapper_fetch(self, '__bool__', None)
+        if nonzero is None:
+            # a len?
+            nonzero = _Wrapper_fetch(self, '__len__', None)
+        if nonzero:
+            return bool(nonzero())  # Py3 is strict about the return type
+        # If nothing was defined, then it's true
+        return True
+    __bool__ = __nonzero__
+
+    def __unicode__(self):
+        f = _Wrapper_fetch(self, '__unicode__', None)
+        if f is None:
+            f = _Wrapper_fetch(self, '__str__')
+        return f()
+
+    def __bytes__(self):
+        return _Wrapper_fetch(self, '__bytes__', TypeError)()
+
+    if sys.version_info >= (3, 12):
+        def __buffer__(self, flags):
+            # The view exports the buffer of the wrapped object, without
+            # a copy. Older versions don't let Python classes do that.
+            return memoryview(self._obj)
+
+    __binary_special_methods__ = [
+        # general numeric
+        '__add__',
+        '__sub__',
+        '__mul__',
+        '__matmul__',
+        '__floordiv__',  # not implemented in C
+        '__mod__',
+        '__divmod__',
+        '__pow__',
+        '__lshift__',
+        '__rshift__',
+        '__and__',
+        '__xor__',
+        '__or__',
+
+        # division; only one of these will be used at any one time
+        '__truediv__',
+        '__div__',
+
+        # reflected numeric
+        '__radd__',
+        '__rsub__',
+        '__rmul__',
+        '__rdiv__',
+        '__rtruediv__',
+        '__rfloordiv__',
+        '__rmod__',
+        '__rdivmod__',
+        '__rpow__',
+        '__rlshift__',
+        '__rrshift__',
+        '__rand__',
+        '__rxor__',
+        '__ror__',
+
+        # in place numeric
+        '__iadd__',
+        '__isub__',
+        '__imul__',
+        '__imatmul__',
+        '__idiv__',
+        '__itruediv__',
+        '__ifloordiv__',
+        '__imod__',
+        '__idivmod__',
+        '__ipow__',
+        '__ilshift__',
+        '__irshift__',
+        '__iand__',
+        '__ixor__',
+        '__ior__',
+
+        # conversion
+        '__coerce__',
+
+        # container
+        '__delitem__',
+    ]
+
+    __unary_special_methods__ = [
+        # misc
+        '__repr__',
+        # requres ``AttributeError`` --> ``TypeError`` for PY3
+        # '__bytes__',
+        '__str__',
+        # arithmetic
+        '__neg__',
+        '__pos__',
+        '__abs__',
+        '__invert__',
+
+        # conversion
+        '__complex__',
+        '__int__',
+        '__long__',
+        '__float__',
+        '__oct__',
+        '__hex__',
+        '__index__',
+        # '__len__',
+
+        # strings are special
+        # '__repr__',
+        # '__str__',
+    ]
+
+    for _name in __unary_special_methods__ + __binary_special_methods__:
+        def _make_op(_name):
+            def op(self, *args):
+                return _Wrapper_fetch(self, _name)(*args)
+            return op
+        locals()[_name] = _make_op(_name)
+    del _make_op
+    del _name
+
+    # Container protocol
+
+    def __len__(self):
+        # if len is missing, it should raise TypeError
+        # (AttributeError is acceptable under Py2, but Py3
+        # breaks list conversion if AttributeError is raised)
+        return _Wrapper_fetch(self, '__len__', TypeError)()
+
+    def __iter__(self):
+        it = _Wrapper_fetch(self, '__iter__', None)
+        if it is not None:
+            return it()
+        if hasattr(self, '__getitem__'):
+            # Unfortunately we cannot simply call iter(self._obj)
+            # and rebind im_self like we do above: the Python runtime
+            # complains:
+            # (TypeError: 'sequenceiterator' expected, got 'Wrapper' instead)
+
+            class WrapperIter:
+                __slots__ = ('_wrapper',)
+
+                def __init__(self, o):
+                    self._wrapper = o
+
+                def __getitem__(self, i):
+                    return self._wrapper.__getitem__(i)
+            it = WrapperIter(self)
+            return iter(it)
+
+        raise TypeError("__iter__")
+
+    def __contains__(self, item):
+        # First, if the type of the object defines __contains__ then
+        # use it
+        aq_contains = _Wrapper_fetch(self, '__contains__', None)
+        if aq_contains:
+            return aq_contains(item)
+        # Next, we should attempt to iterate like the interpreter;
+        # but the C code doesn't do this, so we don't either.
+        # return item in iter(self)
+        raise AttributeError('__contains__')
+
+    def __setitem__(self, key, value):
+        setter = _Wrapper_fetch(self, "__setitem__")
+        setter(key, value)
+
+    def __getitem__(self, key):
+        getter = _Wrapper_fetch(self, '__getitem__')
+        return getter(key)
+
+    def __call__(self, *args, **kwargs):
+        try:
+            # Note we look this up on the completely unwrapped
+            # object, so as not to get a class
+            call = getattr(self.aq_base, '__call__')
+        except AttributeError:  # pragma: no cover
+            # A TypeError is what the interpreter raises;
+            # AttributeError is allowed to percolate through the
+            # C proxy
+            raise TypeError('object is not callable')
+        else:
+            return _rebound_method(call, self)(*args, **kwargs)
+
+
+class ImplicitAcquisitionWrapper(_Wrapper):
+    __slots__ = ()
+    _IS_IMPLICIT = True
+
+
+class ExplicitAcquisitionWrapper(_Wrapper):
+    __slots__ = ()
+    _IS_IMPLICIT = False
+
+    def __getattribute__(self, name):
+        # Special case backwards-compatible acquire method
+        if name == 'acquire':
+            return object.__getattribute__(self, name)
+
+        return _Wrapper.__getattribute__(self, name)
+
+
+class _Acquirer(ExtensionClass.Base):
+
+    def __getattribute__(self, name):
+        try:
+            return super().__getattribute__(name)
+        except AttributeError as exc:
+            # the doctests have very specific error message
+            exc.args = AttributeError(name).args
+            raise
+
+    def __of__(self, context):
+        return type(self)._Wrapper(self, context)
+
+
+class Implicit(_Acquirer):
+    _Wrapper = ImplicitAcquisitionWrapper
+
+
+ImplicitAcquisitionWrapper._Wrapper = ImplicitAcquisitionWrapper
+
+
+class Explicit(_Acquirer):
+    _Wrapper = ExplicitAcquisitionWrapper
+
+
+ExplicitAcquisitionWrapper._Wrapper = ExplicitAcquisitionWrapper
+
+# Bases whose customized attribute access doesn't bypass wrappers, see
+# _uses_object_protocol.
+_PLAIN_BASES = frozenset(
+    (object, ExtensionClass.Base, _Acquirer, Implicit, Explicit))
+
+# The implementations of __getattribute__ which find the methods of an
+# object in its type, see _Wrapper_special.
+_GENERIC_GETATTRIBUTES = (object.__getattribute__,
+                          ExtensionClass.Base.__getattribute__,
+                          _Acquirer.__getattribute__)
+
+# The types of the methods of types implemented in C
+_SLOT_TYPES = (types.WrapperDescriptorType, types.MethodDescriptorType)
+
+_Wrapper_obj = _Wrapper._obj.__get__
+_Wrapper_container = _Wrapper._container.__get__
+
+###
+# Exported module functions
+###
+
+
+def aq_acquire(obj, name,
+               filter=None, extra=None,
+               explicit=True,
+               default=_NOT_GIVEN,
+               containment=False,
+               mutate=None):
+    return _acquire_with_state(obj, name, filter, extra, explicit, default,
+                               containment, _LookupState(mutate))
+
+
+def _acquire_with_state(obj, name, filter, extra, explicit, default,
+                        containment, state):
+    """Run `aq_acquire` as a lookup with the `_LookupState` `state`,
+    which `aq_explain` sets up to record the steps."""
+    start = obj
+    try:
+        if isinstance(obj, _Wrapper):
+            # We got a wrapped object, so business as usual
+            explicit = explicit or type(obj)._IS_IMPLICIT
+            result = _Wrapper_findattr(obj, name,
+                                       predicate=filter,
+                                       predicate_extra=extra,
+                                       orig_object=obj,
+                                       search_self=True,
+                                       search_parent=explicit,
+                                       explicit=explicit,
+                                       containment=containment,
+                                       state=state)
+        elif hasattr(obj, '__parent__') or filter is not None:
+            # Does it have a parent, or do we have a filter?
+            # Then go through the acquisition code
+            if hasattr(obj, '__parent__'):
+                if _stats_enabled:
+                    _stats['parent_hops'] += 1
+                if state.steps is not None:
+                    _add_step(state, 'parent', obj, 'temporary')
+            obj = _parent_wrapper(obj, getattr(obj, '__parent__', None))
+            result = _Wrapper_findattr(obj, name,
+                                       predicate=filter,
+                                       predicate_extra=extra,
+                                       orig_object=obj,
+                                       search_self=True,
+                                       search_parent=True,
+                                       explicit=True,
+                                       containment=containment,
+                                       state=state)
+        else:
+            # no parent and no filter, simple case
+            try:
+                result = getattr(obj, name)
+            except AttributeError:
+                if state.steps is not None:
+                    _add_step(state, 'probe', obj, 'missing')
+                raise AttributeError(name) from None  # doctests are strict
+            if state.steps is not None:
+                _add_step(state, 'probe', obj, 'found')
+    except BaseException as exc:
+        _end_lookup(state, start, name, filter, exc)
+        if default is _NOT_GIVEN or not isinstance(exc, AttributeError):
+            raise
+        return default
+    _end_lookup(state, start, name, filter)
+    return result
+
+
+def aq_explain(obj, name,
+               filter=None, extra=None,
+               explicit=True,
+               default=_NOT_GIVEN,
+               containment=False,
+               mutate=None):
+    """Return the steps of the search done by `aq_acquire`.
+
+    The arguments are the ones of `aq_acquire`, the default is ignored.
+    """
+    state = _LookupState(mutate)
+    state.steps = []
+    state.start = time.perf_counter_ns()
+
+    try:
+        _acquire_with_state(obj, name, filter, extra, explicit, _NOT_GIVEN,
+                            containment, state)
+    except AttributeError:
+        _add_step(state, 'done', None, 'AttributeError')
+    else:
+        _add_step(state, 'done', None, 'found')
+    return state.steps
+
+
+def aq_parent(obj):
+    # needs to be safe to call from __getattribute__ of a wrapper
+    # and reasonably fast
+    if isinstance(obj, _Wrapper):
+        return object.__getattribute__(obj, '_container')
+    # if not a wrapper, deal with the __parent__
+    return getattr(obj, '__parent__', None)
+
+
+def aq_chain(obj, containment=False):
+    result = []
+
+    while True:
+        if isinstance(obj, _Wrapper):
+            if obj._obj is not None:
+                if containment:
+                    while isinstance(obj._obj, _Wrapper):
+                        obj = obj._obj
+                result.append(obj)
+            if obj._container is not None:
+                obj = obj._container
+                continue
+        else:
+            result.append(obj)
+            obj = getattr(obj, '__parent__', None)
+            if obj is not None:
+                continue
+
+        break
+
+    return result
+
+
+def aq_base(obj):
+    result = obj
+    while isinstance(result, _Wrapper):
+        result = result._obj
+    return result
+
+
+def aq_get(obj, name, default=_NOT_GIVEN, containment=False):
+    state = _LookupState()
+    start = obj
+
+    # Not wrapped. If we have a __parent__ pointer, create a wrapper
+    # and go as usual
+    if not isinstance(obj, _Wrapper) and hasattr(obj, '__parent__'):
+        if _stats_enabled:
+            _stats['parent_hops'] += 1
+        obj = _parent_wrapper(obj, obj.__parent__)
+
+    try:
+        # We got a wrapped object, business as usual
+        result = (_Wrapper_findattr(obj, name, None, None, obj,
+                                    True, True, True, containment,
+                                    state=state)
+                  if isinstance(obj, _Wrapper)
+                  # ok, plain getattr
+                  else getattr(obj, name))
+    except AttributeError as exc:
+        _end_lookup(state, start, name, error=exc)
+        if default is _NOT_GIVEN:
+            raise
+        return default
+    except BaseException as exc:
+        _end_lookup(state, start, name, error=exc)
+        raise
+    _end_lookup(state, start, name)
+    return result
+
+
+def aq_inner(obj):
+    if not isinstance(obj, _Wrapper):
+        return obj
+
+    result = obj._obj
+    while isinstance(result, _Wrapper):
+        obj = result
+        result = result._obj
+    result = obj
+    return result
+
+
+def aq_self(obj):
+    if isinstance(obj, _Wrapper):
+        return obj.aq_self
+    return obj
+
+
+def aq_inContextOf(self, o, inner=True):
+    next = self
+    o = aq_base(o)
+
+    while True:
+        if aq_base(next) is o:
+            return True
+
+        if inner:
+            self = aq_inner(next)
+            if self is None:  # pragma: no cover
+                # This branch is normally impossible to hit,
+                # it just mirrors a check in C
+                break
+        else:
+            self = next
+
+        next = aq_parent(self)
+        if next is None:
+            break
+
+    return False
+
+
+def _wrap_in_context(obj, container):
+    """Return `obj` in the context of `container`.
+
+    Objects using the stock ``__of__`` of the acquirers get their wrapper
+    constructed directly instead of calling the method.
+    """
+    if not _has__of__(obj):
+        return obj
+    if type(obj).__of__ is _Acquirer.__of__:
+        return type(obj)._Wrapper(obj, container)
+    return obj.__of__(container)
+
+
+def set_parent_cache_size(size):
+    """Set the number of wrappers cached for objects with a
+    ``__parent__``, 0 disables the cache."""
+    global _parent_cache_size
+    if size < 0:
+        raise ValueError('size must not be negative')
+    _parent_cache_size = size
+    _parent_cache.clear()
+
+
+def clear_parent_cache():
+    """Drop the wrappers cached for objects with a ``__parent__``."""
+    _parent_cache.clear()
+
+
+def set_name_filter(flag):
+    """Set whether lookups skip objects which can't have the name.
+
+    This also resets the statistics of the filter.
+    """
+    global _name_filter
+    _name_filter = bool(flag)
+    _name_filter_stats.update(probes=0, rejects=0, false_positives=0)
+
+
+def name_filter_stats():
+    """Return the number of probes, rejects and false positives of the
+    name filter."""
+    return dict(_name_filter_stats)
+
+
+def set_mutating_lookups(flag):
+    """Set whether lookups store the wrappers they create for
+    ``__parent__`` pointers in the wrappers of the chain."""
+    global _mutate_wrappers
+    _mutate_wrappers = bool(flag)
+
+
+def set_max_depth(depth):
+    """Set the maximum number of levels searched by a lookup, 0 for no
+    limit.
+
+    Deeper lookups raise a RuntimeError. Lookups searching more than a
+    few dozen levels also check for cycles in the chain.
+    """
+    global _max_depth
+    depth = operator.index(depth)
+    if depth < 0:
+        raise ValueError('depth must not be negative')
+    _max_depth = depth
+    _update_track_lookups()
+
+
+def stats():
+    """Return the statistics of the acquisition engine.
+
+    They are only kept while enabled by `set_stats_enabled`.
+    """
+    result = dict(_stats, enabled=_stats_enabled)
+    result['levels'] = dict(_stats['levels'])
+    return result
+
+
+def reset_stats():
+    """Reset all statistics of the acquisition engine to zero."""
+    _stats.update(findattr_calls=0, lookups=0, levels={}, parent_hops=0,
+                  filter_calls=0, filter_accepts=0, filter_rejects=0,
+                  wrappers_created=0, of_simplifications=0, clone_copies=0)
+
+
+reset_stats()
+
+
+def set_stats_enabled(flag):
+    """Set whether the acquisition engine keeps statistics."""
+    global _stats_enabled
+    _stats_enabled = bool(flag)
+    _update_track_lookups()
+
+
+def set_slow_lookup_hook(hook, levels=0, time=0):
+    """Call `hook` for lookups which searched more than `levels` levels
+    or took more than `time` microseconds, None removes the hook.
+
+    A threshold of 0 is not checked. The hook gets a dict with the
+    ``name``, the number of ``levels`` searched, the ``elapsed`` time in
+    microseconds, the ``filter`` and the ``chain`` of the types of the
+    objects the lookup started on.
+    """
+    global _slow_lookup_hook, _slow_lookup_levels, _slow_lookup_time
+    if levels < 0 or time < 0:
+        raise ValueError('levels and time must not be negative')
+    if hook is not None and not callable(hook):
+        raise TypeError('hook must be callable or None')
+    _slow_lookup_hook = hook
+    _slow_lookup_levels = levels
+    _slow_lookup_time = time
+    _update_track_lookups()
+
+
+def set_trace(capacity):
+    """Record the last `capacity` lookups in the trace, 0 stops tracing.
+
+    This also discards the records of a previous trace.
+    """
+    global _trace, _trace_count
+    if capacity < 0:
+        raise ValueError('capacity must not be negative')
+    _trace = collections.deque(maxlen=capacity) if capacity else None
+    _trace_count = 0
+    _trace_names.clear()
+    _trace_types.clear()
+    _update_track_lookups()
+
+
+def trace_data():
+    """Return the records, names, types and number of lookups of the
+    trace, see `Acquisition.trace`."""
+    return (b''.join(_trace or ()),
+            sorted(_trace_names, key=_trace_names.get),
+            sorted(_trace_types, key=_trace_types.get),
+            _trace_count)
+
+
+def set_census(flag):
+    """Set whether the live wrappers are counted, see `census`.
+
+    Only wrappers created while the census is enabled are counted.
+    """
+    global _census
+    if not flag:
+        _census = None
+    elif _census is None:
+        _census = {}
+
+
+def census_wrappers(since=0):
+    """Return the live wrappers created after the census serial `since`."""
+    if _census is None:
+        return []
+    result = []
+    for serial, ref in list(_census.values()):
+        wrapper = ref()
+        if serial > since and wrapper is not None:
+            result.append(wrapper)
+    return result
+
+
+def wrapper_memory():
+    """Return the number (``live``) and size (``current``) of the live
+    wrappers and the ``peak`` size since the last reset.
+
+    Only the C implementation keeps track, so they stay at zero here.
+    """
+    return {'live': 0, 'current': 0, 'peak': 0}
+
+
+def reset_wrapper_memory_peak():
+    """Set the peak size of the live wrappers to the current size."""
+
+
+def census_serial():
+    """Return the serial of the last wrapper in the census."""
+    return _census_serial
+
+
+def set_profiler(interval, max_entries=1000):
+    """Profile every `interval`-th acquired name, 0 disables the
+    profiler.
+
+    The profile keeps at most `max_entries` distinct entries, samples
+    which would need a new one are dropped once it is full.
+    """
+    global _profiler_interval, _profiler_max_entries, _profiler_countdown
+    if interval < 0 or max_entries < 0:
+        raise ValueError('interval and max_entries must not be negative')
+    _profiler_interval = _profiler_countdown = interval
+    _profiler_max_entries = max_entries
+    _update_track_lookups()
+
+
+def reset_profiler():
+    """Forget the names counted by the profiler."""
+    global _profiler_countdown, _profiler_dropped
+    _profile.clear()
+    _profiler_countdown = _profiler_interval
+    _profiler_dropped = 0
+
+
+def profiler_report(n=20):
+    """Return the `n` most often acquired names.
+
+    Each entry is a dict with the ``name``, the ``depth`` of the level
+    it was found on, the type of the object which ``provider``-ed it,
+    the number of objects which didn't provide it (``misses``) and the
+    ``count`` of samples.
+    """
+    entries = sorted(_profile.items(), key=lambda item: -item[1])
+    return [dict(name=name, depth=depth, provider=provider, misses=misses,
+                 count=count)
+            for (name, depth, provider, misses), count in entries[:max(n, 0)]]
+
+
+def profiler_dropped():
+    """Return the number of samples dropped because the profile was
+    full."""
+    return _profiler_dropped
+
+
+def aq_wrap_many(objs, container, lazy=False):
+    if lazy:
+        return WrapperArray(objs, container)
+    return [_wrap_in_context(obj, container) for obj in tuple(objs)]
+
+
+class WrapperArray:
+    """Sequence of objects wrapped in the context of a container
+    when accessed."""
+
+    __slots__ = ('_objs', '_container')
+
+    def __init__(self, objs, container):
+        self._objs = tuple(objs)
+        self._container = container
+
+    def __len__(self):
+        return len(self._objs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return WrapperArray(self._objs[index], self._container)
+        try:
+            obj = self._objs[index]
+        except IndexError:
+            raise IndexError('WrapperArray index out of range')
+        return _wrap_in_context(obj, self._container)
+
+    @property
+    def aq_parent(self):
+        return self._container
+
+    def getattr_each(self, name, default=_NOT_GIVEN):
+        result = []
+        for obj in self._objs:
+            try:
+                value = getattr(_wrap_in_context(obj, self._container), name)
+            except AttributeError:
+                if default is _NOT_GIVEN:
+                    raise
+                value = default
+            result.append(value)
+        return result
+
+
+class AcquiredName:
+    """Look up a name in the context of an object, like ``getattr``.
+
+    The C implementation remembers the types of the objects it had to
+    skip to find the name and only checks their instance dicts the next
+    time.
+    """
+
+    __slots__ = ('name',)
+
+    depth = 0
+
+    def __init__(self, name):
+        if not isinstance(name, str):
+            raise TypeError('acquired() argument must be str, not %s'
+                            % type(name).__name__)
+        self.name = name
+
+    def __call__(self, object, default=_NOT_GIVEN):
+        if default is _NOT_GIVEN:
+            return getattr(object, self.name)
+        return getattr(object, self.name, default)
+
+    def __repr__(self):
+        return 'acquired(%r)' % (self.name,)
+
+
+acquired = AcquiredName
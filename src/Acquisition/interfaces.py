@@ -18,6 +18,9 @@ For details, see
 
 from zope.interface import Attribute
 from zope.interface import Interface
+from zope.interface import classImplements
+
+import Acquisition
 
 
 class IAcquirer(Interface):
@@ -53,7 +56,7 @@ class IAcquisitionWrapper(Interface):
     """
 
     def aq_acquire(name, filter=None, extra=None, explicit=True, default=0,
-                   containment=False):
+                   containment=False, mutate=None):
         """Get an attribute, acquiring it if necessary.
 
         The search first searches in the object and if this search
@@ -96,6 +99,11 @@ class IAcquisitionWrapper(Interface):
         the parent of a wrapper *w* is only searched if *w* is an inner
         wrapper, i.e. if the object of *w* is not a wrapper and the parent
         is the object's container.
+
+        *mutate* controls whether the wrappers created for objects
+        with a ``__parent__`` pointer during the search are stored in
+        the wrappers of the chain. ``None`` uses the setting of
+        ``set_mutating_lookups``, which is true by default.
         """
 
     def aq_inContextOf(obj, inner=1):
@@ -119,3 +127,12 @@ class IAcquisitionWrapper(Interface):
 
     aq_explicit = Attribute(
         """Get the object with an explicit acquisition wrapper.""")
+
+
+# The classes of Acquisition are declared here rather than when importing
+# Acquisition, so that doing that doesn't need zope.interface. Asking
+# about these interfaces needs this module, so it has been imported.
+classImplements(Acquisition.Explicit, IAcquirer)
+classImplements(Acquisition.ExplicitAcquisitionWrapper, IAcquisitionWrapper)
+classImplements(Acquisition.Implicit, IAcquirer)
+classImplements(Acquisition.ImplicitAcquisitionWrapper, IAcquisitionWrapper)
@@ -14,7 +14,9 @@
 """Acquisition test cases (and useful examples)
 """
 
+import contextlib
 import gc
+import io
 import operator
 import sys
 import unittest
@@ -2195,6 +2197,55 @@ class TestAqParentParentInteraction(unittest.TestCase):
         self.assertEqual(aq_chain(x), [x, y, z])
         self.assertEqual(x.aq_chain, [x, y, z])
 
+    def test___parent__lookup(self):
+        # The root of a chain is recognized for all the ways an object
+        # can provide (or not provide) a __parent__.
+        root = Location()
+        root.color = 'red'
+
+        class InClass(Implicit):
+            __parent__ = root
+
+        class Computed(Implicit):
+            @property
+            def __parent__(self):
+                return root
+
+        class Hook(Implicit):
+            def __getattr__(self, name):
+                if name == '__parent__':
+                    return root
+                raise AttributeError(name)
+
+        class Slots:
+            __slots__ = ('color',)
+
+        in_dict = Location()
+        in_dict.__parent__ = root
+        for obj in (in_dict, InClass(), Computed(), Hook()):
+            self.assertIs(aq_parent(obj), root)
+            self.assertEqual(aq_chain(obj), [obj, root])
+            self.assertEqual(aq_acquire(obj, 'color'), 'red')
+            self.assertEqual(aq_get(obj, 'color'), 'red')
+
+        for obj in (Location(), Slots(), 42):
+            self.assertIsNone(aq_parent(obj))
+            self.assertEqual(aq_chain(obj), [obj])
+            self.assertRaises(AttributeError, aq_acquire, obj, 'color')
+            self.assertIsNone(aq_get(obj, 'color', None))
+            self.assertIsNone(aq_acquire(obj, 'color', default=None))
+
+    def test___parent__lookup_errors(self):
+        class Broken(Implicit):
+            def __getattr__(self, name):
+                raise ValueError(name)
+
+        obj = Broken()
+        self.assertRaises(ValueError, aq_parent, obj)
+        self.assertRaises(ValueError, aq_chain, obj)
+        self.assertRaises(ValueError, aq_acquire, obj, 'color')
+        self.assertRaises(ValueError, getattr, Implicit().__of__(obj), 'x')
+
 
 class TestParentCircles(unittest.TestCase):
 
@@ -2869,6 +2920,1710 @@ class TestAcquire(unittest.TestCase):
         self.assertIs(found.aq_self, self.a.b.aq_self)
 
 
+class TestWrapMany(unittest.TestCase):
+
+    def setUp(self):
+
+        class Impl(Implicit):
+            pass
+
+        class Expl(Explicit):
+            pass
+
+        class Custom(Implicit):
+            def __of__(self, parent):
+                return ('custom', parent)
+
+        self.folder = Impl()
+        self.folder.color = 'red'
+        self.Custom = Custom
+        self.children = [Impl(), Expl(), Custom(), 42]
+
+    def test_wraps_like___of__(self):
+        from Acquisition import aq_wrap_many
+        result = aq_wrap_many(self.children, self.folder)
+        self.assertIsInstance(result, list)
+        self.assertEqual(len(result), 4)
+        self.assertIsInstance(
+            result[0], Acquisition.ImplicitAcquisitionWrapper)
+        self.assertIsInstance(
+            result[1], Acquisition.ExplicitAcquisitionWrapper)
+        for wrapper, child in zip(result[:2], self.children):
+            self.assertIs(aq_base(wrapper), child)
+            self.assertIs(aq_parent(wrapper), self.folder)
+        self.assertEqual(result[0].color, 'red')
+        self.assertEqual(result[2], ('custom', self.folder))
+        self.assertEqual(result[3], 42)
+
+    def test_accepts_iterables(self):
+        from Acquisition import aq_wrap_many
+        result = aq_wrap_many(iter(self.children[:2]), self.folder)
+        self.assertEqual([aq_base(w) for w in result], self.children[:2])
+
+    def test_wrapped_children_are_simplified(self):
+        from Acquisition import aq_wrap_many
+        folder = self.folder
+        folder.child = self.children[0]
+        result = aq_wrap_many([folder.child], folder)
+        self.assertIs(aq_base(result[0]), self.children[0])
+        self.assertIs(aq_base(aq_parent(result[0])), folder)
+
+    def test_lazy(self):
+        from Acquisition import WrapperArray
+        from Acquisition import aq_wrap_many
+        result = aq_wrap_many(self.children, self.folder, lazy=True)
+        self.assertIsInstance(result, WrapperArray)
+        self.assertEqual(len(result), 4)
+        self.assertIs(aq_base(result[0]), self.children[0])
+        self.assertIs(aq_parent(result[1]), self.folder)
+        self.assertEqual(result[-1], 42)
+        self.assertEqual(result[-2], ('custom', self.folder))
+        self.assertRaises(IndexError, operator.getitem, result, 4)
+        self.assertRaises(IndexError, operator.getitem, result, -5)
+
+        page = result[1:3]
+        self.assertIsInstance(page, WrapperArray)
+        self.assertEqual(len(page), 2)
+        self.assertEqual(list(page)[1], ('custom', self.folder))
+        self.assertEqual([aq_base(w) for w in result[:2]], self.children[:2])
+
+    def test_lazy_does_not_wrap_until_accessed(self):
+        from Acquisition import aq_wrap_many
+        calls = []
+
+        class Counting(Implicit):
+            def __of__(self, parent):
+                calls.append(self)
+                return Implicit.__of__(self, parent)
+
+        children = [Counting() for i in range(10)]
+        result = aq_wrap_many(children, self.folder, lazy=True)
+        self.assertEqual(calls, [])
+        page = result[5:7]
+        self.assertEqual(calls, [])
+        self.assertEqual([aq_base(w) for w in page], children[5:7])
+        self.assertEqual(calls, children[5:7])
+
+    def test_lazy_aq_parent(self):
+        from Acquisition import aq_wrap_many
+        result = aq_wrap_many(self.children, self.folder, lazy=True)
+        self.assertIs(result.aq_parent, self.folder)
+        self.assertIs(result[1:].aq_parent, self.folder)
+
+    def test_getattr_each(self):
+        from Acquisition import aq_wrap_many
+        self.children[0].color = 'blue'
+        result = aq_wrap_many(self.children[:2] * 2, self.folder, lazy=True)
+        self.assertEqual(result.getattr_each('color', None),
+                         ['blue', None, 'blue', None])
+        self.assertRaises(AttributeError, result.getattr_each, 'color')
+        self.assertEqual(result[:1].getattr_each('color'), ['blue'])
+
+        Impl = type(self.children[0])
+        result = aq_wrap_many([Impl(), Impl()], self.folder, lazy=True)
+        self.assertEqual(result.getattr_each('color'), ['red', 'red'])
+
+    def test_getattr_each_escaping_wrappers(self):
+        from Acquisition import aq_wrap_many
+
+        class Item(Implicit):
+            def me(self):
+                return self
+
+        children = [Item() for i in range(3)]
+        result = aq_wrap_many(children, self.folder, lazy=True)
+        methods = result.getattr_each('me')
+        wrappers = [m() for m in methods]
+        self.assertEqual([aq_base(w) for w in wrappers], children)
+        for wrapper in wrappers:
+            self.assertIs(aq_parent(wrapper), self.folder)
+
+    def test_getattr_each_container_with___parent__(self):
+        from Acquisition import aq_wrap_many
+
+        class Root(Implicit):
+            color = 'green'
+
+        class Folder(ExtensionClass.Base):
+            __parent__ = Root()
+
+        Impl = type(self.children[0])
+        folder = Folder()
+        result = aq_wrap_many([Impl(), Impl()], folder, lazy=True)
+        self.assertEqual(result.getattr_each('color'), ['green', 'green'])
+        self.assertEqual(result.getattr_each('aq_parent'), [folder, folder])
+
+    @unittest.skipIf(not CAPI, 'Pure Python WrapperArray holds a tuple.')
+    def test_lazy_is_compact(self):
+        import struct
+
+        from Acquisition import aq_wrap_many
+        small = aq_wrap_many(self.children, self.folder, lazy=True)
+        large = aq_wrap_many(self.children * 3, self.folder, lazy=True)
+        self.assertEqual(sys.getsizeof(large) - sys.getsizeof(small),
+                         8 * struct.calcsize('P'))
+
+
+class TestParentCache(unittest.TestCase):
+
+    def setUp(self):
+        from Acquisition import set_parent_cache_size
+        set_parent_cache_size(100)
+
+        class Item(Implicit):
+            def me(self):
+                return self
+
+        self.root = Item()
+        self.root.color = 'red'
+        self.folder = Item()
+        self.folder.__parent__ = self.root
+        self.item = Item()
+        self.item.__parent__ = self.folder
+
+    def tearDown(self):
+        from Acquisition import set_parent_cache_size
+        set_parent_cache_size(0)
+
+    def test_lookups_reuse_wrappers(self):
+        me = Acquisition.aq_acquire(self.item, 'me')()
+        self.assertIs(aq_base(me), self.item)
+        self.assertIs(aq_base(aq_parent(me)), self.folder)
+        self.assertIs(Acquisition.aq_acquire(self.item, 'me')(), me)
+        self.assertIs(Acquisition.aq_get(self.item, 'me')(), me)
+        self.assertEqual(Acquisition.aq_acquire(self.item, 'color'), 'red')
+
+    def test___parent___changes(self):
+        me = Acquisition.aq_acquire(self.item, 'me')()
+        self.item.__parent__ = self.root
+        other = Acquisition.aq_acquire(self.item, 'me')()
+        self.assertIsNot(other, me)
+        self.assertIs(aq_parent(other), self.root)
+        self.assertIs(aq_base(aq_parent(me)), self.folder)
+
+    def test_wrappers_are_not_mutated(self):
+        wrapper = self.item.__of__(self.folder)
+        self.assertEqual(wrapper.color, 'red')
+        self.assertIs(aq_parent(wrapper), self.folder)
+
+    def test_cache_is_bounded(self):
+        from Acquisition import clear_parent_cache
+        from Acquisition import set_parent_cache_size
+        set_parent_cache_size(1)
+        me = Acquisition.aq_acquire(self.item, 'me')()
+        self.assertIs(Acquisition.aq_acquire(self.item, 'me')(), me)
+        Acquisition.aq_acquire(self.folder, 'me')
+        self.assertIsNot(Acquisition.aq_acquire(self.item, 'me')(), me)
+
+        me = Acquisition.aq_acquire(self.item, 'me')()
+        clear_parent_cache()
+        self.assertIsNot(Acquisition.aq_acquire(self.item, 'me')(), me)
+        self.assertRaises(ValueError, set_parent_cache_size, -1)
+
+    def test_disabled(self):
+        from Acquisition import set_parent_cache_size
+        set_parent_cache_size(0)
+        me = Acquisition.aq_acquire(self.item, 'me')()
+        self.assertIsNot(Acquisition.aq_acquire(self.item, 'me')(), me)
+        wrapper = self.item.__of__(self.folder)
+        self.assertEqual(wrapper.color, 'red')
+        self.assertIsNot(aq_parent(wrapper), self.folder)
+
+
+class TestNonMutatingLookups(unittest.TestCase):
+
+    def setUp(self):
+
+        class Item(Implicit):
+            pass
+
+        self.root = Item()
+        self.root.color = 'red'
+        self.folder = Item()
+        self.folder.__parent__ = self.root
+        self.wrapper = Item().__of__(self.folder)
+
+    def tearDown(self):
+        from Acquisition import set_mutating_lookups
+        set_mutating_lookups(True)
+
+    def test_default_mutates(self):
+        self.assertEqual(self.wrapper.color, 'red')
+        self.assertIsNot(aq_parent(self.wrapper), self.folder)
+        self.assertIs(aq_base(aq_parent(self.wrapper)), self.folder)
+
+    def test_global(self):
+        from Acquisition import set_mutating_lookups
+        set_mutating_lookups(False)
+        self.assertEqual(self.wrapper.color, 'red')
+        self.assertEqual(Acquisition.aq_acquire(self.wrapper, 'color'), 'red')
+        self.assertEqual(Acquisition.aq_get(self.wrapper, 'color'), 'red')
+        self.assertIs(aq_parent(self.wrapper), self.folder)
+
+    def test_per_call(self):
+        from Acquisition import set_mutating_lookups
+        self.assertEqual(
+            Acquisition.aq_acquire(self.wrapper, 'color', mutate=False),
+            'red')
+        self.assertEqual(self.wrapper.aq_acquire('color', mutate=False),
+                         'red')
+        self.assertIs(aq_parent(self.wrapper), self.folder)
+
+        set_mutating_lookups(False)
+        self.assertEqual(
+            Acquisition.aq_acquire(self.wrapper, 'color', mutate=True),
+            'red')
+        self.assertIs(aq_base(aq_parent(self.wrapper)), self.folder)
+        self.assertIsNot(aq_parent(self.wrapper), self.folder)
+
+    def test_missing_attribute(self):
+        with self.assertRaises(AttributeError):
+            Acquisition.aq_acquire(self.wrapper, 'missing', mutate=False)
+        self.assertIs(aq_parent(self.wrapper), self.folder)
+
+
+class TestAcquiredName(unittest.TestCase):
+
+    def setUp(self):
+
+        class Folder(Implicit):
+            pass
+
+        class Document(Implicit):
+            pass
+
+        self.Folder = Folder
+        root = self.root = Folder()
+        root.color = 'red'
+        root.tool = Folder()
+        root.a = Folder()
+        root.a.b = Folder()
+        root.a.b.doc = Document()
+        self.doc = root.a.b.doc
+
+    def test_like_getattr(self):
+        from Acquisition import acquired
+        doc = self.doc
+        self.assertEqual(acquired('color')(doc), 'red')
+        self.assertEqual(acquired('color')(self.root), 'red')
+        for name in ('tool', 'b', 'doc'):
+            result = acquired(name)(doc)
+            expected = getattr(doc, name)
+            self.assertEqual([aq_base(o) for o in aq_chain(result)],
+                             [aq_base(o) for o in aq_chain(expected)])
+            self.assertEqual([aq_base(o) for o in aq_chain(result, True)],
+                             [aq_base(o) for o in aq_chain(expected, True)])
+        self.assertRaises(AttributeError, acquired('missing'), doc)
+        self.assertIsNone(acquired('missing')(doc, None))
+        self.assertEqual(repr(acquired('color')), "acquired('color')")
+        self.assertEqual(acquired('color').name, 'color')
+        self.assertRaises(TypeError, acquired, 42)
+
+    def test_not_acquired_names(self):
+        from Acquisition import acquired
+        self.root._private = 1
+        self.assertRaises(AttributeError, acquired('_private'), self.doc)
+        self.assertIs(acquired('aq_parent')(self.doc),
+                      aq_parent(self.doc))
+
+    def test_other_objects(self):
+        from Acquisition import acquired
+        explicit = Explicit().__of__(self.doc)
+        self.assertRaises(AttributeError, acquired('color'), explicit)
+        self.assertEqual(acquired('color')(explicit.aq_parent), 'red')
+        self.assertEqual(acquired('real')(1), 1)
+        location = self.Folder()
+        location.__parent__ = self.root
+        self.assertEqual(acquired('color')(self.Folder().__of__(location)),
+                         'red')
+
+    def test_follows_changes(self):
+        from Acquisition import acquired
+        color = acquired('color')
+        self.assertEqual(color(self.doc), 'red')
+        self.root.a.color = 'blue'
+        self.assertEqual(color(self.doc), 'blue')
+        self.Folder.color = 'green'
+        self.assertEqual(color(self.doc), 'green')
+        del self.Folder.color
+        del self.root.a.color
+        self.assertEqual(color(self.doc), 'red')
+        self.root.color = Acquisition.Acquired
+        self.assertRaises(AttributeError, color, self.doc)
+
+    @unittest.skipIf(not CAPI, 'Only the C implementation caches.')
+    def test_depth(self):
+        from Acquisition import acquired
+        color = acquired('color')
+        self.assertEqual(color.depth, 0)
+        color(self.doc)
+        self.assertEqual(color.depth, 3)
+        color(self.root.a)
+        self.assertEqual(color.depth, 1)
+
+
+class TestNameFilter(unittest.TestCase):
+
+    def setUp(self):
+        from Acquisition import set_name_filter
+        set_name_filter(True)
+
+        class Folder(Implicit):
+            pass
+
+        self.Folder = Folder
+        root = self.root = Folder()
+        root.color = 'red'
+        root.a = Folder()
+        root.a.b = Folder()
+        root.a.b.c = Folder()
+
+    def tearDown(self):
+        from Acquisition import set_name_filter
+        set_name_filter(False)
+
+    def test_lookups(self):
+        c = self.root.a.b.c
+        self.assertEqual(c.color, 'red')
+        self.root.a.color = 'blue'
+        self.assertEqual(c.color, 'blue')
+        self.Folder.color = 'green'
+        self.assertEqual(c.color, 'green')
+        del self.Folder.color
+        self.assertRaises(AttributeError, getattr, c, 'missing')
+        self.assertEqual(aq_acquire(c, 'color'), 'blue')
+
+    def test_stats(self):
+        from Acquisition import name_filter_stats
+        from Acquisition import set_name_filter
+
+        class Computed(Implicit):
+            @property
+            def color(self):
+                raise AttributeError('color')
+
+        c = self.root.a.b.c
+        set_name_filter(True)
+        self.assertEqual(c.color, 'red')
+        self.assertEqual(
+            name_filter_stats(),
+            {'probes': 3, 'rejects': 3, 'false_positives': 0})
+
+        self.root.a.b.c = Computed()
+        c = self.root.a.b.c
+        set_name_filter(True)
+        self.assertEqual(c.color, 'red')
+        self.assertEqual(
+            name_filter_stats(),
+            {'probes': 3, 'rejects': 2, 'false_positives': 1})
+
+
+def _stats_workload():
+    """Return the statistics of a few lookups of each kind, as text."""
+    from Acquisition import reset_stats
+    from Acquisition import set_stats_enabled
+    from Acquisition import stats
+
+    class Folder(Implicit):
+        pass
+
+    class Location(Implicit):
+        pass
+
+    class Note(Explicit):
+        pass
+
+    root = Folder()
+    root.color = 'red'
+    root.a = Folder()
+    root.a.b = Folder()
+    root.a.b.c = Folder()
+    root.a.b.note = Note()
+    located = Location()
+    located.__parent__ = root.a
+    set_stats_enabled(True)
+    reset_stats()
+    try:
+        c = root.a.b.c
+        c.color
+        aq_acquire(c, 'color', lambda *args: True)
+        aq_get(c, 'nothing', None)
+        c.aq_acquire('color', containment=True)
+        root.a.b.c.__of__(root.a.b).color  # Simplified
+        aq_acquire(located, 'color')
+        aq_get(located, 'color')
+        Folder().__of__(located).color
+        root.a.b.note.aq_acquire('color')
+        root.a.b.note.aq_parent.color
+        for wrapper in (c, root.a.b.note):
+            with contextlib.suppress(AttributeError):
+                wrapper.missing
+        result = stats()
+    finally:
+        set_stats_enabled(False)
+    result['levels'] = sorted(result['levels'].items())
+    return repr(sorted(result.items()))
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        from Acquisition import reset_stats
+        from Acquisition import set_stats_enabled
+
+        class Folder(Implicit):
+            pass
+
+        root = self.root = Folder()
+        root.color = 'red'
+        root.a = Folder()
+        root.a.b = Folder()
+        root.a.b.c = Folder()
+        self.c = root.a.b.c
+        set_stats_enabled(True)
+        reset_stats()
+
+    def tearDown(self):
+        from Acquisition import set_stats_enabled
+        set_stats_enabled(False)
+
+    def test_disabled(self):
+        from Acquisition import set_stats_enabled
+        from Acquisition import stats
+        set_stats_enabled(False)
+        self.assertEqual(self.c.color, 'red')
+        result = stats()
+        self.assertFalse(result.pop('enabled'))
+        self.assertEqual(result.pop('levels'), {})
+        self.assertEqual(set(result.values()), {0})
+
+    def test_lookup(self):
+        from Acquisition import stats
+        self.assertEqual(self.c.color, 'red')
+        result = stats()
+        self.assertTrue(result['enabled'])
+        self.assertEqual(result['lookups'], 1)
+        self.assertEqual(result['findattr_calls'], 3)
+        self.assertEqual(result['levels'], {3: 1})
+
+    def test_reset_stats(self):
+        from Acquisition import reset_stats
+        from Acquisition import stats
+        self.assertEqual(self.c.color, 'red')
+        reset_stats()
+        self.assertEqual(stats()['lookups'], 0)
+        self.assertEqual(stats()['levels'], {})
+
+    def test_filter(self):
+        from Acquisition import stats
+        self.root.a.color = 'blue'
+
+        def red(orig, inst, name, value, extra):
+            return value == 'red'
+
+        self.assertEqual(aq_acquire(self.c, 'color', red), 'red')
+        result = stats()
+        self.assertEqual(result['filter_calls'], 2)
+        self.assertEqual(result['filter_accepts'], 1)
+        self.assertEqual(result['filter_rejects'], 1)
+
+    def test_parent_hops(self):
+        from Acquisition import stats
+
+        class Location(Implicit):
+            pass
+
+        root = Location()
+        root.color = 'red'
+        child = Location()
+        child.__parent__ = root
+        self.assertEqual(aq_acquire(child, 'color'), 'red')
+        self.assertEqual(stats()['parent_hops'], 1)
+
+    def test_wrappers_created(self):
+        from Acquisition import stats
+        self.root.a
+        self.assertEqual(stats()['wrappers_created'], 1)
+
+    @unittest.skipIf(not CAPI, 'Needs the C implementation.')
+    def test_same_in_both_implementations(self):
+        import os
+        import subprocess
+        results = []
+        for pure in ('0', '1'):
+            env = dict(os.environ, PURE_PYTHON=pure,
+                       PYTHONPATH=os.pathsep.join(sys.path))
+            results.append(subprocess.run(
+                [sys.executable, '-c',
+                 'from Acquisition.tests import _stats_workload;'
+                 'print(_stats_workload())'],
+                env=env, stdout=subprocess.PIPE, check=True,
+                universal_newlines=True).stdout)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0].strip(), _stats_workload())
+        self.assertIn("('clone_copies', 0)", results[0])
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        from Acquisition import reset_profiler
+        from Acquisition import set_profiler
+
+        class Folder(Implicit):
+            pass
+
+        class Root(Implicit):
+            pass
+
+        self.Folder = Folder
+        self.Root = Root
+        root = self.root = Root()
+        root.color = 'red'
+        root.a = Folder()
+        root.a.size = 3
+        root.a.b = Folder()
+        root.a.b.c = Folder()
+        self.c = root.a.b.c
+        set_profiler(1)
+        reset_profiler()
+
+    def tearDown(self):
+        from Acquisition import set_profiler
+        set_profiler(0)
+
+    def test_report(self):
+        from Acquisition import profiler_report
+        for i in range(3):
+            self.assertEqual(self.c.color, 'red')
+        self.assertEqual(aq_acquire(self.c, 'size'), 3)
+        self.assertRaises(AttributeError, getattr, self.c, 'missing')
+        self.root.a.b.c.title = 'own'
+        self.assertEqual(self.c.title, 'own')
+        self.assertEqual(profiler_report(), [
+            {'name': 'color', 'depth': 4, 'provider': self.Root,
+             'misses': 3, 'count': 3},
+            {'name': 'size', 'depth': 3, 'provider': self.Folder,
+             'misses': 2, 'count': 1}])
+        self.assertEqual(len(profiler_report(1)), 1)
+
+    def test_filter_misses(self):
+        from Acquisition import profiler_report
+        self.root.a.color = 'blue'
+
+        def red(orig, inst, name, value, extra):
+            return value == 'red'
+
+        self.assertEqual(aq_acquire(self.c, 'color', red), 'red')
+        self.assertEqual(profiler_report(), [
+            {'name': 'color', 'depth': 4, 'provider': self.Root,
+             'misses': 3, 'count': 1}])
+
+    def test_interval(self):
+        from Acquisition import profiler_report
+        from Acquisition import set_profiler
+        set_profiler(3)
+        for i in range(7):
+            self.c.color
+        self.assertEqual(profiler_report()[0]['count'], 2)
+
+    def test_max_entries(self):
+        from Acquisition import profiler_dropped
+        from Acquisition import profiler_report
+        from Acquisition import set_profiler
+        set_profiler(1, max_entries=1)
+        self.c.color
+        self.c.size
+        self.c.color
+        self.assertEqual(
+            [(e['name'], e['count']) for e in profiler_report()],
+            [('color', 2)])
+        self.assertEqual(profiler_dropped(), 1)
+
+    def test_disabled(self):
+        from Acquisition import profiler_report
+        from Acquisition import set_profiler
+        set_profiler(0)
+        self.c.color
+        self.assertEqual(profiler_report(), [])
+        self.assertRaises(ValueError, set_profiler, -1)
+
+
+class TestSlowLookupHook(unittest.TestCase):
+
+    def setUp(self):
+        class Folder(Implicit):
+            pass
+
+        class Root(Implicit):
+            pass
+
+        self.Folder = Folder
+        self.Root = Root
+        root = self.root = Root()
+        root.color = 'red'
+        root.a = Folder()
+        root.a.b = Folder()
+        self.b = root.a.b
+        self.reports = []
+
+    def tearDown(self):
+        from Acquisition import set_slow_lookup_hook
+        set_slow_lookup_hook(None)
+
+    def test_levels(self):
+        from Acquisition import set_slow_lookup_hook
+        set_slow_lookup_hook(self.reports.append, levels=1)
+        self.assertEqual(self.root.a.color, 'red')
+        self.assertEqual(self.reports, [])
+        self.assertEqual(self.b.color, 'red')
+        self.assertEqual(len(self.reports), 1)
+        report = self.reports[0]
+        self.assertEqual(report['name'], 'color')
+        self.assertEqual(report['levels'], 2)
+        self.assertIsNone(report['filter'])
+        self.assertEqual(report['chain'],
+                         [self.Folder, self.Folder, self.Root])
+        self.assertGreaterEqual(report['elapsed'], 0)
+
+    def test_time(self):
+        import time
+
+        from Acquisition import set_slow_lookup_hook
+
+        def slow(orig, inst, name, value, extra):
+            time.sleep(0.002)
+            return True
+
+        set_slow_lookup_hook(self.reports.append, time=1000)
+        self.assertEqual(self.b.color, 'red')
+        self.assertEqual(self.reports, [])
+        self.assertEqual(aq_acquire(self.b, 'color', slow), 'red')
+        self.assertEqual(len(self.reports), 1)
+        self.assertIs(self.reports[0]['filter'], slow)
+        self.assertGreater(self.reports[0]['elapsed'], 1000)
+
+    def test_hook_errors(self):
+        from Acquisition import set_slow_lookup_hook
+
+        def hook(info):
+            raise ValueError
+
+        set_slow_lookup_hook(hook, levels=1)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            self.assertEqual(self.b.color, 'red')
+            self.assertRaises(AttributeError, getattr, self.b, 'missing')
+        self.assertIn('ValueError', stderr.getvalue())
+        self.assertRaises(ValueError, set_slow_lookup_hook, hook, -1)
+        self.assertRaises(TypeError, set_slow_lookup_hook, 42)
+
+    def test_hook_errors_unraisablehook(self):
+        from Acquisition import set_slow_lookup_hook
+
+        def hook(info):
+            raise ValueError
+
+        unraisable = []
+        orig = sys.unraisablehook
+        sys.unraisablehook = unraisable.append
+        self.addCleanup(setattr, sys, 'unraisablehook', orig)
+        set_slow_lookup_hook(hook, levels=1)
+        self.assertEqual(self.b.color, 'red')
+        self.assertEqual(len(unraisable), 1)
+        self.assertIs(unraisable[0].exc_type, ValueError)
+        self.assertIs(unraisable[0].object, hook)
+
+    def test_hook_lookups_not_reported(self):
+        from Acquisition import set_slow_lookup_hook
+
+        def hook(info):
+            self.reports.append(info['name'])
+            # Slow lookups of its own
+            self.assertEqual(self.b.color, 'red')
+            self.assertEqual(aq_acquire(self.b, 'color'), 'red')
+
+        set_slow_lookup_hook(hook, levels=1)
+        self.assertEqual(self.b.color, 'red')
+        self.assertEqual(self.reports, ['color'])
+        self.assertEqual(aq_acquire(self.b, 'color'), 'red')
+        self.assertEqual(self.reports, ['color', 'color'])
+
+
+class TestAqExplain(unittest.TestCase):
+
+    def setUp(self):
+        class Folder(Implicit):
+            pass
+
+        class Root(Implicit):
+            pass
+
+        self.Folder = Folder
+        self.Root = Root
+        root = self.root = Root()
+        root.color = 'red'
+        root.a = Folder()
+        root.a.b = Folder()
+        self.b = root.a.b
+
+    def _explain(self, *args, **kw):
+        from Acquisition import aq_explain
+        steps = aq_explain(*args, **kw)
+        times = [step.pop('time') for step in steps]
+        self.assertEqual(times, sorted(times))
+        return [(step['step'], step['level'], step['type'], step['detail'])
+                for step in steps]
+
+    def test_found(self):
+        Folder, Root = self.Folder, self.Root
+        self.assertEqual(self._explain(self.b, 'color'), [
+            ('probe', 1, Folder, 'missing'),
+            ('probe', 2, Folder, 'missing'),
+            ('probe', 2, Root, 'found'),
+            ('done', 2, None, 'found')])
+
+    def test_filter(self):
+        Folder, Root = self.Folder, self.Root
+
+        def blue(orig, inst, name, value, extra):
+            return value == 'blue'
+
+        self.assertEqual(
+            self._explain(self.b, 'color', blue, default=None), [
+                ('probe', 1, Folder, 'missing'),
+                ('probe', 2, Folder, 'missing'),
+                ('probe', 2, Root, 'rejected'),
+                ('done', 2, None, 'AttributeError')])
+
+    def test_prune(self):
+        a = self.Folder()
+        b = self.Folder()
+        b.color = 'blue'
+        self.assertEqual(self._explain(a.__of__(b.__of__(a)), 'color'), [
+            ('probe', 1, self.Folder, 'missing'),
+            ('prune', 1, self.Folder,
+             'sco: container of container is object'),
+            ('containment', 1, self.Folder, None),
+            ('probe', 2, self.Folder, 'found'),
+            ('done', 2, None, 'found')])
+
+    def test___parent__(self):
+        class Location(Implicit):
+            pass
+
+        parent = Location()
+        parent.color = 'blue'
+        child = Location()
+        child.__parent__ = parent
+        self.assertEqual(self._explain(child, 'color'), [
+            ('parent', 0, Location, 'temporary'),
+            ('probe', 1, Location, 'missing'),
+            ('probe', 1, Location, 'found'),
+            ('done', 1, None, 'found')])
+
+    def test_not_wrapped(self):
+        self.assertEqual(self._explain(object(), 'color'), [
+            ('probe', 0, object, 'missing'),
+            ('done', 0, None, 'AttributeError')])
+
+    def test_counted_like_aq_acquire(self):
+        # The same lookup as aq_acquire, with the same statistics.
+        from Acquisition import aq_explain
+        from Acquisition import reset_stats
+        from Acquisition import set_stats_enabled
+        from Acquisition import stats
+
+        class Location(Implicit):
+            pass
+
+        child = Location()
+        child.__parent__ = self.b
+        set_stats_enabled(True)
+        self.addCleanup(set_stats_enabled, False)
+        results = []
+        for lookup in (aq_acquire, aq_explain):
+            reset_stats()
+            lookup(child, 'color')
+            lookup(child, 'missing', default=None)
+            results.append(stats())
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0]['lookups'], 2)
+        self.assertEqual(results[0]['parent_hops'], 2)
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        from Acquisition import trace
+
+        class Folder(Implicit):
+            pass
+
+        root = self.root = Folder()
+        root.color = 'red'
+        root.a = Folder()
+        root.a.b = Folder()
+        self.b = root.a.b
+        trace.start(8)
+
+    def tearDown(self):
+        from Acquisition import trace
+        trace.stop()
+
+    def _save_and_load(self):
+        import os
+        import tempfile
+
+        from Acquisition import trace
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        trace.save(path)
+        return path, trace.load(path)
+
+    def _records(self, data):
+        from Acquisition.trace import KINDS
+        return [(data.names[r.name], r.levels, r.misses, KINDS[r.kind])
+                for r in data.records]
+
+    def test_records(self):
+        self.assertEqual(self.b.color, 'red')
+        self.assertEqual(aq_acquire(self.b, 'color'), 'red')
+        self.assertRaises(AttributeError, getattr, self.b, 'missing')
+        path, data = self._save_and_load()
+        records = [record for record in self._records(data)
+                   if record[0] in ('color', 'missing')]
+        self.assertEqual(records, [
+            ('color', 2, 2, 'acquired'),
+            ('color', 2, 2, 'acquired'),
+            ('missing', 2, 2, 'missing')])
+        self.assertEqual(
+            set(data.types), {f'{__name__}.TestTrace.setUp.<locals>.Folder'})
+
+    def test_ring_buffer(self):
+        for i in range(20):
+            self.b.color
+        path, data = self._save_and_load()
+        self.assertEqual(len(data.records), 8)
+        self.assertGreaterEqual(data.count, 20)
+        times = [record.time for record in data.records]
+        self.assertEqual(times, sorted(times))
+
+    def test_analyze(self):
+        from Acquisition import trace
+        for i in range(3):
+            self.b.color
+        path, data = self._save_and_load()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            trace.main(['analyze', path])
+        output = output.getvalue()
+        self.assertIn('Acquired names by levels searched:', output)
+        self.assertIn('color', output)
+        self.assertIn('setUp.<locals>.Folder', output)
+
+    def test_off(self):
+        from Acquisition import trace
+        from Acquisition import trace_data
+        self.b.color
+        trace.stop()
+        self.assertEqual(trace_data(), (b'', [], [], 0))
+        self.b.color
+        self.assertEqual(trace_data(), (b'', [], [], 0))
+        path, data = self._save_and_load()
+        self.assertEqual(data, ([], [], [], 0))
+
+    def test_load_errors(self):
+        import os
+        import tempfile
+
+        from Acquisition import trace
+        fd, path = tempfile.mkstemp()
+        os.write(fd, b'x' * 40)
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.assertRaises(ValueError, trace.load, path)
+
+
+class TestCensus(unittest.TestCase):
+
+    def setUp(self):
+        from Acquisition import set_census
+
+        class Folder(Implicit):
+            pass
+
+        self.Folder = Folder
+        root = self.root = Folder()
+        root.a = Folder()
+        root.a.b = Folder()
+        set_census(True)
+
+    def tearDown(self):
+        from Acquisition import set_census
+        set_census(False)
+
+    def test_census(self):
+        from Acquisition import census
+        before = census()
+        b = self.root.a.b
+        result = census()
+        self.assertEqual(result['wrappers'] - before['wrappers'], 2)
+        self.assertEqual(result['by_type'][self.Folder],
+                         before['by_type'].get(self.Folder, 0) + 2)
+        self.assertGreater(result['serial'], before['serial'])
+        del b
+        gc.collect()
+        self.assertEqual(census()['wrappers'], before['wrappers'])
+
+    def test_census_diff(self):
+        from Acquisition import census
+        from Acquisition import census_diff
+        snapshot = census()
+        keep = self.root.a.b
+        temporary = self.root.a.b
+        del temporary
+        gc.collect()
+        diff = census_diff(snapshot)
+        survivors = diff['survivors']
+        self.assertEqual([s['depth'] for s in survivors], [3, 2])
+        self.assertIs(survivors[0]['wrapper'], keep)
+        self.assertIs(survivors[0]['type'], self.Folder)
+        self.assertGreater(survivors[0]['retained'],
+                           survivors[1]['retained'])
+        self.assertEqual(diff['by_type'], {self.Folder: 2})
+        self.assertEqual(diff['by_depth'], {2: 1, 3: 1})
+
+    def test_disabled(self):
+        from Acquisition import census
+        from Acquisition import census_wrappers
+        from Acquisition import set_census
+        set_census(False)
+        b = self.root.a.b
+        self.assertEqual(census_wrappers(), [])
+        self.assertEqual(census()['wrappers'], 0)
+        set_census(True)
+        del b
+        self.assertEqual(census_wrappers(), [])
+
+
+class TestWrapperMemory(unittest.TestCase):
+
+    def setUp(self):
+        class Folder(Implicit):
+            pass
+
+        self.Folder = Folder
+        root = self.root = Folder()
+        root.a = Folder()
+        root.a.b = Folder()
+        root.a.b.data = 'x' * 1000
+
+    def test___sizeof__(self):
+        b = self.root.a.b
+        self.assertLess(b.__sizeof__(), object.__sizeof__(aq_base(b)) + 100)
+        self.assertEqual(b.__sizeof__(), type(b).__sizeof__(b))
+
+    def test_aq_sizeof(self):
+        from Acquisition import aq_sizeof
+        b = self.root.a.b
+        size = b.__sizeof__()
+        self.assertEqual(aq_sizeof(self.root), 0)
+        self.assertEqual(aq_sizeof(self.root.a), size)
+        self.assertEqual(aq_sizeof(b), 2 * size)
+        nested = self.Folder().__of__(b).__of__(self.root)
+        self.assertEqual(aq_sizeof(nested), size)
+        self.assertEqual(aq_sizeof(nested, deep=True), 4 * size)
+
+    @unittest.skipIf(not CAPI, 'Only the C implementation tracks memory.')
+    def test_wrapper_memory(self):
+        from Acquisition import reset_wrapper_memory_peak
+        from Acquisition import wrapper_memory
+        reset_wrapper_memory_peak()
+        before = wrapper_memory()
+        wrappers = [self.Folder().__of__(self.root) for i in range(10)]
+        size = wrappers[0].__sizeof__()
+        after = wrapper_memory()
+        self.assertEqual(after['live'] - before['live'], 10)
+        self.assertEqual(after['current'] - before['current'], 10 * size)
+        self.assertEqual(after['peak'], after['current'])
+        del wrappers
+        self.assertEqual(wrapper_memory()['current'], before['current'])
+        self.assertEqual(wrapper_memory()['peak'], after['peak'])
+
+    @unittest.skipIf(not CAPI, 'Only the C implementation tracks memory.')
+    def test_wrappers_traced_once(self):
+        # As objects allocated by Python, not in a domain of their own.
+        import tracemalloc
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        wrappers = [self.Folder().__of__(self.root) for i in range(10)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.DomainFilter(False, 0)])
+        self.assertEqual(len(snapshot.traces), 0)
+        self.assertEqual(len(wrappers), 10)
+
+
+class TestMaxDepth(unittest.TestCase):
+
+    def setUp(self):
+        class Folder(Implicit):
+            pass
+
+        self.Folder = Folder
+
+    def tearDown(self):
+        Acquisition.set_max_depth(0)
+
+    def _cycle(self):
+        a, b, c = self.Folder(), self.Folder(), self.Folder()
+        a.__parent__ = b
+        b.__parent__ = c
+        c.__parent__ = a
+        return a
+
+    def test_cycle(self):
+        with self.assertRaisesRegex(RuntimeError, 'Cycle detected'):
+            Acquisition.aq_acquire(self._cycle(), 'color')
+
+    def test_cycle_with_max_depth(self):
+        Acquisition.set_max_depth(1000)
+        with self.assertRaisesRegex(RuntimeError, 'Cycle detected'):
+            a = self._cycle()
+            a.__of__(a.__parent__).color
+
+    def test_set_max_depth(self):
+        root = ob = self.Folder()
+        root.color = 'red'
+        for i in range(10):
+            ob.child = self.Folder()
+            ob = ob.child
+        self.assertEqual(ob.color, 'red')
+
+        Acquisition.set_max_depth(5)
+        with self.assertRaisesRegex(RuntimeError,
+                                    "depth limit of 5 exceeded.*'color'"):
+            ob.color
+        with self.assertRaisesRegex(RuntimeError, 'depth limit'):
+            Acquisition.aq_acquire(ob, 'color')
+        self.assertEqual(root.child.color, 'red')
+
+        Acquisition.set_max_depth(0)
+        self.assertEqual(ob.color, 'red')
+
+    def test_set_max_depth_negative(self):
+        with self.assertRaises(ValueError):
+            Acquisition.set_max_depth(-1)
+
+
+class TestAcquisitionPolicy(unittest.TestCase):
+
+    def setUp(self):
+        class Folder(Implicit):
+            pass
+
+        self.Folder = Folder
+        self.root = Folder()
+        self.root.color = 'red'
+        self.root.size = 'big'
+
+    def _child(self, **policy):
+        Child = type('Child', (self.Folder,), policy)
+        self.root.a = self.Folder()
+        self.root.a.b = Child()
+        return self.root.a.b
+
+    def test_local_only(self):
+        b = self._child(__aq_local_only__=frozenset(['color']))
+        self.assertFalse(hasattr(b, 'color'))
+        self.assertEqual(b.size, 'big')
+        with self.assertRaises(AttributeError):
+            Acquisition.aq_acquire(b, 'color')
+
+    def test_local_only_found_on_the_object(self):
+        b = self._child(__aq_local_only__=('color',))
+        b.color = 'blue'
+        self.assertEqual(b.color, 'blue')
+
+    def test_acquirable(self):
+        b = self._child(__aq_acquirable__=('size',))
+        self.assertFalse(hasattr(b, 'color'))
+        self.assertEqual(b.size, 'big')
+        self.assertEqual(Acquisition.aq_acquire(b, 'size'), 'big')
+
+    def test_acquirable_none(self):
+        b = self._child(__aq_acquirable__=None)
+        self.assertEqual(b.color, 'red')
+
+    def test_string_policy(self):
+        # Not a collection of the substrings of the name
+        for policy in ('__aq_local_only__', '__aq_acquirable__'):
+            b = self._child(**{policy: 'color_scheme'})
+            with self.assertRaises(TypeError):
+                b.color
+            with self.assertRaises(TypeError):
+                Acquisition.aq_acquire(b, 'color')
+        b = self._child(__aq_local_only__=['color'])
+        self.assertRaises(TypeError, getattr, b, 'size')
+
+    def test_policy_of_the_container(self):
+        Child = type('Child', (self.Folder,),
+                     {'__aq_local_only__': ('color',)})
+        self.root.a = Child()
+        self.root.a.b = self.Folder()
+        # The policy of `a` applies to lookups continuing from `a`.
+        self.assertFalse(hasattr(self.root.a.b, 'color'))
+        self.assertEqual(self.root.a.b.size, 'big')
+
+    def test_acquired(self):
+        color = Acquisition.acquired('color')
+        size = Acquisition.acquired('size')
+        for policy in ({'__aq_local_only__': {'color'}},
+                       {'__aq_acquirable__': ('size',)}):
+            b = self._child(**policy)
+            # Twice, the second lookup uses what the first one cached.
+            for i in range(2):
+                self.assertRaises(AttributeError, color, b)
+                self.assertEqual(color(b, 'none'), 'none')
+                self.assertEqual(size(b), 'big')
+
+    def test_acquired_policy_of_the_container(self):
+        color = Acquisition.acquired('color')
+        Child = type('Child', (self.Folder,),
+                     {'__aq_local_only__': ('color',)})
+        self.root.a = Child()
+        self.root.a.b = self.Folder()
+        for i in range(2):
+            self.assertRaises(AttributeError, color, self.root.a.b)
+        del Child.__aq_local_only__
+        self.assertEqual(color(self.root.a.b), 'red')
+
+    def test_explain(self):
+        b = self._child(__aq_local_only__=('color',))
+        steps = Acquisition.aq_explain(b, 'color')
+        self.assertIn(('prune', 'sco: class policy'),
+                      [(step['step'], step['detail']) for step in steps])
+        self.assertEqual(steps[-1]['detail'], 'AttributeError')
+
+
+class TestPrivateNames(unittest.TestCase):
+
+    def setUp(self):
+        class Folder(Implicit):
+            def _v_method(self):
+                return self
+
+        self.Folder = Folder
+        self.root = Folder()
+        self.root._p_color = 'red'
+        self.root.a = Folder()
+        self.root.a._p_jar = 'jar'
+
+    def test_found(self):
+        self.assertEqual(self.root.a._p_jar, 'jar')
+        self.assertEqual(self.root.a.aq_explicit._p_jar, 'jar')
+
+    def test_not_acquired(self):
+        with self.assertRaisesRegex(AttributeError, '^_p_color$'):
+            self.root.a._p_color
+        self.assertFalse(hasattr(self.root.a.aq_explicit, '_p_color'))
+
+    def test_method_bound_to_wrapper(self):
+        a = self.root.a
+        self.assertEqual(a._v_method().aq_parent, self.root)
+
+    def test_result_wrapped(self):
+        self.root.a._v_child = self.Folder()
+        child = self.root.a._v_child
+        self.assertIs(aq_base(child.aq_parent), aq_base(self.root.a))
+        self.assertIs(aq_base(child.aq_parent.aq_parent), self.root)
+
+    def test_acquired(self):
+        self.root.a._p_color = Acquisition.Acquired
+        self.assertEqual(self.root.a._p_color, 'red')
+
+    def test_nested_wrapper(self):
+        b = self.Folder()
+        b._p_jar = 'b'
+        wrapper = b.__of__(self.root.a).__of__(self.root)
+        self.assertEqual(wrapper._p_jar, 'b')
+        self.assertFalse(hasattr(self.Folder().__of__(self.root.a),
+                                 '_p_jar'))
+
+    def test_counted_in_stats(self):
+        Acquisition.reset_stats()
+        Acquisition.set_stats_enabled(True)
+        try:
+            self.root.a._p_jar
+        finally:
+            Acquisition.set_stats_enabled(False)
+        self.assertEqual(Acquisition.stats()['lookups'], 1)
+
+
+class TestInterfaceNames(unittest.TestCase):
+
+    def setUp(self):
+        from zope.interface import Interface
+        from zope.interface import implementer
+
+        class IFolder(Interface):
+            pass
+
+        class IMarker(Interface):
+            pass
+
+        @implementer(IFolder)
+        class Folder(Implicit):
+            pass
+
+        self.IFolder = IFolder
+        self.IMarker = IMarker
+        self.Folder = Folder
+        self.root = Folder()
+        self.root.a = Folder()
+
+    def test___class__(self):
+        self.assertIs(self.root.a.__class__, self.Folder)
+        self.assertIs(self.root.a.aq_explicit.__class__, self.Folder)
+
+    def test___class___overridden(self):
+        class Other(self.Folder):
+            __class__ = property(lambda self: int)
+
+        self.root.b = Other()
+        self.assertIs(self.root.b.__class__, int)
+
+    def test___implemented__(self):
+        a = self.root.a
+        self.assertIs(getattr(a, '__implemented__', None),
+                      getattr(aq_base(a), '__implemented__', None))
+
+    def test_providedBy(self):
+        from zope.interface import alsoProvides
+        from zope.interface import providedBy
+        a = self.root.a
+        self.assertTrue(self.IFolder.providedBy(a))
+        self.assertFalse(self.IMarker.providedBy(a))
+        alsoProvides(a, self.IMarker)
+        self.assertTrue(self.IMarker.providedBy(self.root.a))
+        self.assertEqual(list(providedBy(self.root.a)),
+                         list(providedBy(aq_base(a))))
+
+    def test___provides___not_acquired(self):
+        from zope.interface import alsoProvides
+        alsoProvides(self.root, self.IMarker)
+        self.assertFalse(self.IMarker.providedBy(self.root.a))
+
+
+class TestThreads(unittest.TestCase):
+
+    def test_concurrent_lookups(self):
+        import threading
+
+        class Node(Implicit):
+            pass
+
+        root = Node()
+        root.color = 'red'
+        a = Node()
+        a.__parent__ = root
+        leaf = Node()
+        leaf.__parent__ = a
+        shared = Node().__of__(leaf)
+        errors = []
+
+        def lookup():
+            try:
+                for i in range(500):
+                    self.assertEqual(shared.color, 'red')
+                    self.assertEqual(Acquisition.aq_acquire(leaf, 'color'),
+                                     'red')
+            except BaseException as e:  # pragma: no cover
+                errors.append(e)
+
+        def reparent():
+            # Drops the wrappers mutating lookups store in `shared`.
+            for i in range(500):
+                shared.aq_parent = leaf
+
+        threads = [threading.Thread(target=lookup) for i in range(4)]
+        threads.append(threading.Thread(target=reparent))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_wrapper_memory_peak(self):
+        import threading
+
+        from Acquisition import reset_wrapper_memory_peak
+        from Acquisition import wrapper_memory
+
+        class Node(Implicit):
+            pass
+
+        root = Node()
+        barrier = threading.Barrier(4)
+        held = []
+
+        def create():
+            wrappers = [Node().__of__(root) for i in range(200)]
+            barrier.wait()
+            # All the wrappers of all threads are alive here.
+            held.append(wrapper_memory()['current'])
+            barrier.wait()
+            del wrappers
+
+        reset_wrapper_memory_peak()
+        threads = [threading.Thread(target=create) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(wrapper_memory()['peak'], max(held))
+
+    def test_trace_restarted_during_lookups(self):
+        import threading
+
+        from Acquisition import trace
+
+        class Node(Implicit):
+            pass
+
+        root = Node()
+        root.color = 'red'
+        leaf = Node().__of__(Node().__of__(root))
+        errors = []
+
+        def lookup():
+            try:
+                for i in range(500):
+                    self.assertEqual(leaf.color, 'red')
+            except BaseException as e:  # pragma: no cover
+                errors.append(e)
+
+        def restart():
+            for i in range(200):
+                trace.start(1 + i % 3)
+                trace.stop()
+
+        self.addCleanup(trace.stop)
+        threads = [threading.Thread(target=lookup) for i in range(4)]
+        threads.append(threading.Thread(target=restart))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class TestModuleInstances(unittest.TestCase):
+
+    @unittest.skipIf(not CAPI, 'Only the C implementation has a module.')
+    def test_new_module_instance(self):
+        import importlib.util
+        spec = importlib.util.find_spec('Acquisition._Acquisition')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        from Acquisition import _Acquisition
+        self.assertIsNot(module, _Acquisition)
+        self.assertIs(module.Implicit, Implicit)
+        self.assertIs(module.Acquired, Acquisition.Acquired)
+        self.assertIsNot(module.AcquisitionCAPI, _Acquisition.AcquisitionCAPI)
+
+        class Node(module.Implicit):
+            pass
+
+        root = Node()
+        root.color = 'red'
+        root.child = Node()
+        self.assertEqual(module.aq_acquire(root.child, 'color'), 'red')
+
+
+class TestImport(unittest.TestCase):
+
+    def _imported(self, code):
+        import os
+        import subprocess
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        code = 'import sys; %s; print(" ".join(sys.modules))' % code
+        output = subprocess.run([sys.executable, '-c', code], env=env,
+                                stdout=subprocess.PIPE, check=True,
+                                universal_newlines=True).stdout
+        return output.split()
+
+    def test_import(self):
+        modules = self._imported('import Acquisition')
+        self.assertNotIn('zope.interface', modules)
+        self.assertNotIn('Acquisition.interfaces', modules)
+        self.assertEqual('Acquisition._pure' in modules, not CAPI)
+
+    def test_private_names(self):
+        modules = self._imported(
+            'from Acquisition import _Wrapper_findattr')
+        self.assertIn('Acquisition._pure', modules)
+        with self.assertRaises(AttributeError):
+            Acquisition._no_such_name
+
+    def test_interfaces(self):
+        modules = self._imported('import Acquisition.interfaces')
+        self.assertIn('zope.interface', modules)
+        from Acquisition.interfaces import IAcquirer
+        from Acquisition.interfaces import IAcquisitionWrapper
+        self.assertIs(Acquisition.IAcquirer, IAcquirer)
+        self.assertIs(Acquisition.IAcquisitionWrapper, IAcquisitionWrapper)
+        self.assertTrue(IAcquirer.implementedBy(Implicit))
+        self.assertTrue(IAcquisitionWrapper.implementedBy(
+            type(Implicit().__of__(Implicit()))))
+
+
+class TestWrapperSubclasses(unittest.TestCase):
+    # The Python implementation derives a wrapper class per wrapped type.
+
+    def setUp(self):
+        class Node(Implicit):
+            color = 'red'
+
+            def method(self):
+                return self
+
+        self.Node = Node
+        self.root = Node()
+        self.root.child = Node()
+
+    @unittest.skipIf(CAPI, 'Pure Python test.')
+    def test_derived_per_type(self):
+        from Acquisition import ExplicitAcquisitionWrapper
+        from Acquisition import ImplicitAcquisitionWrapper
+        child = self.root.child
+        self.assertIs(type(child), type(self.Node().__of__(self.root)))
+        self.assertTrue(issubclass(type(child), ImplicitAcquisitionWrapper))
+        explicit = ExplicitAcquisitionWrapper(self.Node(), self.root)
+        self.assertTrue(issubclass(type(explicit), ExplicitAcquisitionWrapper))
+        self.assertIsNot(type(explicit), type(child))
+        self.assertIsNot(type(ImplicitAcquisitionWrapper(1, self.root)),
+                         type(child))
+        self.assertIs(type(ImplicitAcquisitionWrapper(None, self.root)),
+                      ImplicitAcquisitionWrapper)
+
+    def test_type(self):
+        # The derived classes are visible as the type of the wrappers.
+        from Acquisition import ExplicitAcquisitionWrapper
+        from Acquisition import ImplicitAcquisitionWrapper
+        implicit = self.root.child
+        explicit = ExplicitAcquisitionWrapper(self.Node(), self.root)
+        for wrapper, cls in ((implicit, ImplicitAcquisitionWrapper),
+                             (explicit, ExplicitAcquisitionWrapper)):
+            self.assertIsInstance(wrapper, cls)
+            self.assertIs(wrapper.__class__, self.Node)
+            if CAPI:
+                self.assertIs(type(wrapper), cls)
+            else:
+                self.assertIsNot(type(wrapper), cls)
+                self.assertTrue(issubclass(type(wrapper), cls))
+                self.assertEqual(type(wrapper).__name__,
+                                 cls.__name__ + '_Node')
+
+    def test_lookups(self):
+        from Acquisition import ExplicitAcquisitionWrapper
+        child = self.root.child
+        self.assertEqual(child.color, 'red')
+        self.assertIs(aq_parent(child.method()), self.root)
+        self.assertIs(child.__class__, self.Node)
+        self.root.size = 42
+        self.assertEqual(child.size, 42)
+        self.root._private = 1
+        self.assertRaises(AttributeError, getattr, child, '_private')
+        self.assertRaises(AttributeError, getattr, child, 'missing')
+        child.inherited = Acquisition.Acquired
+        self.root.inherited = 'root'
+        self.assertEqual(child.inherited, 'root')
+        explicit = ExplicitAcquisitionWrapper(self.Node(), self.root)
+        self.assertRaises(AttributeError, getattr, explicit, 'size')
+        self.assertEqual(explicit.acquire('size'), 42)
+        self.assertEqual(explicit.aq_acquire('size'), 42)
+
+    def test_class_changes(self):
+        child = self.root.child
+        self.assertEqual(child.color, 'red')
+        self.Node.color = 'blue'
+        self.Node.method = lambda self: 'patched'
+        self.assertEqual(child.color, 'blue')
+        self.assertEqual(child.method(), 'patched')
+        del self.Node.color
+        self.root.color = 'green'
+        self.assertEqual(child.color, 'green')
+
+    def test_class_policy(self):
+        self.Node.__aq_local_only__ = ('size',)
+        self.root.size = 42
+        self.assertRaises(AttributeError, getattr, self.root.child, 'size')
+
+    @unittest.skipIf(CAPI, 'Pure Python test.')
+    def test_own___getattribute__(self):
+        from Acquisition import ImplicitAcquisitionWrapper
+
+        class Wrapper(ImplicitAcquisitionWrapper):
+            def __getattribute__(self, name):
+                if name == 'magic':
+                    return 42
+                return super().__getattribute__(name)
+
+        wrapper = Wrapper(self.Node(), self.root)
+        self.assertEqual(wrapper.magic, 42)
+        self.assertEqual(wrapper.color, 'red')
+
+    @unittest.skipIf(CAPI, 'Pure Python test.')
+    def test_stats(self):
+        Acquisition.reset_stats()
+        Acquisition.set_stats_enabled(True)
+        try:
+            self.root.child.color
+        finally:
+            Acquisition.set_stats_enabled(False)
+        self.assertEqual(Acquisition.stats()['findattr_calls'], 1)
+
+
+class TestSpecialMethodDispatch(unittest.TestCase):
+
+    def setUp(self):
+        class Vec(Implicit):
+            def __init__(self, *items):
+                self.items = list(items)
+
+            def __len__(self):
+                return len(self.items)
+
+            def __getitem__(self, index):
+                return self.items[index], aq_parent(self)
+
+            def __add__(self, other):
+                return aq_parent(self)
+
+        self.Vec = Vec
+        self.root = Vec()
+        self.root.vec = Vec(1, 2)
+
+    def test_rebound(self):
+        vec = self.root.vec
+        self.assertEqual(len(vec), 2)
+        self.assertEqual(vec[1], (2, self.root))
+        self.assertIs(vec + 1, self.root)
+        self.assertTrue(bool(vec))
+        self.assertIn('Vec object', repr(vec))
+        self.assertEqual(str(vec), repr(vec))
+
+    def test_missing(self):
+        vec = self.root.vec
+        self.assertRaises(TypeError, bytes, vec)
+        self.assertRaises(AttributeError, operator.sub, vec, 1)
+        self.assertRaises(AttributeError, operator.contains, vec, 1)
+        del self.Vec.__len__
+        self.assertTrue(bool(vec))
+        self.assertRaises(TypeError, len, vec)
+
+    def test_class_changes(self):
+        class Sized:
+            def __len__(self):
+                return 2
+
+        class Vec(Implicit, Sized):
+            pass
+
+        self.root.vec = Vec()
+        vec = self.root.vec
+        self.assertEqual(len(vec), 2)
+        Sized.__len__ = lambda self: 42
+        self.assertEqual(len(vec), 42)
+
+    def test_instance_dict(self):
+        vec = self.root.vec
+        self.assertEqual(len(vec), 2)
+        aq_base(vec).__len__ = lambda: 5
+        self.assertEqual(len(vec), 5)
+
+    def test___getattr__(self):
+        class Dynamic(Implicit):
+            def __getattr__(self, name):
+                if name == '__len__':
+                    return lambda: 3
+                raise AttributeError(name)
+
+        self.root.dynamic = Dynamic()
+        self.assertEqual(len(self.root.dynamic), 3)
+        self.assertRaises(TypeError, bytes, self.root.dynamic)
+
+    def test_static_and_class_methods(self):
+        class Static(Implicit):
+            @staticmethod
+            def __len__():
+                return 3
+
+        class Class(Implicit):
+            @classmethod
+            def __len__(cls):
+                return 4
+
+        self.root.static = Static()
+        self.root.klass = Class()
+        self.assertEqual(len(self.root.static), 3)
+        self.assertEqual(len(self.root.klass), 4)
+
+    def test_builtin(self):
+        from Acquisition import ImplicitAcquisitionWrapper
+        wrapper = ImplicitAcquisitionWrapper([1, 2, 3], self.root)
+        self.assertEqual(len(wrapper), 3)
+        self.assertEqual(wrapper[0], 1)
+
+
+@unittest.skipIf(not CAPI and sys.version_info < (3, 12),
+                 'Python classes export buffers from Python 3.12 on.')
+class TestBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.parent = Implicit()
+
+    def test_view_shares_the_memory_of_the_object(self):
+        data = bytearray(b'abc')
+        view = memoryview(Acquisition.ImplicitAcquisitionWrapper(
+            data, self.parent))
+        self.assertEqual(b'abc', bytes(view))
+        view[0] = ord('x')
+        self.assertEqual(bytearray(b'xbc'), data)
+        data[1] = ord('y')
+        self.assertEqual(b'xyc', view.tobytes())
+
+    def test_explicit_wrapper(self):
+        view = memoryview(Acquisition.ExplicitAcquisitionWrapper(
+            b'abc', self.parent))
+        self.assertEqual(b'abc', bytes(view))
+        self.assertTrue(view.readonly)
+        with self.assertRaises(TypeError):
+            view[0] = ord('x')
+
+    def test_wrapper_of_wrapper(self):
+        wrapper = Acquisition.ImplicitAcquisitionWrapper(
+            Acquisition.ImplicitAcquisitionWrapper(b'abc', self.parent),
+            self.parent)
+        self.assertEqual(b'abc', bytes(memoryview(wrapper)))
+        self.assertEqual(b'xabc', b''.join([b'x', wrapper]))
+
+    def test_view_outlives_wrapper(self):
+        data = bytearray(b'abc')
+        view = memoryview(Acquisition.ImplicitAcquisitionWrapper(
+            data, self.parent))
+        gc.collect()
+        self.assertEqual(b'abc', bytes(view))
+        view.release()
+        data.extend(b'd')  # The export was released.
+        self.assertEqual(bytearray(b'abcd'), data)
+
+    def test_object_without_buffer(self):
+        with self.assertRaises(TypeError):
+            memoryview(Implicit().__of__(self.parent))
+
+
 class TestCooperativeBase(unittest.TestCase):
 
     def _make_acquirer(self, kind):
@@ -2996,6 +4751,118 @@ class TestImplicitWrappingGetattribute(unittest.TestCase):
         self.assertEqual(wrapped.get_flags(), wrapper.get_flags())
         self.assertEqual(wrapped.get_oid(), wrapper.get_oid())
 
+    @unittest.skipIf(CAPI, 'Pure Python test.')
+    def test_no_dict_without_object_getattribute(self):
+
+        class Node(Implicit):
+            def get_color(self):
+                return self.color
+
+        wrapped = Node()
+        wrapped.color = 'red'
+        wrapper = wrapped.__of__(Node())
+        self.assertEqual(wrapper.get_color(), 'red')
+        self.assertRaises(AttributeError,
+                          object.__getattribute__, wrapper, '__dict__')
+        self.assertEqual(
+            sys.getsizeof(wrapper),
+            sys.getsizeof(Acquisition.ImplicitAcquisitionWrapper(1, None)))
+
+    @unittest.skipIf(CAPI, 'Pure Python test.')
+    def test_dict_shared_with_object_protocol(self):
+
+        class Getattribute(Implicit):
+            def __getattribute__(self, name):
+                return Implicit.__getattribute__(self, name)
+
+        class Setter(Implicit):
+            @property
+            def color(self):
+                return 'red'
+
+            @color.setter
+            def color(self, value):
+                object.__setattr__(self, '_color', value)
+
+        class Nested(Implicit):
+            def method(self):
+                return lambda: object.__getattribute__(self, 'x')
+
+        class Descriptor:
+            def __get__(self, inst, cls):
+                return object.__getattribute__(inst, 'x')
+
+        class Custom(Implicit):
+            y = Descriptor()
+
+        for cls in (Getattribute, Setter, Nested, Custom):
+            wrapped = cls()
+            wrapped.x = 1
+            wrapper = wrapped.__of__(Implicit())
+            self.assertIs(object.__getattribute__(wrapper, '__dict__'),
+                          wrapped.__dict__, cls)
+
+    @unittest.skipIf(CAPI, 'Pure Python test.')
+    def test_dict_shared_with_object_protocol_in_decorated_method(self):
+        import functools
+
+        def wraps(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                return func(*args)
+            return wrapper
+
+        def closes(func):
+            return lambda *args: func(*args)
+
+        for decorator in (wraps, closes, functools.lru_cache):
+            class Decorated(Implicit):
+                @decorator
+                def getx(self):
+                    return object.__getattribute__(self, 'x')
+
+            wrapped = Decorated()
+            wrapped.x = 1
+            wrapper = wrapped.__of__(Implicit())
+            self.assertEqual(wrapper.getx(), 1, decorator)
+
+    @unittest.skipIf(CAPI, 'Pure Python test.')
+    def test_no_dict_with_decorated_methods(self):
+        import functools
+
+        def wraps(func):
+            @functools.wraps(func)
+            def wrapper(self):
+                return func(self)
+            return wrapper
+
+        class Node(Implicit):
+            size = len
+            limit = 3
+
+            def __init__(self):
+                super().__init__()
+
+            @wraps
+            def get_color(self):
+                return self.color
+
+            @staticmethod
+            def make():
+                return Node()
+
+            @property
+            def double(self):
+                return self.limit * 2
+
+        wrapped = Node()
+        wrapped.color = 'red'
+        wrapper = wrapped.__of__(Node())
+        self.assertEqual(wrapper.get_color(), 'red')
+        self.assertEqual(wrapper.double, 6)
+        self.assertRaises(AttributeError,
+                          object.__getattribute__, wrapper, '__dict__')
+
 
 class TestUnicode(unittest.TestCase):
 
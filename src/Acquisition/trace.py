@@ -0,0 +1,188 @@
+"""Binary trace of the lookups done by the acquisition engine.
+
+A trace is started with `start`, which keeps the records of the last
+lookups in a ring buffer, and written to a file with `save`::
+
+    from Acquisition import trace
+    trace.start()
+    ...  # run the workload
+    trace.save('trace.bin')
+    trace.stop()
+
+The file can be analyzed later, without the application::
+
+    python -m Acquisition.trace analyze trace.bin
+
+Each record has the time the lookup ended, the name, the type of the
+object the lookup was started on, the number of levels searched, the
+number of objects which didn't have the name, how the lookup ended
+(`KINDS`) and the number of wrappers created during the lookup.
+"""
+import argparse
+import collections
+import struct
+import sys
+
+import Acquisition
+
+
+MAGIC = b'AQTRACE1'
+
+# Kinds of the end of a lookup: the name was found on the object the
+# lookup was started on, acquired from another one, not found at all or
+# the lookup raised another error.
+KINDS = ('found', 'acquired', 'missing', 'error')
+
+# Header of the file: magic, byte order of the records (0 little, 1 big
+# endian), record size, number of names, of types and of records
+# recorded, the latter may be more than the records in the file.
+HEADER = struct.Struct('<8sBHIIQ')
+
+# Shading of the cells of the heatmaps, from none to most.
+SHADES = ' .:-=+*#%@'
+
+Record = collections.namedtuple(
+    'Record', 'time name type levels misses kind wrappers')
+
+Trace = collections.namedtuple('Trace', 'records names types count')
+
+
+def _record_format(byteorder):
+    return struct.Struct(('<' if byteorder == 'little' else '>') +
+                         'QIIHHBxH')
+
+
+def start(capacity=1 << 16):
+    """Start to record the last `capacity` lookups."""
+    if capacity <= 0:
+        raise ValueError('capacity must be positive')
+    Acquisition.set_trace(capacity)
+
+
+def stop():
+    """Stop recording, this discards the records."""
+    Acquisition.set_trace(0)
+
+
+def save(path):
+    """Write the records of the running trace to the file at `path`."""
+    records, names, types, count = Acquisition.trace_data()
+    names = [_encode(name) for name in names]
+    types = [_encode(f'{tp.__module__}.{tp.__qualname__}') for tp in types]
+    byteorder = 0 if sys.byteorder == 'little' else 1
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, byteorder,
+                            _record_format(sys.byteorder).size,
+                            len(names), len(types), count))
+        for item in names + types:
+            f.write(struct.pack('<I', len(item)))
+            f.write(item)
+        f.write(records)
+
+
+def _encode(text):
+    return str(text).encode('utf-8', 'backslashreplace')
+
+
+def load(path):
+    """Read the trace saved in the file at `path`."""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, byteorder, size, n_names, n_types, count = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a trace of Acquisition')
+    record = _record_format('big' if byteorder else 'little')
+    if size != record.size:
+        raise ValueError(f'{path} has records of an unknown size')
+
+    offset = HEADER.size
+    strings = []
+    for i in range(n_names + n_types):
+        length, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+
+    records = [Record(*fields)
+               for fields in record.iter_unpack(data[offset:])]
+    return Trace(records, strings[:n_names], strings[n_names:], count)
+
+
+def _heatmap(rows, columns, cells):
+    """Render `cells`, a dict of counts keyed by (row, column)."""
+    most = max(cells.values(), default=0)
+    width = max((len(row) for row in rows), default=0)
+    lines = [' ' * width + ' ' + ''.join(f'{c:>3}' for c in columns)]
+    for row in rows:
+        shades = []
+        for column in columns:
+            count = cells.get((row, column), 0)
+            shade = (SHADES[1 + (len(SHADES) - 2) * count // most]
+                     if count else SHADES[0])
+            shades.append(f'{shade:>3}')
+        lines.append(f'{row:<{width}} ' + ''.join(shades))
+    return lines
+
+
+def analyze(trace, top=20):
+    """Return the report of `trace` as a list of lines."""
+    records = trace.records
+    lines = [f'{len(records)} of {trace.count} lookups recorded', '']
+
+    # Heatmap of the acquired names by the levels they were found on.
+    acquired = collections.Counter()
+    by_name = collections.Counter()
+    for record in records:
+        if KINDS[record.kind] == 'acquired':
+            name = trace.names[record.name]
+            acquired[name, record.levels] += 1
+            by_name[name] += 1
+    lines.append('Acquired names by levels searched:')
+    if acquired:
+        names = [name for name, count in by_name.most_common(top)]
+        levels = sorted({levels for name, levels in acquired})
+        lines.extend(_heatmap(names, levels, acquired))
+        lines.append(f'(most: {max(acquired.values())}, scale: {SHADES!r})')
+    lines.append('')
+
+    # Miss rates by the type of the object the lookups started on.
+    kinds = collections.defaultdict(collections.Counter)
+    wrappers = collections.Counter()
+    for record in records:
+        kinds[trace.types[record.type]][KINDS[record.kind]] += 1
+        wrappers[trace.types[record.type]] += record.wrappers
+    lines.append('Lookups by type:')
+    width = max((len(tp) for tp in kinds), default=4)
+    lines.append(f'{"type":<{width}} {"lookups":>8} {"acquired":>9} '
+                 f'{"missing":>8} {"wrappers":>9}')
+    for tp, counts in sorted(kinds.items(),
+                             key=lambda item: -sum(item[1].values())):
+        total = sum(counts.values())
+        lines.append(
+            f'{tp:<{width}} {total:>8} '
+            f'{counts["acquired"] / total:>9.1%} '
+            f'{(counts["missing"] + counts["error"]) / total:>8.1%} '
+            f'{wrappers[tp] / total:>9.2f}')
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m Acquisition.trace',
+        description='Analyze a trace of the lookups of Acquisition.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser(
+        'analyze', help='report the acquired names and miss rates')
+    command.add_argument('path', help='file written by Acquisition.trace')
+    command.add_argument('--top', type=int, default=20,
+                         help='number of names in the heatmap')
+    args = parser.parse_args(argv)
+
+    for line in analyze(load(args.path), args.top):
+        print(line)
+
+
+if __name__ == '__main__':
+    main()